@@ -1,6 +1,7 @@
 from pathlib import Path
 import os
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 # เริ่มต้น Environ
 env = environ.Env(
@@ -52,6 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # วัดเวลา / Query / cache ของทั้ง Request (ไว้บนสุด ให้รวมเวลาของ Middleware ตัวอื่นด้วย)
+    'users.middleware.PerformanceMiddleware',
+
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -101,11 +105,28 @@ DATABASES = {
     'default': env.db('DATABASE_URL')
 }
 
+# --- Cache (ดึงจาก .env) ---
+# Production ต้องชี้ไปที่ Redis (เช่น redis://127.0.0.1:6379/1) ให้ทุก daphne worker ใช้ข้อมูลชุดเดียวกัน
+# cache นี้เก็บข้อมูลที่ต้องล้างพร้อมกันทุก worker: ยอดบิล (orders/billing.py), เมนู (menu_cache),
+# UUID โต๊ะ (table_cache), Idempotency-Key ของการสั่งอาหาร ถ้าเป็น locmem การล้าง / กันสั่งซ้ำ จะเห็นแค่ worker เดียว
+# ไม่ตั้ง CACHE_URL: ใช้ locmem ได้เฉพาะตอน DEBUG (ใช้ locmem ตอนรันจริงต้องตั้ง CACHE_URL=locmemcache:// เอง และรัน worker เดียว)
+if not DEBUG and not env.str('CACHE_URL', default=''):
+    raise ImproperlyConfigured(
+        'CACHE_URL is required when DEBUG is off: set it to a shared cache (e.g. redis://127.0.0.1:6379/1)'
+    )
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    # รูป QR ของโต๊ะ (ไม่เปลี่ยนจนกว่าจะเปลี่ยน UUID) เก็บเป็นไฟล์บนดิสก์ ไม่เปลือง RAM ของ Redis
+    'qr': env.cache('QR_CACHE_URL', default='filecache://' + os.path.join(BASE_DIR, '.cache', 'qr')),
+}
+
 
 # Config การ Authentication
+# ใช้ตัวที่ครอบไว้ใน users/backends.py: ดึง User จาก session พร้อมร้าน (select_related) ใน Query เดียว
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
-    'allauth.account.auth_backends.AuthenticationBackend',
+    'users.backends.ModelBackend',
+    'users.backends.AuthenticationBackend',
 ]
 
 
@@ -170,6 +191,8 @@ DEFAULT_FROM_EMAIL = f"RPOS Admin <{EMAIL_HOST_USER}>"
 
 
 # --- Channels / Redis ---
+# ข้อความ Real-time ถูกบันทึกลง Outbox ก่อน ต้องรัน `python manage.py dispatch_outbox` คู่กับ daphne
+# เพื่อส่งข้อความเข้า Channel Layer
 ASGI_APPLICATION = 'config.asgi.application'
 CHANNEL_LAYERS = {
     'default': {
@@ -241,4 +264,44 @@ ADMIN_ALLOWED_IPS = env.list('ADMIN_ALLOWED_IPS', default=['127.0.0.1'])
 # ⭐ เพิ่มบรรทัดนี้ ⭐
 MAINTENANCE_MODE = env.bool('MAINTENANCE_MODE', default=False)
 
+# --- Performance (users.middleware.PerformanceMiddleware) ---
+# Request ที่ช้ากว่านี้ (ms) จะ log รายการ Query ทั้งหมดไว้ดูย้อนหลัง
+PERF_SLOW_REQUEST_MS = env.int('PERF_SLOW_REQUEST_MS', default=500)
+# ปิดได้ถ้าไม่อยากให้ Browser เห็นเวลา DB / cache ใน header Server-Timing
+PERF_SERVER_TIMING = env.bool('PERF_SERVER_TIMING', default=True)
+# ค่าเริ่มต้น log เฉพาะ Request ที่ช้า (WARNING) ตั้งเป็น INFO ถ้าต้องการ log ทุก Request (1 บรรทัด JSON)
+PERF_LOG_LEVEL = env('PERF_LOG_LEVEL', default='WARNING')
+
+# (เฉพาะตอนพัฒนา) ตรวจ N+1 / EXPLAIN Query ช้า แล้วเขียนรายงานไว้ diff ระหว่าง branch (ดู users/querycheck.py)
+QUERY_INSPECTOR = DEBUG and env.bool('QUERY_INSPECTOR', default=False)
+QUERY_INSPECTOR_REPEAT = env.int('QUERY_INSPECTOR_REPEAT', default=5)  # รูปแบบเดียวกันซ้ำเกินนี้ = N+1
+QUERY_INSPECTOR_EXPLAIN_MS = env.int('QUERY_INSPECTOR_EXPLAIN_MS', default=50)
+QUERY_INSPECTOR_REPORT = env('QUERY_INSPECTOR_REPORT', default=os.path.join(BASE_DIR, '.cache', 'query-report.json'))
+if QUERY_INSPECTOR:
+    MIDDLEWARE.insert(MIDDLEWARE.index('users.middleware.PerformanceMiddleware') + 1, 'users.middleware.QueryInspectorMiddleware')
+
+# Prometheus (/users/metrics/): token ที่ Prometheus ส่งมาใน header Authorization: Bearer <token>
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+# แต่ละ worker เขียนตัวเลขลง cache ทุกกี่วินาที / worker ที่เงียบเกินนี้ถือว่าตายแล้ว
+METRICS_FLUSH_SECONDS = env.int('METRICS_FLUSH_SECONDS', default=10)
+METRICS_WORKER_TTL = env.int('METRICS_WORKER_TTL', default=300)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'rpos.performance': {
+            'handlers': ['console'],
+            'level': PERF_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
+# กันลูกค้ากดส่งออเดอร์ซ้ำ (วินาที) - คีย์ Idempotency จะจำ order_id เดิมไว้นานเท่านี้
+ORDER_IDEMPOTENCY_TTL = env.int('ORDER_IDEMPOTENCY_TTL', default=600)
+
 # -------
\ No newline at end of file
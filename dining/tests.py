@@ -1,3 +1,12 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from restaurants.tests import QueryBudgetTestCase
+
+
+class DiningQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_dining_menu(self):
+        self.client.logout()
+        self.assertQueryBudget(
+            4, lambda: self.client.get(reverse('dining_menu', args=[self.restaurant.slug, self.table.uuid])),
+        )
@@ -1,38 +1,40 @@
 # dining/views.py
-from django.shortcuts import render, get_object_or_404, redirect
-from restaurants.models import Restaurant, Table, MenuItem
-from django.db.models import Prefetch
+from django.http import Http404
+from django.shortcuts import render, aget_object_or_404, redirect
+from restaurants.models import Restaurant
+from restaurants.menu_cache import aget_menu_snapshot
+from restaurants import table_cache
 
-def dining_menu(request, shop_slug, table_uuid):
-    # 1. ค้นหาร้านค้าก่อน (ถ้าไม่เจอร้าน ให้ 404 ไปเลย อันนี้ถูกต้อง)
-    restaurant = get_object_or_404(Restaurant, slug=shop_slug, is_active=True)
-
-    # 2. ⭐ พยายามค้นหาโต๊ะด้วย UUID (จุดที่แก้ไข)
-    try:
-        table = Table.objects.get(uuid=table_uuid, restaurant=restaurant)
-    except Table.DoesNotExist:
-        # ⚠️ ถ้าหาไม่เจอ แปลว่า UUID ถูกเปลี่ยนไปแล้ว (ปิดโต๊ะแล้ว)
-        # ให้ส่งไปหน้า "หมดเวลา / ขอบคุณ" แทน
+# หน้าเมนูเป็นหน้าที่โดนเรียกบ่อยที่สุด (ลูกค้าสแกน QR ทุกโต๊ะ) จึงเป็น async view
+# ใช้ Async ORM ทั้งหมด และดึงข้อมูลให้ครบก่อน render (Template ห้ามแตะ DB ในโหมด async)
+async def dining_menu(request, shop_slug, table_uuid):
+    # 1. หาโต๊ะ + ร้าน จาก UUID ผ่าน cache (ไม่แตะ DB ถ้าเคยเปิดแล้ว)
+    entry = await table_cache.aresolve(table_uuid)
+    if entry is not None and entry['slug'] == shop_slug:
+        # ร้านถูกระงับ = 404 เหมือนหาร้านไม่เจอ
+        if not entry['is_active']:
+            raise Http404
+        table, restaurant = table_cache.build(entry, table_uuid)
+    else:
+        # 2. ⚠️ หาโต๊ะไม่เจอ แปลว่า UUID ถูกเปลี่ยนไปแล้ว (ปิดโต๊ะแล้ว)
+        # ให้ส่งไปหน้า "หมดเวลา / ขอบคุณ" แทน (ถ้าไม่เจอร้าน ให้ 404 ไปเลย อันนี้ถูกต้อง)
+        restaurant = await aget_object_or_404(Restaurant, slug=shop_slug, is_active=True)
         return render(request, 'dining/session_expired.html', {
             'restaurant': restaurant
         })
 
     # 3. เก็บข้อมูลลง Session
-    request.session['dining_table_id'] = table.id
-    request.session['dining_restaurant_id'] = restaurant.id
-    
-    # 4. ดึงเมนูมาแสดง (ปรับปรุง Query ให้ดีขึ้นเล็กน้อย)
-    # ใช้ Prefetch เพื่อดึงเฉพาะ item ที่ is_available=True มาเตรียมไว้เลย
-    # (ช่วยให้ตอน loop ใน template ไม่ต้องเช็ค if item.is_available อีกรอบ และลด query)
-    items_prefetch = Prefetch('items', queryset=MenuItem.objects.filter(is_available=True))
-    
-    categories = restaurant.categories.filter(items__is_available=True)\
-        .prefetch_related(items_prefetch)\
-        .distinct()
-    
+    await request.session.aset('dining_table_id', table.id)
+    await request.session.aset('dining_restaurant_id', restaurant.id)
+
+    # 4. ดึงเมนูมาแสดงจาก Snapshot ใน cache (สร้างจาก DB ครั้งเดียวต่อเวอร์ชันเมนู)
+    # Snapshot มีเฉพาะหมวดหมู่/เมนูที่เปิดขายอยู่ ราคาชุดเดียวกับที่ใช้คิดเงินตอนสั่ง
+    snapshot = await aget_menu_snapshot(restaurant.id)
+    categories = snapshot['categories']
+
     context = {
         'restaurant': restaurant,
         'table': table,
         'categories': categories,
     }
-    return render(request, 'dining/menu_public.html', context)
\ No newline at end of file
+    return render(request, 'dining/menu_public.html', context)
@@ -1,19 +1,113 @@
 # orders/api.py
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.contrib.auth.decorators import user_passes_test
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.db.models import Sum
-from restaurants.models import Table, MenuItem
+from restaurants.menu_cache import aget_menu_snapshot
 from .models import Order, OrderItem
+from restaurants import floor, table_cache
+from . import billing, idempotency, outbox, realtime, rollups, table_sessions
 import json
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from asgiref.sync import sync_to_async
 from restaurants.decorators import restaurant_active_required
+from users import prometheus
 
 
+# ==========================================================
+# ⭐ API ฝั่งลูกค้า (Diner) เป็น async ทั้งหมด
+# ลูกค้าทุกโต๊ะยิงเข้ามาพร้อมกันตอนพีค จึงไม่ควรจอง Thread ไว้ทั้ง request
+# - ใช้ Async ORM (aget / ain_bulk / async for) และ await channel layer ตรงๆ
+# - เฉพาะส่วนที่ต้องใช้ Transaction เท่านั้นที่ส่งไปทำใน Thread (Django ยังไม่รองรับ async atomic)
+# ==========================================================
+
+
+@sync_to_async
+def _save_order(restaurant, table, session_key, total_price, order_items, card_items):
+    """บันทึก Order Header + Items + ข้อความแจ้งเตือนครัว ใน Transaction เดียว"""
+    # ถ้าพังกลางทาง จะไม่มีออเดอร์ครึ่งๆ กลางๆ ค้างอยู่ในระบบ
+    with transaction.atomic():
+        order = Order.objects.create(
+            restaurant=restaurant,
+            table=table,
+            status='PENDING',
+            total_price=total_price,
+            session_id=session_key or ''
+        )
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+        # เปิดบิลของโต๊ะ (ถ้ายังไม่มี) + บวกยอดเข้าบิล
+        table_sessions.apply_order(order, item_count=sum(order_item.quantity for order_item in order_items))
+
+        # การ์ดออเดอร์ใหม่ให้จอครัว/แคชเชียร์ต่อเข้าหน้าจอได้เลย (ส่งจริงโดย dispatcher หลัง commit)
+        card = realtime.order_card(order, table.name, card_items)
+        outbox.enqueue(outbox.restaurant_group(restaurant.id), realtime.order_created(card))
+    return order
+
+
+async def _place_order(request, table_uuid, cart_items):
+    """สร้างออเดอร์จริง คืนค่า (JsonResponse, order_id) โดย order_id เป็น None ถ้าสร้างไม่สำเร็จ"""
+    # 1. ตรวจสอบโต๊ะ + ร้าน จาก cache UUID โต๊ะ (ไม่แตะ DB ถ้าเคยเปิดแล้ว)
+    entry = await table_cache.aresolve(table_uuid)
+    if entry is None:
+        return JsonResponse({'error': 'ไม่พบโต๊ะนี้ กรุณาสแกน QR ใหม่', 'success': False}, status=404), None
+    table, restaurant = table_cache.build(entry, table_uuid)
+
+    # =======================================================
+    # ⭐ เพิ่ม Logic ป้องกันร้านโดนแบนตรงนี้ ⭐
+    # =======================================================
+    if not restaurant.is_active:
+        return JsonResponse({
+            'error': 'ขออภัย ร้านค้านี้ถูกระงับการให้บริการชั่วคราว',
+            'success': False
+        }, status=403), None
+    # =======================================================
+
+    # 2. ราคาและชื่อเมนูอ่านจาก Snapshot เมนูของร้าน (ชุดเดียวกับที่ลูกค้าเห็นในหน้าเมนู)
+    # มีเฉพาะเมนูของร้านนี้ที่เปิดขายอยู่ ไม่ต้อง Query MenuItem ซ้ำ
+    menu = (await aget_menu_snapshot(restaurant.id))['items']
+
+    # 3. เตรียม Order Items + คำนวณราคารวมในหน่วยความจำ
+    # (ข้ามรายการที่หาไม่เจอ เช่น Menu ID ผิดพลาด ถูกลบ หรือปิดขายไปแล้ว)
+    order_items = []
+    card_items = []
+    total_price = 0
+    for item_data in cart_items:
+        # Snapshot ใช้ id เป็น int: Client บางตัวส่ง id / qty มาเป็น string ("12") ต้องแปลงก่อน
+        try:
+            item_id = int(item_data['id'])
+            quantity = int(item_data['qty'])
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({'error': 'รายการอาหารไม่ถูกต้อง'}, status=400), None
+
+        menu_item = menu.get(item_id)
+        if menu_item is None:
+            continue
+
+        order_items.append(OrderItem(
+            menu_item_id=menu_item['id'],
+            name=menu_item['name'], # Snapshot ชื่อ
+            quantity=quantity,
+            price=menu_item['price'], # Snapshot ราคา
+            note=item_data.get('note', '')
+        ))
+        card_items.append({'name': menu_item['name'], 'quantity': quantity, 'note': item_data.get('note', '')})
+        total_price += (menu_item['price'] * quantity)
+
+    if not order_items:
+        return JsonResponse({'error': 'ไม่พบรายการอาหารที่สั่ง'}, status=400), None
+
+    # 4. สร้าง Order Header + Items + ข้อความแจ้งเตือนครัว (Outbox) ใน Transaction เดียว
+    order = await _save_order(restaurant, table, request.session.session_key, total_price, order_items, card_items)
+    prometheus.inc('rpos_orders_created_total', restaurant=restaurant.id)
+
+    return JsonResponse({'success': True, 'order_id': order.id}), order.id
+
 
 @csrf_exempt
-def create_order_api(request):
+async def create_order_api(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -25,81 +119,40 @@ def create_order_api(request):
             if not table_uuid or not cart_items:
                 return JsonResponse({'error': 'ข้อมูลไม่ครบถ้วน'}, status=400)
 
-            # 2. ตรวจสอบโต๊ะ
-            table = get_object_or_404(Table, uuid=table_uuid)
-            restaurant = table.restaurant
-
-            # =======================================================
-            # ⭐ เพิ่ม Logic ป้องกันร้านโดนแบนตรงนี้ ⭐
-            # =======================================================
-            if not restaurant.is_active:
-                return JsonResponse({
-                    'error': 'ขออภัย ร้านค้านี้ถูกระงับการให้บริการชั่วคราว',
-                    'success': False
-                }, status=403)
-            # =======================================================
-            
-            # 3. สร้าง Order Header
-            order = Order.objects.create(
-                restaurant=restaurant,
-                table=table,
-                status='PENDING',
-                session_id=request.session.session_key or ''
-            )
-            
-            total_price = 0
-            
-            # 4. วนลูปสร้าง Order Items
-            for item_data in cart_items:
-                # ใช้ try-except กันกรณี Menu ID ผิดพลาดหรือถูกลบไปแล้ว
-                try:
-                    menu_item = MenuItem.objects.get(id=item_data['id'])
-                except MenuItem.DoesNotExist:
-                    continue # ข้ามรายการที่หาไม่เจอ
-
-                OrderItem.objects.create(
-                    order=order,
-                    menu_item=menu_item,
-                    quantity=item_data['qty'],
-                    price=menu_item.price, # Snapshot ราคา
-                    note=item_data.get('note', '')
-                )
-                total_price += (menu_item.price * item_data['qty'])
-            
-            # 5. อัปเดตราคารวม
-            order.total_price = total_price
-            order.save()
+            # 2. กันกดส่งซ้ำ / Browser retry: ถ้าคีย์นี้เคยสร้างออเดอร์แล้ว ตอบ order_id เดิมกลับไปเลย
+            # (ไม่เขียน DB และไม่แจ้งเตือนครัวซ้ำ)
+            idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+            if idempotency_key is not None and not isinstance(idempotency_key, str):
+                return JsonResponse({'error': 'Idempotency key ต้องเป็นข้อความ'}, status=400)
+            if idempotency_key:
+                if len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+                    return JsonResponse({'error': 'Idempotency key ยาวเกินไป'}, status=400)
 
-            # ==========================================================
-            # ⭐ ADD THIS: ส่ง Real-time Notification
-            # ==========================================================
-            
-            # ดึงรายการอาหารที่เพิ่งสร้าง เพื่อส่งไปแสดงผล (ใช้ select_related เพื่อลด query)
-            # หมายเหตุ: ใช้ order.orderitem_set.all() เว้นแต่ใน models.py คุณตั้ง related_name='items'
-            created_items = order.items.select_related('menu_item').all()
-            
-            item_list = [
-                f"{item.menu_item.name} x{item.quantity}" 
-                for item in created_items
-            ]
-
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f'restaurant_{restaurant.id}',
-                {
-                    'type': 'order_notification',
-                    'message': 'New Order Received',
-                    'order': {
-                        'id': order.id,
-                        'table': table.name,
-                        'total_price': float(order.total_price),
-                        'items': item_list,
-                        'created_at': order.created_at.strftime('%H:%M')
-                    }
-                }
-            )
-            
-            return JsonResponse({'success': True, 'order_id': order.id})
+                is_new, previous_order_id = await idempotency.aclaim(table_uuid, idempotency_key)
+                if not is_new:
+                    if previous_order_id == idempotency.PENDING:
+                        # request แรกยังทำงานไม่เสร็จ ให้ Client รอแล้วลองใหม่ด้วยคีย์เดิม
+                        return JsonResponse({
+                            'error': 'กำลังส่งออเดอร์ก่อนหน้า กรุณารอสักครู่',
+                            'pending': True
+                        }, status=409)
+                    return JsonResponse({'success': True, 'order_id': previous_order_id, 'duplicate': True})
+
+            # 3. สร้างออเดอร์
+            try:
+                response, order_id = await _place_order(request, table_uuid, cart_items)
+            except Exception:
+                if idempotency_key:
+                    await idempotency.arelease(table_uuid, idempotency_key)
+                raise
+
+            if idempotency_key:
+                if order_id:
+                    await idempotency.acomplete(table_uuid, idempotency_key, order_id)
+                else:
+                    await idempotency.arelease(table_uuid, idempotency_key)
+
+            return response
             
         except Exception as e:
             # Print error ลง console เพื่อให้ debug ง่ายขึ้นเวลาเจอ 500
@@ -118,27 +171,32 @@ def update_order_status(request):
             order_id = data.get('order_id')
             new_status = data.get('status')
             
-            order = get_object_or_404(Order, id=order_id)
-            
-            order.status = new_status
-            order.save()
-            
-            # (Optional) ส่ง WebSocket บอก Dashboard ให้รีเฟรชสถานะด้วยก็ได้
-            # เพื่อให้แคชเชียร์คนอื่นเห็นว่า ออเดอร์นี้เปลี่ยนสถานะแล้ว
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f'restaurant_{order.restaurant.id}',
-                {
-                    'type': 'order_notification', # ใช้ type เดิมหรือสร้างใหม่ก็ได้
-                    'message': 'Order Updated',
-                    'order': {
-                        'id': order.id,
-                        'status': new_status,
-                        # ส่งข้อมูลแค่นี้พอเพื่อให้ Frontend รู้ว่าต้องรีเฟรช
-                        'refresh_only': True 
-                    }
-                }
-            )
+            # บันทึกสถานะ + Rollup ยอดขาย + ข้อความแจ้ง Dashboard ใน Transaction เดียว (ส่งจริงโดย dispatcher)
+            # เพื่อให้จอครัว/แคชเชียร์ทุกเครื่องแก้การ์ดออเดอร์/โต๊ะนี้ได้ทันที
+            with transaction.atomic():
+                # ล็อกแถวไว้ กันกดเปลี่ยนสถานะพร้อมกันแล้ว Rollup ถูกหักซ้ำ
+                order = get_object_or_404(Order.objects.select_for_update(), id=order_id)
+                was_counted = order.status == 'COMPLETED' and order.is_paid
+                was_open = table_sessions.is_open(order)
+
+                order.status = new_status
+                order.save()
+
+                # ออเดอร์ในบิลที่เปิดอยู่ถูกยกเลิก หักออกจาก Session ของโต๊ะ (ยกเลิกแล้วกลับมา บวกคืน)
+                if was_open != table_sessions.is_open(order):
+                    table_sessions.apply_order(order, sign=-1 if was_open else 1)
+
+                # ออเดอร์ที่จ่ายแล้วถูกยกเลิก (หรือกลับมาเป็น COMPLETED) ต้องแก้ยอดใน Rollup ด้วย
+                is_counted = order.status == 'COMPLETED' and order.is_paid
+                if was_counted != is_counted:
+                    rollups.apply_orders([order.id], sign=1 if is_counted else -1)
+
+                # ยอดบิลของโต๊ะเปลี่ยนได้ (เช่น ยกเลิกออเดอร์) จึงส่งสถานะโต๊ะล่าสุดไปด้วย
+                table = floor.table_state(order.table_id) if order.table_id else None
+                outbox.enqueue(
+                    outbox.restaurant_group(order.restaurant_id),
+                    realtime.order_status_changed(order, table)
+                )
             
             return JsonResponse({'success': True, 'status': new_status})
         except Exception as e:
@@ -149,7 +207,7 @@ def update_order_status(request):
 
 
 # ดึงรายการทั้งหมดที่โต๊ะนั้นสั่ง (ที่ยังไม่จ่ายเงิน)
-def get_table_order_history(request):
+async def get_table_order_history(request):
     """API สำหรับดึงรายการอาหารที่สั่งไปแล้วของโต๊ะนั้น"""
     table_uuid = request.GET.get('table_uuid')
     
@@ -157,43 +215,53 @@ def get_table_order_history(request):
         return JsonResponse({'error': 'Missing table UUID'}, status=400)
     
     try:
-        table = Table.objects.get(uuid=table_uuid)
-        
-        # 1. หาออเดอร์ทั้งหมดของโต๊ะนี้ที่ยังไม่จ่ายเงิน (Active Orders)
-        active_orders = table.orders.filter(is_paid=False).exclude(status='CANCELLED').prefetch_related('items__menu_item')
+        entry = await table_cache.aresolve(table_uuid)
+        if entry is None:
+            return JsonResponse({'error': 'Table not found'}, status=404)
+        table, restaurant = table_cache.build(entry, table_uuid)
         
+        # 1. บิลของโต๊ะจาก cache ชุดเดียวกับหน้าแคชเชียร์ / จอลูกค้า (billing.table_bill)
+        # ยอด SVC / VAT / ยอดสุทธิ จึงตรงกับที่แคชเชียร์เก็บเงินเสมอ ไม่มีบิลค้าง = ยังไม่ได้สั่งอะไร ไม่ต้องดึงออเดอร์
+        bill = await sync_to_async(billing.table_bill)(table.id, restaurant)
+
         history_items = []
-        grand_total = 0
         
-        for order in active_orders:
-            for item in order.items.all():
-                item_total = item.price * item.quantity
-                grand_total += item_total
-                
+        # 2. รายการอาหารของออเดอร์ที่ยังไม่จ่ายเงิน (Active Orders)
+        if bill is not None:
+            active_orders = table.orders.filter(is_paid=False).exclude(status='CANCELLED').prefetch_related('items__menu_item')
+        
+            async for order in active_orders:
                 # แปลงสถานะเป็นข้อความภาษาไทยสวยๆ
-                status_display = item.order.get_status_display()
-                status_color = 'gray'
-                if item.order.status == 'PENDING': status_color = 'yellow'
-                elif item.order.status == 'COOKING': status_color = 'blue'
-                elif item.order.status == 'SERVED': status_color = 'green'
+                status_display = order.get_status_display()
+
+                for item in order.items.all():
+                    item_total = item.price * item.quantity
                 
-                history_items.append({
-                    'name': item.menu_item.name,
-                    'quantity': item.quantity,
-                    'price': float(item.price),
-                    'total': float(item_total),
-                    'status': status_display,
-                    'status_code': item.order.status, # เอาไว้ใช้เลือกสี
-                    'time': item.order.created_at.strftime('%H:%M')
-                })
-        
+                    history_items.append({
+                        'name': item.menu_item.name,
+                        'quantity': item.quantity,
+                        'price': float(item.price),
+                        'total': float(item_total),
+                        'status': status_display,
+                        'status_code': order.status, # เอาไว้ใช้เลือกสี
+                        'time': order.created_at.strftime('%H:%M')
+                    })
+        else:
+            bill = billing.compute_totals([], restaurant.service_charge_percent, restaurant.vat_percent)
+
         return JsonResponse({
             'success': True,
             'items': history_items,
-            'grand_total': float(grand_total)
+            'subtotal': float(bill['subtotal']),
+            'service_charge': float(bill['service_charge']),
+            'vat': float(bill['vat']),
+            'grand_total': float(bill['grand_total']),
         })
         
-    except Table.DoesNotExist:
-        return JsonResponse({'error': 'Table not found'}, status=404)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+# สถิติการกันออเดอร์ซ้ำ (ดูว่า Idempotency Key ช่วยกันโหลดซ้ำไปได้เท่าไหร่)
+@user_passes_test(lambda u: u.is_superuser)
+def idempotency_stats_api(request):
+    return JsonResponse({'success': True, **idempotency.get_stats()})
@@ -0,0 +1,139 @@
+# orders/billing.py
+# คิดเงินบิลของโต๊ะ (ที่เดียวในระบบ): รวมบรรทัด -> ยอดสินค้า -> Service Charge -> VAT -> ยอดสุทธิ
+# - หน้าบิลแคชเชียร์ / จอลูกค้า (OrderConsumer) / ประวัติของลูกค้า อ่านผลชุดเดียวกันจาก cache
+# - กฎปัดเศษ: ทุกยอด (ยอดสินค้า / SVC / VAT) ปัดเป็นสตางค์แบบ ROUND_HALF_UP ก่อนนำไปคิดต่อ
+#   ยอดสุทธิ = ผลบวกของยอดที่ปัดแล้ว (ตัวเลขบนบิลจึงบวกกันได้ลงตัวเสมอ)
+# - cache ผูกกับ "เวอร์ชันบิล" ของโต๊ะ: ออเดอร์ / รายการอาหารของโต๊ะเปลี่ยน = เปลี่ยนเวอร์ชัน (ดู signals.py)
+#   และผูกกับ % SVC / VAT ของร้าน (แก้ตั้งค่าร้าน = คีย์ใหม่)
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import DecimalField, F, Max, Min, OuterRef, Subquery, Sum
+
+from .models import Order, OrderItem
+
+SATANG = Decimal('0.01')
+HUNDRED = Decimal('100')
+# โต๊ะที่ไม่มีบิลค้าง (เก็บใน cache ได้เหมือนบิลปกติ)
+NO_BILL = 'none'
+
+
+def round_money(value):
+    return Decimal(value).quantize(SATANG, rounding=ROUND_HALF_UP)
+
+
+def compute_totals(line_totals, service_charge_percent, vat_percent):
+    """ยอดสินค้า / SVC / VAT / ยอดสุทธิ จากยอดของแต่ละบรรทัด (Decimal ทั้งหมด ปัดเป็นสตางค์)"""
+    subtotal = round_money(sum(line_totals, Decimal('0')))
+    service_charge = round_money(subtotal * (service_charge_percent or Decimal('0')) / HUNDRED)
+    vat = round_money((subtotal + service_charge) * (vat_percent or Decimal('0')) / HUNDRED)
+    return {
+        'subtotal': subtotal,
+        'service_charge': service_charge,
+        'vat': vat,
+        'grand_total': subtotal + service_charge + vat,
+    }
+
+
+def open_orders(table_id):
+    """ออเดอร์ที่ยัง "เปิดบิล" อยู่ของโต๊ะ: ยังไม่จ่าย และไม่ถูกยกเลิก"""
+    return Order.objects.filter(table_id=table_id, is_paid=False).exclude(status='CANCELLED')
+
+
+def bill_lines(table_id):
+    """รายการอาหารที่ยังค้างชำระของโต๊ะ รวมบรรทัดที่เมนูและราคาเดียวกัน (1 Query)
+
+    ราคาต่างกัน = คนละบรรทัด (ราคาเปลี่ยนระหว่างมื้อ ต้องแยกเพื่อความถูกต้องทางบัญชี)
+    id / status / order_time มาจากรายการล่าสุดของบรรทัดนั้น (ลบรายการ = ลบตัวล่าสุดก่อน LIFO)
+    เรียงตามรายการแรกของแต่ละบรรทัด
+    """
+    open_items = (
+        OrderItem.objects
+        .filter(order__table_id=table_id, order__is_paid=False)
+        .exclude(order__status='CANCELLED')
+    )
+    # รายการล่าสุดของบรรทัดเดียวกัน (เมนู + ราคา เดียวกัน)
+    latest = open_items.filter(menu_item_id=OuterRef('menu_item_id'), price=OuterRef('price')).order_by('-id')[:1]
+    rows = (
+        open_items
+        .values('menu_item_id', 'menu_item__name', 'price')
+        # ชื่อ annotate ห้ามซ้ำกับ field ของ OrderItem (id / quantity)
+        .annotate(
+            line_quantity=Sum('quantity'),
+            line_total=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            latest_id=Max('id'),
+            first_id=Min('id'),
+            latest_status=Subquery(latest.values('order__status')),
+            latest_time=Subquery(latest.values('order__created_at')),
+        )
+        .order_by('first_id')
+    )
+    return [
+        {
+            'id': row['latest_id'], # ID สำหรับใช้ลบ (Delete Item)
+            'menu_name': row['menu_item__name'],
+            'quantity': row['line_quantity'],
+            'price': row['price'],
+            'total': row['line_total'],
+            'order_time': row['latest_time'],
+            'status': row['latest_status'],
+        }
+        for row in rows
+    ]
+
+
+def _ttl():
+    return getattr(settings, 'BILL_CACHE_TTL', 60 * 60 * 6)
+
+
+def _version_key(table_id):
+    return f'bill_version:{table_id}'
+
+
+def _bill_key(table_id, version, service_charge_percent, vat_percent):
+    return f'bill:{table_id}:v{version}:{service_charge_percent}:{vat_percent}'
+
+
+def bump_bill_version(table_id):
+    """เปลี่ยนเวอร์ชันบิลของโต๊ะ (บิลเดิมใน cache จะไม่ถูกอ่านอีก)"""
+    # ใช้เวลาเป็นเลขเวอร์ชัน เหมือน menu_cache: คีย์เวอร์ชันโดน evict ก็ไม่วนกลับไปเจอบิลเก่า
+    cache.set(_version_key(table_id), time.time_ns(), None)
+
+
+def build_bill(table_id, service_charge_percent, vat_percent):
+    """คำนวณบิลจาก DB (2 Query: ออเดอร์แรก + บรรทัดที่รวมแล้ว) คืน NO_BILL ถ้าไม่มีออเดอร์ค้าง"""
+    # เช็คจากออเดอร์ ไม่ใช่รายการอาหาร: ออเดอร์ที่ถูกลบรายการจนหมดยังต้องปิดบิลได้
+    first_order = open_orders(table_id).order_by('created_at').values('id', 'created_at').first()
+    if first_order is None:
+        return NO_BILL
+
+    lines = bill_lines(table_id)
+    return {
+        'lines': lines,
+        'first_order_id': first_order['id'],
+        'opened_at': first_order['created_at'],
+        **compute_totals([line['total'] for line in lines], service_charge_percent, vat_percent),
+    }
+
+
+def table_bill(table_id, restaurant):
+    """บิลปัจจุบันของโต๊ะ (อ่านจาก cache ถ้าไม่มีค่อยคำนวณ) คืน None ถ้าไม่มีบิลค้าง
+
+    restaurant ต้องมี service_charge_percent / vat_percent
+    """
+    service_charge_percent, vat_percent = restaurant.service_charge_percent, restaurant.vat_percent
+    version = cache.get(_version_key(table_id))
+    if version is None:
+        version = time.time_ns()
+        # add: ถ้ามี request อื่นตั้งเวอร์ชันไปพร้อมกัน ให้ใช้ของเขา
+        if not cache.add(_version_key(table_id), version, None):
+            version = cache.get(_version_key(table_id), version)
+
+    key = _bill_key(table_id, version, service_charge_percent, vat_percent)
+    bill = cache.get(key)
+    if bill is None:
+        bill = build_bill(table_id, service_charge_percent, vat_percent)
+        cache.set(key, bill, _ttl())
+    return None if bill == NO_BILL else bill
@@ -2,6 +2,8 @@ import json
 import traceback
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from users import instrumentation, prometheus
+
 class OrderConsumer(AsyncWebsocketConsumer):
     
     # ------------------------------------------------------------------
@@ -20,6 +22,9 @@ class OrderConsumer(AsyncWebsocketConsumer):
             )
 
             await self.accept()
+            # นับจำนวนจอที่ต่ออยู่ต่อกลุ่ม (ลดลงตอน disconnect)
+            prometheus.gauge_add('rpos_websocket_connections', 1, group=self.room_group_name)
+            self.counted = True
             print(f"✅ Client Connected to Group: {self.room_group_name}")
 
         except Exception as e:
@@ -30,6 +35,9 @@ class OrderConsumer(AsyncWebsocketConsumer):
     # 2. DISCONNECT: ตัดการเชื่อมต่อ
     # ------------------------------------------------------------------
     async def disconnect(self, close_code):
+        if getattr(self, 'counted', False):
+            prometheus.gauge_add('rpos_websocket_connections', -1, group=self.room_group_name)
+            self.counted = False
         try:
             await self.channel_layer.group_discard(
                 self.room_group_name,
@@ -52,7 +60,8 @@ class OrderConsumer(AsyncWebsocketConsumer):
             # กรณี 1: สั่งโชว์หน้าจ่ายเงิน
             if command == 'show_customer_payment':
                 print(f"📢 Broadcasting 'show_customer_payment' to group {self.room_group_name}")
-                await self.channel_layer.group_send(
+                await instrumentation.group_send(
+                    self.channel_layer,
                     self.room_group_name,
                     {
                         'type': 'show_customer_payment', # ชื่อเมธอดที่จะทำงาน (ข้อ 4.1)
@@ -64,7 +73,8 @@ class OrderConsumer(AsyncWebsocketConsumer):
             # กรณี 2: สั่งปิดหน้าจอ
             elif command == 'hide_customer_payment':
                 print(f"📢 Broadcasting 'hide_customer_payment' to group {self.room_group_name}")
-                await self.channel_layer.group_send(
+                await instrumentation.group_send(
+                    self.channel_layer,
                     self.room_group_name,
                     {
                         'type': 'hide_customer_payment' # ชื่อเมธอดที่จะทำงาน (ข้อ 4.2)
@@ -125,4 +135,11 @@ class OrderConsumer(AsyncWebsocketConsumer):
         }))
 
 
-    
\ No newline at end of file
+    # ⭐ Delta สำหรับจอครัว / แคชเชียร์ (ดู orders/realtime.py)
+    # ส่งต่อให้ JS ตรงๆ: command = ชื่อเหตุการณ์ (order_created / order_status_changed / table_closed)
+    async def order_delta(self, event):
+        payload = {key: value for key, value in event.items() if key not in ('type', 'event')}
+        await self.send(text_data=json.dumps({
+            'command': event['event'],
+            **payload
+        }))
@@ -0,0 +1,63 @@
+# orders/idempotency.py
+# กันออเดอร์ซ้ำจากการกดส่งซ้ำ / Browser retry เอง
+# Client จะส่ง Idempotency-Key มากับทุกครั้งที่ยิงตะกร้าเดิม ถ้าคีย์นี้เคยสร้างออเดอร์แล้ว
+# เราจะตอบ order_id เดิมกลับไปจาก Cache ทันที โดยไม่แตะ DB และไม่ส่ง WebSocket ซ้ำ
+# - การจองคีย์ใช้ cache.add: กันซ้ำได้ข้าม worker ก็ต่อเมื่อเป็น cache ที่ใช้ร่วมกัน (Redis)
+#   ถ้าเป็น locmem แต่ละ process จะจองคีย์เดียวกันได้เอง (settings บังคับ CACHE_URL เมื่อไม่ใช่ DEBUG)
+from django.conf import settings
+from django.core.cache import cache
+
+PENDING = 'PENDING'  # จองคีย์แล้ว แต่ request แรกยังสร้างออเดอร์ไม่เสร็จ
+MAX_KEY_LENGTH = 100
+
+_STATS_KEYS = {
+    'hits': 'order_idem_stats:hits',
+    'misses': 'order_idem_stats:misses',
+}
+
+
+def _cache_key(table_uuid, key):
+    return f'order_idem:{table_uuid}:{key}'
+
+
+def _ttl():
+    return getattr(settings, 'ORDER_IDEMPOTENCY_TTL', 600)
+
+
+async def _count(name):
+    stats_key = _STATS_KEYS[name]
+    # incr จะ error ถ้ายังไม่มีคีย์ เลยต้อง add ค่าเริ่มต้นไว้ก่อน (ไม่หมดอายุ)
+    await cache.aadd(stats_key, 0, None)
+    try:
+        await cache.aincr(stats_key)
+    except ValueError:
+        # คีย์โดน evict ไประหว่างทาง นับใหม่ได้
+        await cache.aset(stats_key, 1, None)
+
+
+async def aclaim(table_uuid, key):
+    """จองคีย์ คืน (True, None) ถ้าเป็นครั้งแรก หรือ (False, order_id / PENDING) ถ้าเป็นคำขอซ้ำ"""
+    cache_key = _cache_key(table_uuid, key)
+
+    # cache.add เป็น atomic: มีแค่ request เดียวที่จองคีย์ได้ แม้จะยิงมาพร้อมกัน
+    if await cache.aadd(cache_key, PENDING, _ttl()):
+        await _count('misses')
+        return True, None
+
+    await _count('hits')
+    return False, await cache.aget(cache_key, PENDING)
+
+
+async def acomplete(table_uuid, key, order_id):
+    """บันทึก order_id ที่สร้างสำเร็จ เพื่อใช้ตอบคำขอซ้ำ"""
+    await cache.aset(_cache_key(table_uuid, key), order_id, _ttl())
+
+
+async def arelease(table_uuid, key):
+    """ปลดคีย์เมื่อสร้างออเดอร์ไม่สำเร็จ ให้ Client ลองใหม่ด้วยคีย์เดิมได้"""
+    await cache.adelete(_cache_key(table_uuid, key))
+
+
+def get_stats():
+    values = cache.get_many(_STATS_KEYS.values())
+    return {name: values.get(stats_key, 0) for name, stats_key in _STATS_KEYS.items()}
@@ -0,0 +1,135 @@
+# orders/management/commands/bench_diner_concurrency.py
+# วัดผล API ฝั่งลูกค้า (dining_menu / create_order_api / get_table_order_history)
+# เทียบแบบ async (ของจริง) กับแบบ sync (ห่อ view เดิมให้วิ่งใน Thread แบบที่ Django ทำกับ sync view)
+# ยิงพร้อมกันผ่าน ASGI stack เต็มรูปแบบ (middleware ครบ) บน Database ชั่วคราว
+#
+# ตัวอย่าง: python manage.py bench_diner_concurrency --diners 200 --query-delay-ms 5
+import asyncio
+import json
+import time
+from functools import wraps
+
+from asgiref.sync import ThreadSensitiveContext, async_to_sync
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, override_settings
+from django.urls import include, path
+from django.views.decorators.csrf import csrf_exempt
+
+from dining import views as dining_views
+from orders import api
+from restaurants.benchmark import benchmark_database, seed_restaurant, format_summary
+
+
+def _as_sync(async_view):
+    """ห่อ async view ให้เป็น sync view: ทั้ง request จะจอง Thread ไว้เหมือน view แบบ sync เดิม"""
+    run = async_to_sync(async_view)
+
+    @csrf_exempt
+    @wraps(async_view)
+    def sync_view(request, *args, **kwargs):
+        return run(request, *args, **kwargs)
+
+    return sync_view
+
+
+# URL ชุดพิเศษสำหรับ benchmark: /bench-sync/... คือเส้นทาง sync, ที่เหลือใช้ URL จริง
+urlpatterns = [
+    path('bench-sync/dining/<slug:shop_slug>/<uuid:table_uuid>/', _as_sync(dining_views.dining_menu)),
+    path('bench-sync/orders/api/create/', _as_sync(api.create_order_api)),
+    path('bench-sync/orders/api/history/', _as_sync(api.get_table_order_history)),
+    path('', include('config.urls')),
+]
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+}
+
+
+class Command(BaseCommand):
+    help = 'เทียบ latency ของ API ฝั่งลูกค้าแบบ sync กับ async เมื่อมีลูกค้ายิงพร้อมกันหลายร้อยคน'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--diners', type=int, default=200, help='จำนวนลูกค้าที่ยิงพร้อมกัน (default 200)')
+        parser.add_argument(
+            '--query-delay-ms', type=float, default=5.0,
+            help='หน่วงทุก Query เพิ่ม (จำลอง DB ที่อยู่คนละเครื่อง / Query ช้า) default 5ms'
+        )
+        parser.add_argument(
+            '--flows', default='menu,history,order',
+            help='เลือก flow ที่จะวัด คั่นด้วย , (menu / history / order)'
+        )
+
+    def handle(self, *args, **options):
+        diners = options['diners']
+        delay = options['query_delay_ms'] / 1000
+        flows = [f.strip() for f in options['flows'].split(',') if f.strip()]
+
+        with benchmark_database(), override_settings(
+            ROOT_URLCONF=__name__,
+            CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+        ):
+            restaurant = seed_restaurant(tables=diners, categories=6, items_per_category=12)
+            tables = list(restaurant.tables.all())
+            menu_ids = list(restaurant.categories.values_list('items__id', flat=True)[:5])
+
+            # หน่วงทุก Query ในทุก Connection (แต่ละ Thread มี Connection ของตัวเอง)
+            def slow_query(execute, sql, params, many, context):
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+
+            def install_delay(sender, connection, **kwargs):
+                connection.execute_wrappers.append(slow_query)
+
+            connection_created.connect(install_delay)
+            connection.execute_wrappers.append(slow_query)
+            try:
+                self.stdout.write(
+                    f"🍽  {diners} diners, +{options['query_delay_ms']}ms per query\n"
+                )
+                for flow in flows:
+                    for mode in ('sync', 'async'):
+                        samples, errors, wall = asyncio.run(
+                            self.run_flow(flow, mode, restaurant, tables, menu_ids)
+                        )
+                        label = f'{flow} [{mode}]'
+                        self.stdout.write(format_summary(label, samples))
+                        self.stdout.write(
+                            f"{'':<28} wall={wall * 1000:8.1f}ms  "
+                            f"throughput={len(samples) / wall:7.1f} req/s  errors={errors}"
+                        )
+            finally:
+                connection_created.disconnect(install_delay)
+                connection.execute_wrappers.remove(slow_query)
+
+    async def run_flow(self, flow, mode, restaurant, tables, menu_ids):
+        prefix = '/bench-sync' if mode == 'sync' else ''
+
+        async def one_diner(table):
+            client = AsyncClient()
+            if flow == 'menu':
+                request = client.get(f'{prefix}/dining/{restaurant.slug}/{table.uuid}/')
+            elif flow == 'history':
+                request = client.get(f'{prefix}/orders/api/history/', {'table_uuid': str(table.uuid)})
+            else:
+                cart = [{'id': menu_id, 'qty': 1} for menu_id in menu_ids]
+                request = client.post(
+                    f'{prefix}/orders/api/create/',
+                    data=json.dumps({'table_uuid': str(table.uuid), 'cart': cart}),
+                    content_type='application/json',
+                )
+            # ASGIHandler ของจริง (ใต้ daphne) เปิด ThreadSensitiveContext ให้ทุก request
+            # แต่ AsyncClient ไม่ได้ทำ ต้องเปิดเอง ไม่งั้นทุก request จะไปต่อคิว Thread เดียวกันหมด
+            async with ThreadSensitiveContext():
+                started = time.perf_counter()
+                response = await request
+            return (time.perf_counter() - started) * 1000, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one_diner(table) for table in tables))
+        wall = time.perf_counter() - started
+
+        samples = [elapsed for elapsed, _ in results]
+        errors = sum(1 for _, status in results if status >= 400)
+        return samples, errors, wall
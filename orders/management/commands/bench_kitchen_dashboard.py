@@ -0,0 +1,78 @@
+# orders/management/commands/bench_kitchen_dashboard.py
+# วัดผลหน้าจอครัว (kitchen_dashboard) ตามจำนวนออเดอร์ที่ค้างอยู่ บน Database ชั่วคราว
+# - naive: วน order.items.all / item.menu_item.name ทีละออเดอร์ (แบบที่ template เดิมทำ) ไว้เทียบ
+# - cold : การ์ดยังไม่อยู่ใน cache (สร้างจาก DB ทั้งหมด)
+# - warm : การ์ดอยู่ใน cache แล้ว (สถานะปกติระหว่างวัน)
+#
+# หมายเหตุ: cache แบบ locmem (ค่าเริ่มต้นตอนไม่ตั้ง CACHE_URL) เก็บได้ 300 คีย์ ที่ 500 ออเดอร์ warm จะกลายเป็น cold
+# ให้ตั้ง CACHE_URL เป็น Redis แบบเดียวกับ Production ก่อนวัด
+#
+# ตัวอย่าง: python manage.py bench_kitchen_dashboard --orders 10,100,500 --requests 30
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from restaurants.benchmark import benchmark_database, seed_restaurant, seed_orders, format_summary
+
+
+def _naive_cards(restaurant):
+    # โครงสร้างเดียวกับ template เดิม: Query ออเดอร์ แล้วแตะ table / items / menu_item ทีละแถว
+    cards = []
+    for order in restaurant.orders.filter(status__in=['PENDING', 'COOKING']).order_by('created_at'):
+        cards.append({
+            'table': order.table.name,
+            'items': [(item.quantity, item.menu_item.name, item.note) for item in order.items.all()],
+        })
+    return cards
+
+
+class Command(BaseCommand):
+    help = 'วัด latency และจำนวน Query ของหน้าจอครัวที่ 10 / 100 / 500 ออเดอร์ค้าง (naive / cold / warm)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', default='10,100,500', help='จำนวนออเดอร์ค้าง คั่นด้วย , (default 10,100,500)')
+        parser.add_argument('--requests', type=int, default=30, help='จำนวนรอบต่อแบบ (default 30)')
+        parser.add_argument('--items-per-order', type=int, default=3, help='จำนวนรายการอาหารต่อออเดอร์ (default 3)')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['orders'].split(',') if size.strip()]
+        total = options['requests']
+
+        with benchmark_database():
+            for size in sizes:
+                restaurant = seed_restaurant(tables=30, categories=5, items_per_category=10)
+                seed_orders(restaurant, size, items_per_order=options['items_per_order'])
+
+                client = Client()
+                client.force_login(restaurant.owner)
+                url = reverse('kitchen_dashboard')
+                client.get(url)  # warm-up (session / template)
+
+                self.stdout.write(f"\n👨‍🍳 {size} open orders x {options['items_per_order']} items")
+                self.measure('naive', total, lambda: _naive_cards(restaurant))
+                self.measure('cold', total, lambda: client.get(url), before=cache.clear)
+                self.measure('warm', total, lambda: client.get(url))
+
+    def measure(self, mode, total, send, before=None):
+        samples, queries = [], []
+        for _ in range(total):
+            if before:
+                before()
+            # Log ของ connection เก็บได้จำกัด (9000 Query) ล้างทุกรอบไม่ให้นับผิดตอนออเดอร์เยอะ
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = send()
+                samples.append((time.perf_counter() - started) * 1000)
+            if getattr(response, 'status_code', 200) != 200:
+                raise RuntimeError(f'{mode} -> HTTP {response.status_code}')
+            queries.append(len(ctx.captured_queries))
+
+        self.stdout.write(format_summary(mode, samples))
+        self.stdout.write(f"{'':<28} queries/request={statistics.fmean(queries):.1f}")
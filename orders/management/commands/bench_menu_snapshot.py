@@ -0,0 +1,83 @@
+# orders/management/commands/bench_menu_snapshot.py
+# วัดผล Snapshot เมนู (restaurants/menu_cache.py) บน Database ชั่วคราว
+# - cold: เปลี่ยนเวอร์ชันเมนูก่อนทุก request (เหมือนเพิ่งแก้เมนู ต้องสร้าง Snapshot ใหม่จาก DB)
+# - warm: อ่าน Snapshot ที่อยู่ใน cache แล้ว
+# วัดทั้งหน้าเมนู (dining_menu) และการสั่งอาหาร (create_order_api) พร้อมจำนวน Query ต่อ request
+#
+# ตัวอย่าง: python manage.py bench_menu_snapshot --requests 200 --categories 10 --items-per-category 20
+import json
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from restaurants.benchmark import benchmark_database, seed_restaurant, format_summary
+from restaurants.menu_cache import bump_menu_version
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+}
+
+
+class Command(BaseCommand):
+    help = 'เทียบ latency และจำนวน Query ของหน้าเมนู/การสั่งอาหาร ตอน Snapshot เมนูยังไม่อยู่ใน cache (cold) กับอยู่แล้ว (warm)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='จำนวน request ต่อแบบ (default 200)')
+        parser.add_argument('--categories', type=int, default=8, help='จำนวนหมวดหมู่ของร้านจำลอง (default 8)')
+        parser.add_argument('--items-per-category', type=int, default=15, help='จำนวนเมนูต่อหมวด (default 15)')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+
+        with benchmark_database(), override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS):
+            restaurant = seed_restaurant(
+                tables=1,
+                categories=options['categories'],
+                items_per_category=options['items_per_category'],
+            )
+            table = restaurant.tables.get()
+            menu_ids = list(restaurant.categories.values_list('items__id', flat=True)[:5])
+            cache.clear()
+
+            # Client แบบ sync: async view วิ่งผ่าน async_to_sync และ Query กลับมาที่ Thread หลัก
+            # CaptureQueriesContext จึงนับ Query ได้ครบ
+            client = Client()
+            menu_url = reverse('dining_menu', args=[restaurant.slug, table.uuid])
+            order_url = reverse('api_create_order')
+            order_body = json.dumps({
+                'table_uuid': str(table.uuid),
+                'cart': [{'id': menu_id, 'qty': 1} for menu_id in menu_ids],
+            })
+
+            flows = {
+                'menu': lambda: client.get(menu_url),
+                'order': lambda: client.post(order_url, data=order_body, content_type='application/json'),
+            }
+
+            self.stdout.write(
+                f"📋 {options['categories']} categories x {options['items_per_category']} items, "
+                f"{total} requests per run\n"
+            )
+            for flow, send in flows.items():
+                send()  # warm-up (session / import ครั้งแรก)
+                for mode in ('cold', 'warm'):
+                    samples, queries = [], []
+                    for _ in range(total):
+                        if mode == 'cold':
+                            bump_menu_version(restaurant.id)
+                        with CaptureQueriesContext(connection) as ctx:
+                            started = time.perf_counter()
+                            response = send()
+                            samples.append((time.perf_counter() - started) * 1000)
+                        if response.status_code != 200:
+                            raise RuntimeError(f'{flow} [{mode}] -> HTTP {response.status_code}')
+                        queries.append(len(ctx.captured_queries))
+
+                    self.stdout.write(format_summary(f'{flow} [{mode}]', samples))
+                    self.stdout.write(f"{'':<28} queries/request={statistics.fmean(queries):.1f}")
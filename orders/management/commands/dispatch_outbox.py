@@ -0,0 +1,73 @@
+# orders/management/commands/dispatch_outbox.py
+# ตัวส่งข้อความ Real-time จาก Outbox เข้า Channel Layer (ต้องรันคู่กับ daphne เสมอ)
+#
+# ตัวอย่าง:
+#   python manage.py dispatch_outbox              # รันค้างไว้ (production)
+#   python manage.py dispatch_outbox --once       # ส่งที่ค้างอยู่ให้หมดแล้วจบ
+import datetime
+import time
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from orders.outbox import dispatch_batch, outbox_stats, purge_dispatched
+
+
+class Command(BaseCommand):
+    help = 'ส่งข้อความ Real-time ที่ค้างใน Outbox เข้า Channel Layer เป็นชุดๆ พร้อมรายงาน lag / backlog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=0.2, help='เวลารอ (วินาที) เมื่อไม่มีข้อความค้าง')
+        parser.add_argument('--report-every', type=float, default=30.0, help='รายงาน lag / backlog ทุกกี่วินาที')
+        parser.add_argument('--retention-hours', type=float, default=24.0, help='เก็บข้อความที่ถูกทิ้ง (ส่งไม่ได้) ไว้ตรวจกี่ชั่วโมง')
+        parser.add_argument('--once', action='store_true', help='ส่งที่ค้างให้หมดแล้วจบการทำงาน')
+
+    def handle(self, *args, **options):
+        channel_layer = get_channel_layer()
+        batch_size = options['batch_size']
+        retention = datetime.timedelta(hours=options['retention_hours'])
+
+        sent_since_report = 0
+        last_report = time.monotonic()
+        last_purge = 0.0
+
+        self.report(0, 0.0)
+        while True:
+            try:
+                sent = dispatch_batch(channel_layer, batch_size)
+            except Exception as e:
+                # DB / Redis มีปัญหาชั่วคราว: รอแล้วลองใหม่ ข้อความยังอยู่ใน Outbox ไม่หาย
+                self.stderr.write(f"❌ Outbox dispatch error: {e}")
+                close_old_connections()
+                sent = 0
+                time.sleep(options['interval'] * 5)
+
+            sent_since_report += sent
+            now = time.monotonic()
+
+            if now - last_report >= options['report_every']:
+                self.report(sent_since_report, now - last_report)
+                sent_since_report = 0
+                last_report = now
+
+            if now - last_purge >= 3600:
+                purged = purge_dispatched(retention)
+                if purged:
+                    self.stdout.write(f"🧹 Purged {purged} dispatched outbox events")
+                last_purge = now
+
+            if sent < batch_size:
+                if options['once']:
+                    self.report(sent_since_report, time.monotonic() - last_report)
+                    return
+                time.sleep(options['interval'])
+
+    def report(self, sent, elapsed):
+        stats = outbox_stats()
+        rate = sent / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"📮 outbox backlog={stats['backlog']} lag={stats['lag_seconds']:.2f}s "
+            f"sent={sent} rate={rate:.1f}/s"
+        )
@@ -0,0 +1,261 @@
+# orders/management/commands/loadtest.py
+# Load test ทั้ง flow ของร้าน ยิงไปที่ Server ที่รันอยู่จริง (daphne / runserver) ผ่าน HTTP
+# จำลองโต๊ะละ 1 กลุ่มลูกค้า วนไปเรื่อยๆ จนหมดเวลา:
+#   สแกน QR (dining_menu) -> สั่งอาหารหลายรอบ (create_order_api) -> ดูรายการที่สั่ง (get_table_order_history)
+#   -> แคชเชียร์ปิดบิล (close_bill) -> โต๊ะได้ UUID ใหม่ ลูกค้ากลุ่มถัดไปสแกนใหม่
+# ระหว่างนั้นพนักงานครัวรับออเดอร์ไปเปลี่ยนสถานะ PENDING -> COOKING -> SERVED (update_order_status)
+# จบแล้วสรุป p50 / p95 / p99 และ throughput แยกตาม Endpoint ใช้ประเมินว่าเครื่องหนึ่งรับได้กี่โต๊ะ / เทียบระหว่าง release
+#
+# ต้องรันคำสั่งนี้กับ Database เดียวกับ Server (คำสั่งนี้สร้างร้าน / Session พนักงาน / อ่าน UUID โต๊ะจาก DB ตรงๆ)
+# Channel Layer ของ Server จะเป็น Redis หรือ InMemory ก็ได้ ถ้าจะวัดการส่ง WebSocket ด้วยให้รัน dispatch_outbox คู่กันไป
+# ใช้ Postgres แบบเดียวกับ Production ในการวัด: SQLite เขียนพร้อมกันไม่ได้ จะเห็น 500 (database is locked) ที่ครัว / ปิดบิล
+#
+# ตัวอย่าง:
+#   daphne config.asgi:application -p 8000            (อีก Terminal)
+#   python manage.py loadtest --seed --tables 40 --duration 120 --think-time 1.5
+import json
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from http.cookiejar import Cookie, CookieJar
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from restaurants.benchmark import seed_restaurant, format_summary
+from restaurants.models import Restaurant, Table, MenuItem
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # close_bill ตอบ 302 กลับหน้า Cashier ไม่ต้องตามไปโหลดหน้านั้น (จะนับเวลาผิด Endpoint)
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _cookie(name, value, host):
+    return Cookie(
+        0, name, value, None, False, host, False, False, '/', True,
+        False, None, False, None, None, {},
+    )
+
+
+class Recorder:
+    """เก็บเวลาตอบกลับ (ms) และ error แยกตาม Endpoint / HTTP status (ใช้ร่วมกันหลาย Thread)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def add(self, endpoint, elapsed_ms, status):
+        with self.lock:
+            self.samples[endpoint].append(elapsed_ms)
+            if not 0 < status < 400:
+                self.errors[endpoint][status or 'conn'] += 1
+
+
+class HttpSession:
+    """urllib + Cookie ของผู้ใช้ 1 คน (ลูกค้า 1 โต๊ะ หรือ พนักงาน)"""
+
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.host = urllib.parse.urlsplit(self.base_url).hostname
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect())
+        self.headers = {}
+
+    def set_cookie(self, name, value):
+        self.cookies.set_cookie(_cookie(name, value, self.host))
+
+    def request(self, endpoint, method, path, params=None, json_body=None, form=None, headers=None):
+        """ยิง request แล้วบันทึกเวลา คืนค่า (status, body) โดย status = 0 ถ้าต่อ Server ไม่ได้"""
+        url = self.base_url + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+
+        data = None
+        all_headers = {**self.headers, **(headers or {})}
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            all_headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            all_headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        request = urllib.request.Request(url, data=data, method=method, headers=all_headers)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        except (urllib.error.URLError, TimeoutError, ConnectionError):
+            status, body = 0, b''
+        self.recorder.add(endpoint, (time.perf_counter() - started) * 1000, status)
+        return status, body
+
+
+class Command(BaseCommand):
+    help = 'Load test ทั้ง flow (สแกน / สั่ง / ครัว / ดูรายการ / ปิดบิล) กับ Server ที่รันอยู่ แล้วสรุป latency และ throughput ต่อ Endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='URL ของ Server (default http://127.0.0.1:8000)')
+        parser.add_argument('--restaurant', help='slug ของร้านที่จะใช้ทดสอบ (ต้องมีโต๊ะและเมนูแล้ว)')
+        parser.add_argument('--seed', action='store_true', help='สร้างร้านจำลองใหม่ (โต๊ะ --tables ตัว) ใน Database ที่ตั้งค่าไว้')
+        parser.add_argument('--tables', type=int, default=20, help='จำนวนโต๊ะที่มีลูกค้าพร้อมกัน (default 20)')
+        parser.add_argument('--duration', type=float, default=60, help='ระยะเวลาทดสอบ วินาที (default 60)')
+        parser.add_argument('--think-time', type=float, default=2.0, help='เวลาเฉลี่ยระหว่าง action ของลูกค้า วินาที (default 2.0)')
+        parser.add_argument('--orders-per-visit', type=int, default=3, help='จำนวนรอบที่สั่งต่อ 1 กลุ่มลูกค้า ก่อนเช็คบิล (default 3)')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='ลูกค้าเปิดดูรายการที่สั่งทุกกี่วินาที (default 5)')
+        parser.add_argument('--kitchen-staff', type=int, default=2, help='จำนวนพนักงานครัวที่เปลี่ยนสถานะออเดอร์ (default 2)')
+        parser.add_argument('--cook-time', type=float, default=1.0, help='เวลาจาก COOKING ถึง SERVED วินาที (default 1)')
+        parser.add_argument('--timeout', type=float, default=30, help='timeout ต่อ request วินาที (default 30)')
+
+    def handle(self, *args, **options):
+        restaurant = self.get_restaurant(options)
+        tables = list(restaurant.tables.order_by('id')[:options['tables']])
+        menu_ids = list(
+            MenuItem.objects.filter(category__restaurant=restaurant, is_available=True)
+            .values_list('id', flat=True)
+        )
+        if not tables or not menu_ids:
+            raise CommandError(f'ร้าน {restaurant.slug} ต้องมีโต๊ะและเมนูที่เปิดขายอย่างน้อยอย่างละ 1 รายการ')
+
+        recorder = Recorder()
+        staff = self.staff_session(restaurant, options, recorder)
+        kitchen_queue = queue.Queue()
+        stop = threading.Event()
+        counters = defaultdict(int)
+        counters_lock = threading.Lock()
+
+        def count(name):
+            with counters_lock:
+                counters[name] += 1
+
+        threads = [
+            threading.Thread(target=self.run_table, args=(table, restaurant, menu_ids, staff, kitchen_queue, stop, count, options, recorder))
+            for table in tables
+        ] + [
+            threading.Thread(target=self.run_kitchen, args=(staff, kitchen_queue, stop, count, options))
+            for _ in range(options['kitchen_staff'])
+        ]
+
+        self.stdout.write(
+            f"🔥 {len(tables)} tables, {options['kitchen_staff']} kitchen staff, think {options['think_time']}s, "
+            f"{options['duration']:.0f}s against {options['base_url']} ({restaurant.slug})"
+        )
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            time.sleep(options['duration'])
+        except KeyboardInterrupt:
+            self.stdout.write('⏹  interrupted, collecting results...')
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.report(recorder, counters, elapsed)
+
+    def get_restaurant(self, options):
+        if options['seed']:
+            restaurant = seed_restaurant(name='Load Test', tables=options['tables'], categories=6, items_per_category=10)
+            self.stdout.write(f"🌱 seeded restaurant {restaurant.slug} ({options['tables']} tables)")
+            return restaurant
+        if not options['restaurant']:
+            raise CommandError('ระบุ --restaurant <slug> หรือ --seed')
+        try:
+            return Restaurant.objects.select_related('owner').get(slug=options['restaurant'])
+        except Restaurant.DoesNotExist:
+            raise CommandError(f"ไม่พบร้าน {options['restaurant']}")
+
+    def staff_session(self, restaurant, options, recorder):
+        """Session ของเจ้าของร้าน (ครัว + แคชเชียร์) สร้างผ่าน Session Store เดียวกับ Server"""
+        client = Client()
+        client.force_login(restaurant.owner)
+
+        session = HttpSession(options['base_url'], recorder, options['timeout'])
+        session.set_cookie('sessionid', client.cookies['sessionid'].value)
+        # close_bill เป็นฟอร์มปกติ ต้องผ่าน CSRF: ใช้ token เดียวกันทั้ง Cookie และ Header
+        csrf_token = get_random_string(32)
+        session.set_cookie('csrftoken', csrf_token)
+        session.headers['X-CSRFToken'] = csrf_token
+        return session
+
+    def pause(self, stop, mean):
+        # เวลาคิดแบบสุ่ม (exponential) ให้ request ไม่มาพร้อมกันเป็นจังหวะ คืนค่า True ถ้าหมดเวลาทดสอบแล้ว
+        return stop.wait(random.expovariate(1 / mean) if mean > 0 else 0)
+
+    def run_table(self, table, restaurant, menu_ids, staff, kitchen_queue, stop, count, options, recorder):
+        """ลูกค้าทีละกลุ่มของโต๊ะนี้: สแกน -> สั่งหลายรอบ (ดูรายการเป็นระยะ) -> ปิดบิล -> กลุ่มใหม่"""
+        menu_path = f"/dining/{restaurant.slug}/"
+        try:
+            while not stop.is_set():
+                diner = HttpSession(options['base_url'], recorder, options['timeout'])
+                # UUID เปลี่ยนทุกครั้งที่ปิดบิล อ่านค่าล่าสุดก่อนสแกน
+                table_uuid = str(Table.objects.values_list('uuid', flat=True).get(pk=table.pk))
+                diner.request('dining_menu', 'GET', f'{menu_path}{table_uuid}/')
+
+                last_poll = time.monotonic()
+                for _ in range(options['orders_per_visit']):
+                    if self.pause(stop, options['think_time']):
+                        return
+                    cart = [{'id': menu_id, 'qty': random.randint(1, 3)} for menu_id in random.sample(menu_ids, min(len(menu_ids), random.randint(1, 4)))]
+                    status, body = diner.request(
+                        'create_order_api', 'POST', reverse('api_create_order'),
+                        json_body={'table_uuid': table_uuid, 'cart': cart},
+                        headers={'Idempotency-Key': str(uuid.uuid4())},
+                    )
+                    if status == 200:
+                        count('orders')
+                        kitchen_queue.put(json.loads(body)['order_id'])
+
+                    if time.monotonic() - last_poll >= options['poll_interval']:
+                        diner.request('get_table_order_history', 'GET', reverse('get_table_order_history'), params={'table_uuid': table_uuid})
+                        last_poll = time.monotonic()
+
+                diner.request('get_table_order_history', 'GET', reverse('get_table_order_history'), params={'table_uuid': table_uuid})
+                if self.pause(stop, options['think_time']):
+                    return
+                status, _ = staff.request('close_bill', 'POST', reverse('close_bill', args=[table.pk]), form={'payment_method': random.choice(['cash', 'qr'])})
+                if 0 < status < 400:
+                    count('bills')
+        finally:
+            connection.close()
+
+    def run_kitchen(self, staff, kitchen_queue, stop, count, options):
+        """พนักงานครัว: รับออเดอร์ตามลำดับ เปลี่ยนเป็น COOKING แล้ว SERVED"""
+        while not stop.is_set():
+            try:
+                order_id = kitchen_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            for status in ('COOKING', 'SERVED'):
+                staff.request('update_order_status', 'POST', reverse('update_order_status'), json_body={'order_id': order_id, 'status': status})
+                if status == 'COOKING' and stop.wait(options['cook_time']):
+                    return
+            count('served')
+
+    def report(self, recorder, counters, elapsed):
+        self.stdout.write(f"\n📊 {elapsed:.1f}s  orders={counters['orders']}  served={counters['served']}  bills={counters['bills']}")
+        total = 0
+        for endpoint in ('dining_menu', 'create_order_api', 'get_table_order_history', 'update_order_status', 'close_bill'):
+            samples = recorder.samples.get(endpoint, [])
+            total += len(samples)
+            self.stdout.write(format_summary(endpoint, samples))
+            errors = recorder.errors[endpoint]
+            detail = ' (' + ', '.join(f'{status}x{n}' for status, n in errors.most_common()) + ')' if errors else ''
+            self.stdout.write(f"{'':<28} throughput={len(samples) / elapsed:7.1f} req/s  errors={sum(errors.values())}{detail}")
+        self.stdout.write(f"{'total':<28} throughput={total / elapsed:7.1f} req/s")
@@ -0,0 +1,22 @@
+# orders/management/commands/rebuild_sales_rollups.py
+# สร้างตาราง Rollup ยอดขายใหม่จากออเดอร์ดิบ (ใช้ครั้งแรกหลัง migrate หรือเมื่อสงสัยว่ายอดไม่ตรง)
+#
+# ตัวอย่าง:
+#   python manage.py rebuild_sales_rollups                  # ทุกร้าน
+#   python manage.py rebuild_sales_rollups --restaurant 3   # เฉพาะร้าน id 3
+from django.core.management.base import BaseCommand
+
+from orders import rollups
+
+
+class Command(BaseCommand):
+    help = 'ลบแล้วคำนวณ Rollup ยอดขายใหม่จากออเดอร์ที่ชำระเงินแล้วทั้งหมด'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurant', type=int, action='append', help='id ร้าน (ใส่ซ้ำได้หลายร้าน) ไม่ใส่ = ทุกร้าน')
+
+    def handle(self, *args, **options):
+        restaurant_ids = options['restaurant']
+        created = rollups.rebuild(restaurant_ids)
+        scope = f"restaurants {restaurant_ids}" if restaurant_ids else "all restaurants"
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt sales rollups (daily + per menu item + hourly) for {scope}: {created} rows"))
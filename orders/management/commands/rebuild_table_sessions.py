@@ -0,0 +1,22 @@
+# orders/management/commands/rebuild_table_sessions.py
+# สร้าง Session ของบิลที่เปิดอยู่ใหม่จากออเดอร์ที่ยังไม่จ่าย (ใช้เมื่อยอดบนหน้า Floor ไม่ตรง หรือหลังสร้างออเดอร์ด้วย bulk_create)
+#
+# ตัวอย่าง:
+#   python manage.py rebuild_table_sessions                  # ทุกร้าน
+#   python manage.py rebuild_table_sessions --restaurant 3   # เฉพาะร้าน id 3
+from django.core.management.base import BaseCommand
+
+from orders import table_sessions
+
+
+class Command(BaseCommand):
+    help = 'ลบแล้วสร้าง Session ของโต๊ะที่เปิดบิลอยู่ใหม่จากออเดอร์ที่ยังไม่ชำระเงิน'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurant', type=int, action='append', help='id ร้าน (ใส่ซ้ำได้หลายร้าน) ไม่ใส่ = ทุกร้าน')
+
+    def handle(self, *args, **options):
+        restaurant_ids = options['restaurant']
+        created = table_sessions.rebuild(restaurant_ids)
+        scope = f"restaurants {restaurant_ids}" if restaurant_ids else "all restaurants"
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt open table sessions for {scope}: {created} sessions"))
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 19:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_outboxevent'),
+        ('restaurants', '0008_alter_menuitem_image_alter_restaurant_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(max_length=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('order_count', models.IntegerField(default=0)),
+                ('item_count', models.IntegerField(default=0)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='restaurants.restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'date', 'payment_method'), name='daily_sales_unique')],
+            },
+        ),
+    ]
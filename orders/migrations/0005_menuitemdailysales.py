@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 10:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_dailysales'),
+        ('restaurants', '0008_alter_menuitem_image_alter_restaurant_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItemDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('menu_item_name', models.CharField(max_length=200)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('menu_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='restaurants.menuitem')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='menu_item_daily_sales', to='restaurants.restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'date', 'menu_item', 'menu_item_name'), name='menu_item_daily_sales_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_menuitemdailysales'),
+        ('restaurants', '0008_alter_menuitem_image_alter_restaurant_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('weekday', models.PositiveSmallIntegerField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_sales', to='restaurants.restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'date', 'hour'), name='hourly_sales_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 12:12
+
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_business_date(apps, schema_editor):
+    # คำนวณวันขายของออเดอร์เดิม (เวลาท้องถิ่น + เวลาตัดรอบของแต่ละร้าน) ทีละร้าน ทีละชุด
+    Order = apps.get_model('orders', 'Order')
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+
+    for restaurant_id, day_cutoff in Restaurant.objects.values_list('id', 'day_cutoff'):
+        batch = []
+        orders = Order.objects.filter(restaurant_id=restaurant_id, business_date__isnull=True).only('id', 'created_at')
+        for order in orders.iterator(chunk_size=2000):
+            local = timezone.localtime(order.created_at)
+            order.business_date = local.date() - datetime.timedelta(days=1) if local.time() < day_cutoff else local.date()
+            batch.append(order)
+            if len(batch) >= 2000:
+                Order.objects.bulk_update(batch, ['business_date'])
+                batch = []
+        if batch:
+            Order.objects.bulk_update(batch, ['business_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_hourlysales'),
+        ('restaurants', '0009_restaurant_day_cutoff'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='business_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(backfill_business_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='business_date',
+            field=models.DateField(),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'business_date'], name='order_business_date_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_business_date'),
+        ('restaurants', '0009_restaurant_day_cutoff'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_paid', False), models.Q(('status', 'CANCELLED'), _negated=True)), fields=['table', 'created_at'], name='order_table_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'status', 'created_at'], name='order_status_idx'),
+        ),
+    ]
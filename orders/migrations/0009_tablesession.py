@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 19:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def backfill_open_sessions(apps, schema_editor):
+    # เปิด Session ให้โต๊ะที่มีออเดอร์ค้างจ่ายอยู่ตอน migrate (เหมือน table_sessions.rebuild)
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    TableSession = apps.get_model('orders', 'TableSession')
+
+    orders = Order.objects.filter(is_paid=False, table__isnull=False).exclude(status='CANCELLED')
+    items = dict(
+        OrderItem.objects.filter(order__in=orders)
+        .values('order__table_id')
+        .annotate(item_count=Sum('quantity'))
+        .order_by()
+        .values_list('order__table_id', 'item_count')
+    )
+    rows = (
+        orders.values('restaurant_id', 'table_id')
+        .annotate(subtotal=Sum('total_price'), order_count=Count('id'), opened_at=Min('created_at'))
+        .order_by()
+    )
+    TableSession.objects.bulk_create([
+        TableSession(
+            restaurant_id=row['restaurant_id'], table_id=row['table_id'],
+            subtotal=row['subtotal'] or 0, order_count=row['order_count'],
+            item_count=items.get(row['table_id']) or 0, opened_at=row['opened_at'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_open_order_indexes'),
+        ('restaurants', '0009_restaurant_day_cutoff'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('order_count', models.IntegerField(default=0)),
+                ('item_count', models.IntegerField(default=0)),
+                ('opened_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='table_sessions', to='restaurants.restaurant')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to='restaurants.table')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('closed_at__isnull', True)), fields=('table',), name='table_session_open_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_open_sessions, migrations.RunPython.noop),
+    ]
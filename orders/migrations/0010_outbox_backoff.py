@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_tablesession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxevent',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_outbox_backoff'),
+        ('restaurants', '0009_restaurant_day_cutoff'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['restaurant', 'created_at'], name='order_kitchen_idx'),
+        ),
+    ]
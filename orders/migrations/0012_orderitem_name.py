@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 23:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_names(apps, schema_editor):
+    # ออเดอร์เก่าไม่มีชื่อ ณ ตอนสั่ง ใช้ชื่อเมนูปัจจุบันแทน (ดีที่สุดที่มี)
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    MenuItem = apps.get_model('restaurants', 'MenuItem')
+    OrderItem.objects.update(name=Subquery(MenuItem.objects.filter(pk=OuterRef('menu_item_id')).values('name')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_order_kitchen_index'),
+        ('restaurants', '0009_restaurant_day_cutoff'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.RunPython(fill_names, migrations.RunPython.noop),
+    ]
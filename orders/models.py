@@ -1,5 +1,6 @@
 # orders/models.py
 from django.db import models
+from django.utils import timezone
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -22,6 +23,36 @@ class Order(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # วันขายตามเวลาท้องถิ่น + เวลาตัดรอบของร้าน (Restaurant.day_cutoff) คำนวณครั้งเดียวตอนสร้าง
+    # รายงานกรองด้วยฟิลด์นี้แทน created_at__date (ใช้ index ได้ ไม่ต้องแปลง timezone ทุกแถว)
+    business_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['restaurant', 'business_date'], name='order_business_date_idx'),
+            # บิลที่ยังเปิดของโต๊ะ: table.orders.filter(is_paid=False).exclude(status='CANCELLED') (เช็คบิล / ปิดบิล)
+            models.Index(
+                fields=['table', 'created_at'], name='order_table_open_idx',
+                condition=models.Q(is_paid=False) & ~models.Q(status='CANCELLED'),
+            ),
+            # ประวัติการขาย: restaurant.orders.filter(status='COMPLETED', is_paid=True).order_by('-created_at')
+            # (status เป็นเงื่อนไขเท่ากับ แล้วเรียงตาม created_at ต่อได้เลย)
+            models.Index(fields=['restaurant', 'status', 'created_at'], name='order_status_idx'),
+            # จอครัว: restaurant.orders.filter(is_paid=False, status__in=KITCHEN_STATUSES).order_by('created_at')
+            # status หลายค่า (IN) ใช้ order_status_idx เรียงตาม created_at ไม่ได้ (ต้อง sort ทุกครั้ง)
+            # จึงทำ Partial Index เฉพาะออเดอร์ที่ยังไม่จ่าย เรียงตามเวลาสั่งไว้แล้ว แล้วค่อยกรอง status จากแถวที่เหลือไม่กี่แถว
+            # (เงื่อนไขเป็น boolean Django เขียนเป็น NOT "is_paid" ตรงๆ SQLite จึงจับคู่กับ Partial Index ได้ ต่างจาก IN (...) ที่ส่งพารามิเตอร์)
+            models.Index(
+                fields=['restaurant', 'created_at'], name='order_kitchen_idx',
+                condition=models.Q(is_paid=False),
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # bulk_create ไม่ผ่าน save() ต้องใส่ business_date เอง (ดู Restaurant.business_date)
+        if self.business_date is None:
+            self.business_date = self.restaurant.business_date(self.created_at or timezone.now())
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Order #{self.id}"
@@ -29,14 +60,138 @@ class Order(models.Model):
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     menu_item = models.ForeignKey('restaurants.MenuItem', on_delete=models.PROTECT) # อ้างอิงเมนู
+    name = models.CharField(max_length=200, blank=True) # ชื่อเมนู ณ ตอนสั่ง (Rollup ยอดขายใช้ชื่อนี้ ไม่ตามชื่อที่แก้ทีหลัง)
     
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2) 
     note = models.CharField(max_length=255, blank=True, verbose_name="หมายเหตุ")
     
+    def save(self, *args, **kwargs):
+        # bulk_create ไม่ผ่าน save() ต้องใส่ name เอง (ดู orders/api._place_order)
+        if not self.name:
+            self.name = self.menu_item.name
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.menu_item.name} x {self.quantity}"
         
     @property
     def total_cost(self):
-        return self.price * self.quantity
\ No newline at end of file
+        return self.price * self.quantity
+
+
+# บิลที่เปิดอยู่ของโต๊ะ (Tab): เปิดตอนออเดอร์แรกเข้า ปิดตอน close_bill
+# เก็บยอดรวมสะสมไว้ในแถวเดียว (อัปเดตด้วย F() ตอนสั่ง / ลบรายการ / ยกเลิก ดู orders/table_sessions.py)
+# หน้า Floor / ประวัติของลูกค้า อ่านแถวนี้แทนการ SUM ออเดอร์ที่ยังไม่จ่ายทุกครั้ง
+# ยอดที่นับ = ออเดอร์ที่ยังไม่จ่ายและไม่ถูกยกเลิก (เงื่อนไขเดียวกับ close_bill)
+class TableSession(models.Model):
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='table_sessions')
+    table = models.ForeignKey('restaurants.Table', on_delete=models.CASCADE, related_name='sessions')
+
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)
+
+    opened_at = models.DateTimeField(default=timezone.now)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # 1 โต๊ะเปิดบิลได้ครั้งละ 1 Session
+            models.UniqueConstraint(
+                fields=['table'], name='table_session_open_unique',
+                condition=models.Q(closed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Session #{self.id} table {self.table_id}: {self.subtotal}"
+
+
+# Outbox: ข้อความ Real-time ที่รอส่งเข้า Channel Layer
+# บันทึกใน Transaction เดียวกับการแก้ออเดอร์ แล้วให้ dispatcher (manage.py dispatch_outbox) ทยอยส่งทีหลัง
+# ถ้า Redis ล่ม ออเดอร์ก็ยังบันทึกได้ปกติ ข้อความจะค้างรอส่งอยู่ในตารางนี้ (ส่งสำเร็จแล้วลบทิ้ง)
+class OutboxEvent(models.Model):
+    group = models.CharField(max_length=100) # เช่น restaurant_1
+    payload = models.JSONField() # ข้อความที่จะส่งเข้า group_send (ต้องมี 'type')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True) # ตั้งเฉพาะข้อความที่ถูกทิ้ง (ส่งไม่ได้ตลอดไป)
+    attempts = models.PositiveIntegerField(default=0) # จำนวนครั้งที่ส่งไม่ผ่าน (ใช้คำนวณเวลารอ)
+    last_error = models.CharField(max_length=255, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True) # ส่งไม่ผ่าน: ห้ามลองใหม่ก่อนเวลานี้ (Exponential backoff)
+    claimed_until = models.DateTimeField(null=True, blank=True) # dispatcher จองไว้ส่งอยู่ (หมดเวลาแล้วตัวอื่นหยิบไปได้)
+
+    class Meta:
+        indexes = [
+            # dispatcher ดึงเฉพาะที่ยังไม่ได้ส่ง เรียงตาม id
+            models.Index(fields=['id'], name='outbox_pending_idx', condition=models.Q(dispatched_at__isnull=True)),
+            models.Index(fields=['dispatched_at'], name='outbox_dispatched_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox #{self.id} -> {self.group}"
+
+
+# ยอดขายรายวัน (Rollup) ต่อร้าน / วัน / วิธีชำระเงิน
+# อัปเดตทีละนิดตอนปิดบิล (orders/rollups.py) หน้ารายงานอ่านจากตารางนี้แทนการ SUM ออเดอร์ดิบทุกครั้ง
+# สร้างใหม่ทั้งหมดได้ด้วย python manage.py rebuild_sales_rollups
+class DailySales(models.Model):
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField() # วันที่ขาย (ตามเวลาท้องถิ่นของร้าน)
+    payment_method = models.CharField(max_length=20) # CASH / QR
+
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'date', 'payment_method'], name='daily_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant_id} {self.date} {self.payment_method}: {self.revenue}"
+
+
+# ยอดขายรายเมนู / วัน (Rollup) สำหรับอันดับเมนูขายดี
+# เก็บชื่อเมนู ณ ตอนขายไว้ด้วย เมนูที่ถูกเปลี่ยนชื่อหรือลบไปแล้วก็ยังออกรายงานได้ถูกต้อง
+class MenuItemDailySales(models.Model):
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='menu_item_daily_sales')
+    date = models.DateField()
+    menu_item = models.ForeignKey('restaurants.MenuItem', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    menu_item_name = models.CharField(max_length=200) # ชื่อเมนู ณ วันที่ขาย
+
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['restaurant', 'date', 'menu_item', 'menu_item_name'],
+                name='menu_item_daily_sales_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant_id} {self.date} {self.menu_item_name} x{self.quantity}"
+
+
+# ยอดขายรายชั่วโมง (Rollup) สำหรับ Heatmap วันในสัปดาห์ x ชั่วโมง
+# เก็บแยกตามวันที่ด้วย เลือกช่วงวันที่ได้ (เช่น 90 วันล่าสุด) แล้ว GROUP BY (weekday, hour) ได้ไม่เกิน 7x24 แถว
+class HourlySales(models.Model):
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='hourly_sales')
+    date = models.DateField() # วันที่ขาย (ตามเวลาท้องถิ่นของร้าน)
+    hour = models.PositiveSmallIntegerField() # 0-23 ตามเวลาท้องถิ่น
+    weekday = models.PositiveSmallIntegerField() # 0 = จันทร์ ... 6 = อาทิตย์ (เท่ากับ date.weekday())
+
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'date', 'hour'], name='hourly_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant_id} {self.date} {self.hour:02d}:00 x{self.order_count}"
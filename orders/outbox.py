@@ -0,0 +1,162 @@
+# orders/outbox.py
+# Transactional Outbox สำหรับแจ้งเตือน Real-time
+# - ฝั่ง view: เรียก enqueue() ภายใน transaction.atomic() เดียวกับการแก้ออเดอร์
+#   (ไม่ต้องรอ Redis ระหว่าง request และถ้า Redis ล่ม ลูกค้าก็ไม่เจอ 500)
+# - ฝั่ง dispatcher: dispatch_batch() จองข้อความที่ commit แล้วทีละชุด ส่ง group_send แล้วลบทิ้ง
+#   Redis ล่ม: ข้อความค้างอยู่ในตาราง รอแบบ Exponential backoff แล้วส่งต่อตามลำดับเดิม (ไม่หาย)
+#   รันด้วย python manage.py dispatch_outbox
+# - ลำดับรับประกันต่อ group: group หนึ่งมี dispatcher ถือได้ทีละตัว (ดู _claim)
+#   group ที่กำลังรอ backoff ถูกข้ามไปทั้ง group ส่วนร้านอื่นส่งต่อได้ตามปกติ
+import datetime
+import logging
+
+from asgiref.sync import async_to_sync
+from django.db import connection, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from users import instrumentation
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# error ที่เกิดจากตัวข้อความเอง (แปลงเป็น msgpack ไม่ได้ / ชื่อ group หรือ type ไม่ถูกต้อง) ส่งซ้ำก็ไม่ผ่าน ทิ้งได้
+# error อื่นทั้งหมด (Redis ล่ม / timeout / ChannelFull) = ปัญหาที่ทางส่ง หยุดทั้งชุดแล้วรอ ไม่ทิ้งข้อความ
+UNSENDABLE_ERRORS = (TypeError, ValueError)
+
+# เวลารอก่อนลองใหม่: 0.5, 1, 2, 4, ... วินาที ไม่เกิน MAX_BACKOFF_SECONDS
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 60
+
+# dispatcher จองข้อความไว้ส่งได้นานเท่านี้ (ถ้าตายกลางทาง ตัวอื่นหยิบไปส่งต่อหลังหมดเวลา)
+# 1 ชุดต้องส่งเสร็จภายในเวลานี้ ไม่งั้น group เดียวกันอาจถูกอีกตัวหยิบไปส่งซ้อน
+CLAIM_SECONDS = 30
+
+# คีย์ pg_advisory_xact_lock: ให้ dispatcher จองทีละตัว (Postgres)
+CLAIM_LOCK_ID = 4004
+
+
+def restaurant_group(restaurant_id):
+    return f'restaurant_{restaurant_id}'
+
+
+def enqueue(group, message):
+    """บันทึกข้อความรอส่ง (ต้องเรียกใน Transaction เดียวกับการเปลี่ยนแปลงข้อมูล)"""
+    return OutboxEvent.objects.create(group=group, payload=message)
+
+
+def enqueue_many(group, messages):
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(group=group, payload=message) for message in messages
+    ])
+
+
+def backoff(attempts):
+    """เวลารอ (วินาที) หลังส่งไม่ผ่านครั้งที่ attempts"""
+    return min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** (attempts - 1))
+
+
+def _claim(batch_size):
+    """จองข้อความที่ถึงเวลาส่ง 1 ชุด (Transaction สั้นๆ commit ก่อนส่งจริง ไม่ถือ lock ระหว่างรอ Redis)
+
+    ไม่แตะ group ที่มีข้อความถูกจองอยู่ (dispatcher ตัวอื่นกำลังส่ง) หรือกำลังรอ backoff
+    ทั้ง group ข้อความหลังจากนั้นจึงไม่ถูกส่งแซงหน้า
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # จองทีละตัว: ตัวถัดไปเห็น claimed_until ที่ตัวก่อนหน้า commit แล้ว (ไม่หยิบ group เดียวกัน)
+            # SQLite ล็อกทั้งไฟล์ตอนเขียนอยู่แล้ว
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CLAIM_LOCK_ID])
+        pending = OutboxEvent.objects.filter(dispatched_at__isnull=True)
+        busy_groups = pending.filter(Q(claimed_until__gte=now) | Q(next_attempt_at__gt=now)).values('group')
+        events = list(pending.exclude(group__in=busy_groups).order_by('id')[:batch_size])
+        if events:
+            OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(
+                claimed_until=now + datetime.timedelta(seconds=CLAIM_SECONDS),
+            )
+    return events
+
+
+async def _send_events(channel_layer, events):
+    """ส่งตามลำดับ id คืนค่า (id ที่ส่งแล้ว, [(ข้อความที่ทิ้ง, error)], [(ข้อความที่ค้าง, error)])
+
+    ทางส่งของ group ไหนมีปัญหา: ข้ามข้อความที่เหลือของ group นั้นในชุดนี้ (ไม่สลับลำดับ) group อื่นส่งต่อ
+    """
+    sent_ids = []
+    dropped = []
+    failed = []
+    failed_groups = set()
+    for event in events:
+        if event.group in failed_groups:
+            continue
+        try:
+            await instrumentation.group_send(channel_layer, event.group, event.payload)
+        except UNSENDABLE_ERRORS as e:
+            dropped.append((event, e))
+            continue
+        except Exception as e:
+            failed.append((event, e))
+            failed_groups.add(event.group)
+            continue
+        sent_ids.append(event.id)
+    return sent_ids, dropped, failed
+
+
+def dispatch_batch(channel_layer, batch_size=100):
+    """ส่งข้อความที่ค้างอยู่ 1 ชุด (จอง -> commit -> ส่ง -> ลบ) คืนค่าจำนวนที่ส่งสำเร็จ"""
+    events = _claim(batch_size)
+    if not events:
+        return 0
+
+    sent_ids, dropped, failed = async_to_sync(_send_events)(channel_layer, events)
+
+    now = timezone.now()
+    with transaction.atomic():
+        if sent_ids:
+            OutboxEvent.objects.filter(id__in=sent_ids).delete()
+
+        for event, error in dropped:
+            logger.error("Outbox #%s -> %s dropped, message cannot be sent: %s", event.id, event.group, error)
+            OutboxEvent.objects.filter(id=event.id).update(
+                dispatched_at=now, claimed_until=None, last_error=str(error)[:255],
+            )
+
+        for event, error in failed:
+            attempts = event.attempts + 1
+            delay = backoff(attempts)
+            logger.warning(
+                "Outbox #%s -> %s failed (attempt %s), retrying in %.1fs: %s",
+                event.id, event.group, attempts, delay, error,
+            )
+            OutboxEvent.objects.filter(id=event.id).update(
+                attempts=attempts, last_error=str(error)[:255], claimed_until=None,
+                next_attempt_at=now + datetime.timedelta(seconds=delay),
+            )
+
+        # ข้อความที่เหลือของ group ที่ล้มยังไม่ได้ส่ง: ปล่อยคืน (group นี้ถูกข้ามจนกว่าจะถึงเวลาลองใหม่)
+        failed_groups = {event.group for event, _ in failed}
+        failed_ids = {event.id for event, _ in failed}
+        unsent = [event.id for event in events if event.group in failed_groups and event.id not in failed_ids]
+        if unsent:
+            OutboxEvent.objects.filter(id__in=unsent).update(claimed_until=None)
+
+    return len(sent_ids)
+
+
+def outbox_stats():
+    """ตัวเลขสุขภาพของ Outbox: backlog = จำนวนที่ค้างส่ง, lag = อายุของข้อความที่ค้างนานที่สุด"""
+    pending = OutboxEvent.objects.filter(dispatched_at__isnull=True)
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'backlog': pending.count(),
+        'lag_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+    }
+
+
+def purge_dispatched(older_than):
+    """ลบข้อความที่ถูกทิ้ง (ส่งไม่ได้) ที่เก่ากว่าที่กำหนด (ข้อความที่ส่งสำเร็จถูกลบไปตั้งแต่ตอนส่ง)"""
+    deleted, _ = OutboxEvent.objects.filter(dispatched_at__lt=timezone.now() - older_than).delete()
+    return deleted
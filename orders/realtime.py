@@ -0,0 +1,44 @@
+# orders/realtime.py
+# ข้อความ Delta สำหรับหน้าจอครัว / แคชเชียร์ (ส่งผ่าน Outbox -> OrderConsumer.order_delta)
+# แต่ละข้อความมีข้อมูลพอให้หน้าจอแก้เฉพาะการ์ดที่เกี่ยวข้อง ไม่ต้องโหลดทั้งหน้าใหม่
+#   order_created        : การ์ดออเดอร์ใหม่ (ครัว) + ยอดที่ต้องบวกเพิ่มให้โต๊ะ (แคชเชียร์)
+#   order_status_changed : สถานะใหม่ของออเดอร์ + สถานะบิลล่าสุดของโต๊ะ
+#   table_closed         : โต๊ะที่ปิดบิลแล้ว (จอครัวเอาออเดอร์ของโต๊ะนี้ออก)
+# ถ้าหลุดการเชื่อมต่อ หน้าจอจะโหลด Snapshot ใหม่ทั้งชุด (kitchen_snapshot_api / cashier_floor_state_api)
+
+# สถานะที่ยังต้องแสดงบนจอครัว
+KITCHEN_STATUSES = ('PENDING', 'COOKING')
+
+
+def order_card(order, table_name, items):
+    """ข้อมูลการ์ดออเดอร์บนจอครัว (items = [{'name', 'quantity', 'note'}])"""
+    return {
+        'id': order.id,
+        'table_id': order.table_id,
+        'table': table_name,
+        'status': order.status,
+        'total_price': float(order.total_price),
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat(),
+        'items': items,
+    }
+
+
+def _delta(event, **data):
+    return {'type': 'order_delta', 'event': event, **data}
+
+
+def order_created(card):
+    return _delta('order_created', order=card)
+
+
+def order_status_changed(order, table_state):
+    return _delta(
+        'order_status_changed',
+        order={'id': order.id, 'status': order.status, 'updated_at': order.updated_at.isoformat()},
+        table=table_state,
+    )
+
+
+def table_closed(table_state):
+    return _delta('table_closed', table=table_state)
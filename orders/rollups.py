@@ -0,0 +1,171 @@
+# orders/rollups.py
+# ตาราง Rollup สำหรับรายงานยอดขาย (ดู DailySales / MenuItemDailySales / HourlySales ใน models.py)
+# - ตอนปิดบิล: apply_orders(order_ids) บวกยอดของออเดอร์ที่เพิ่งจ่ายเงินเข้า Rollup (ใน Transaction เดียวกัน)
+# - ออเดอร์ที่จ่ายแล้วถูกยกเลิก: apply_orders(order_ids, sign=-1) หักยอดออก
+# - rebuild(): ลบแล้วคำนวณใหม่จากออเดอร์ดิบทั้งหมด (manage.py rebuild_sales_rollups)
+# - ชื่อเมนูใน MenuItemDailySales มาจาก OrderItem.name (ชื่อตอนสั่ง): แก้ชื่อเมนูทีหลังแล้วหักยอด / rebuild ยังลงแถวเดิม
+# ออเดอร์ที่นับ = COMPLETED + is_paid (เงื่อนไขเดียวกับหน้ารายงานเดิม) วันที่ใช้ Order.business_date ชั่วโมงใช้เวลาสั่งตามเวลาท้องถิ่น
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import ExtractHour
+
+from .models import DailySales, HourlySales, MenuItemDailySales, Order, OrderItem
+
+
+def _payment_method(value):
+    # หน้าปิดบิลส่งมาเป็นตัวเล็ก (cash / qr) ส่วนค่าเริ่มต้นของ Model เป็น CASH
+    return (value or 'CASH').upper()
+
+
+def _bump(model, rows):
+    """บวกค่าเข้าแถว Rollup หลายแถวด้วย F() (ไม่มีแถวก็สร้างใหม่) ปลอดภัยเมื่อปิดบิลพร้อมกันหลายเครื่อง
+
+    rows = [(keys, deltas)] ใช้ 3 Query เสมอ ไม่ว่าบิลจะมีกี่เมนู / กี่ชั่วโมง:
+    สร้างแถวเปล่าที่ยังไม่มี (ignore_conflicts) -> อ่าน pk -> UPDATE ... CASE ครั้งเดียว
+    """
+    if not rows:
+        return
+    # มีอีก Transaction สร้างแถวเดียวกันไปก่อน: Unique constraint กันไว้ แถวนั้นจะถูกบวกด้วย UPDATE ข้างล่าง
+    model.objects.bulk_create([model(**keys) for keys, _ in rows], ignore_conflicts=True)
+
+    key_fields = list(rows[0][0])
+    wanted = {tuple(keys.values()): deltas for keys, deltas in rows}
+    existing = model.objects.filter(
+        restaurant_id__in={keys['restaurant_id'] for keys, _ in rows},
+        date__in={keys['date'] for keys, _ in rows},
+    ).values_list('pk', *key_fields)
+    pks = {tuple(row[1:]): row[0] for row in existing if tuple(row[1:]) in wanted}
+
+    increments = {
+        field: F(field) + Case(
+            *[When(pk=pk, then=Value(wanted[key][field])) for key, pk in pks.items()],
+            default=Value(0),
+            output_field=model._meta.get_field(field),
+        )
+        for field in rows[0][1]
+    }
+    model.objects.filter(pk__in=pks.values()).update(**increments)
+
+
+def _daily_groups(orders):
+    """รวมยอดของออเดอร์ตามร้าน / วัน / วิธีชำระเงิน (2 Query: ยอดเงิน + จำนวนจาน)"""
+    groups = defaultdict(lambda: {'revenue': 0, 'order_count': 0, 'item_count': 0})
+
+    rows = (
+        orders.annotate(day=F('business_date'))
+        .values('restaurant_id', 'day', 'payment_method')
+        .annotate(revenue=Sum('total_price'), order_count=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        group = groups[(row['restaurant_id'], row['day'], _payment_method(row['payment_method']))]
+        group['revenue'] += row['revenue'] or 0
+        group['order_count'] += row['order_count']
+
+    items = (
+        OrderItem.objects.filter(order__in=orders)
+        .annotate(day=F('order__business_date'))
+        .values('order__restaurant_id', 'day', 'order__payment_method')
+        .annotate(item_count=Sum('quantity'))
+        .order_by()
+    )
+    for row in items:
+        key = (row['order__restaurant_id'], row['day'], _payment_method(row['order__payment_method']))
+        groups[key]['item_count'] += row['item_count'] or 0
+
+    return groups
+
+
+def _item_groups(orders):
+    """รวมจำนวน / ยอดขายของแต่ละเมนูตามร้าน / วัน (1 Query) ใช้ชื่อเมนู ณ ตอนสั่ง (OrderItem.name)"""
+    rows = (
+        OrderItem.objects.filter(order__in=orders)
+        .annotate(day=F('order__business_date'))
+        .values('order__restaurant_id', 'day', 'menu_item_id', 'name')
+        .annotate(qty=Sum('quantity'), sales=Sum(F('price') * F('quantity')))
+        .order_by()
+    )
+    return {
+        (row['order__restaurant_id'], row['day'], row['menu_item_id'], row['name']): {
+            'quantity': row['qty'] or 0,
+            'revenue': row['sales'] or 0,
+        }
+        for row in rows
+    }
+
+
+def _hourly_groups(orders):
+    """รวมยอดของออเดอร์ตามร้าน / วันขาย / ชั่วโมง (1 Query) ชั่วโมงตาม TIME_ZONE ของโปรเจกต์"""
+    rows = (
+        orders.annotate(day=F('business_date'), hour=ExtractHour('created_at'))
+        .values('restaurant_id', 'day', 'hour')
+        .annotate(revenue=Sum('total_price'), order_count=Count('id'))
+        .order_by()
+    )
+    return {
+        (row['restaurant_id'], row['day'], row['hour']): {
+            'order_count': row['order_count'],
+            'revenue': row['revenue'] or 0,
+        }
+        for row in rows
+    }
+
+
+def apply_orders(order_ids, sign=1):
+    """บวก (sign=1) หรือหัก (sign=-1) ยอดของออเดอร์ชุดนี้ใน Rollup (ต้องเรียกใน Transaction เดียวกับการเปลี่ยนออเดอร์)"""
+    if not order_ids:
+        return
+    orders = Order.objects.filter(id__in=order_ids)
+    _bump(DailySales, [
+        ({'restaurant_id': restaurant_id, 'date': day, 'payment_method': method},
+         {field: value * sign for field, value in totals.items()})
+        for (restaurant_id, day, method), totals in _daily_groups(orders).items()
+    ])
+    _bump(MenuItemDailySales, [
+        ({'restaurant_id': restaurant_id, 'date': day, 'menu_item_id': menu_item_id, 'menu_item_name': name},
+         {field: value * sign for field, value in totals.items()})
+        for (restaurant_id, day, menu_item_id, name), totals in _item_groups(orders).items()
+    ])
+    _bump(HourlySales, [
+        ({'restaurant_id': restaurant_id, 'date': day, 'hour': hour, 'weekday': day.weekday()},
+         {field: value * sign for field, value in totals.items()})
+        for (restaurant_id, day, hour), totals in _hourly_groups(orders).items()
+    ])
+
+
+def counted_orders(restaurant_ids=None):
+    """ออเดอร์ที่นับเป็นยอดขาย"""
+    orders = Order.objects.filter(status='COMPLETED', is_paid=True)
+    if restaurant_ids is not None:
+        orders = orders.filter(restaurant_id__in=restaurant_ids)
+    return orders
+
+
+@transaction.atomic
+def rebuild(restaurant_ids=None):
+    """ลบ Rollup แล้วคำนวณใหม่จากออเดอร์ดิบ คืนค่าจำนวนแถวที่สร้าง"""
+    for model in (DailySales, MenuItemDailySales, HourlySales):
+        existing = model.objects.all()
+        if restaurant_ids is not None:
+            existing = existing.filter(restaurant_id__in=restaurant_ids)
+        existing.delete()
+
+    orders = counted_orders(restaurant_ids)
+    daily = [
+        DailySales(restaurant_id=restaurant_id, date=day, payment_method=method, **totals)
+        for (restaurant_id, day, method), totals in _daily_groups(orders).items()
+    ]
+    items = [
+        MenuItemDailySales(restaurant_id=restaurant_id, date=day, menu_item_id=menu_item_id, menu_item_name=name, **totals)
+        for (restaurant_id, day, menu_item_id, name), totals in _item_groups(orders).items()
+    ]
+    hourly = [
+        HourlySales(restaurant_id=restaurant_id, date=day, hour=hour, weekday=day.weekday(), **totals)
+        for (restaurant_id, day, hour), totals in _hourly_groups(orders).items()
+    ]
+    DailySales.objects.bulk_create(daily, batch_size=1000)
+    MenuItemDailySales.objects.bulk_create(items, batch_size=1000)
+    HourlySales.objects.bulk_create(hourly, batch_size=1000)
+    return len(daily) + len(items) + len(hourly)
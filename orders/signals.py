@@ -0,0 +1,30 @@
+# orders/signals.py
+# เปลี่ยนเวอร์ชันบิลของโต๊ะเมื่อออเดอร์ / รายการอาหารเปลี่ยน (ผูกไว้ใน OrdersConfig.ready)
+# หมายเหตุ: QuerySet.update() / bulk_create ไม่ส่ง signal ต้องเรียก billing.bump_bill_version เอง (เช่น close_bill)
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .billing import bump_bill_version
+from .models import Order, OrderItem
+
+
+def _bump_after_commit(table_id):
+    # รอให้ commit ก่อน ไม่งั้น request อื่นอาจคำนวณบิลจากข้อมูลเก่าเก็บไว้ในเวอร์ชันใหม่
+    if table_id is not None:
+        transaction.on_commit(lambda: bump_bill_version(table_id))
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_changed(sender, instance, **kwargs):
+    _bump_after_commit(instance.table_id)
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def order_item_changed(sender, instance, **kwargs):
+    if OrderItem.order.is_cached(instance):
+        table_id = instance.order.table_id
+    else:
+        table_id = Order.objects.filter(pk=instance.order_id).values_list('table_id', flat=True).first()
+    # ถ้าออเดอร์ถูกลบไปพร้อมกัน (Cascade) signal ของ Order จะเปลี่ยนเวอร์ชันให้เอง
+    _bump_after_commit(table_id)
@@ -0,0 +1,97 @@
+# orders/table_sessions.py
+# บิลที่เปิดอยู่ของแต่ละโต๊ะ (TableSession ใน models.py) อัปเดตทีละนิดใน Transaction เดียวกับการแก้ออเดอร์
+# - สั่งอาหาร (orders/api._save_order): apply_order(order, item_count=...) เปิด Session ถ้ายังไม่มี
+# - ลบรายการ (delete_order_item): apply(...) หักยอด / จำนวนจาน
+# - เปลี่ยนสถานะ (update_order_status): ออเดอร์ที่เปิดอยู่ถูกยกเลิก หัก / ยกเลิกแล้วกลับมา บวกคืน
+# - ปิดบิล (close_bill): close(table_id)
+# ออเดอร์ที่สร้างตรงๆ โดยไม่ผ่านทางข้างบน (bulk_create / admin / seed) ต้อง rebuild() เอง
+# (manage.py rebuild_table_sessions)
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Sum
+from django.utils import timezone
+
+from .models import Order, OrderItem, TableSession
+
+
+def open_sessions():
+    return TableSession.objects.filter(closed_at__isnull=True)
+
+
+def is_open(order):
+    """ออเดอร์นี้ถูกนับอยู่ใน Session หรือไม่ (เงื่อนไขเดียวกับ close_bill)"""
+    return not order.is_paid and order.status != 'CANCELLED'
+
+
+def apply(restaurant_id, table_id, subtotal=0, order_count=0, item_count=0):
+    """บวก (หรือลบ ถ้าค่าติดลบ) ยอดเข้า Session ที่เปิดอยู่ของโต๊ะด้วย F()
+
+    ยังไม่มี Session และมีออเดอร์เพิ่มเข้ามา (order_count > 0) = เปิด Session ใหม่
+    """
+    if table_id is None:
+        return
+    increments = {
+        'subtotal': F('subtotal') + subtotal,
+        'order_count': F('order_count') + order_count,
+        'item_count': F('item_count') + item_count,
+    }
+    if open_sessions().filter(table_id=table_id).update(**increments):
+        if order_count < 0:
+            # ออเดอร์สุดท้ายของบิลถูกยกเลิก: ปิด Session ทิ้ง ออเดอร์ถัดไปจะเปิดบิลใหม่ (เวลาเปิดบิลไม่ค้างของเก่า)
+            open_sessions().filter(table_id=table_id, order_count__lte=0).update(closed_at=timezone.now())
+        return
+    if order_count <= 0:
+        return
+    try:
+        with transaction.atomic():
+            TableSession.objects.create(
+                restaurant_id=restaurant_id, table_id=table_id,
+                subtotal=subtotal, order_count=order_count, item_count=item_count,
+            )
+    except IntegrityError:
+        # อีก Transaction เปิด Session ของโต๊ะนี้ไปก่อนแล้ว
+        open_sessions().filter(table_id=table_id).update(**increments)
+
+
+def apply_order(order, sign=1, item_count=None):
+    """บวกทั้งออเดอร์เข้า Session (sign=-1 = หักออก) ไม่ส่ง item_count มา = นับจาก DB"""
+    if item_count is None:
+        item_count = order.items.aggregate(total=Sum('quantity'))['total'] or 0
+    apply(order.restaurant_id, order.table_id, order.total_price * sign, sign, item_count * sign)
+
+
+def close(table_id):
+    open_sessions().filter(table_id=table_id).update(closed_at=timezone.now())
+
+
+@transaction.atomic
+def rebuild(restaurant_ids=None):
+    """ลบ Session ที่เปิดอยู่แล้วสร้างใหม่จากออเดอร์ที่ยังไม่จ่าย คืนค่าจำนวน Session ที่สร้าง"""
+    existing = open_sessions()
+    orders = Order.objects.filter(is_paid=False, table__isnull=False).exclude(status='CANCELLED')
+    if restaurant_ids is not None:
+        existing = existing.filter(restaurant_id__in=restaurant_ids)
+        orders = orders.filter(restaurant_id__in=restaurant_ids)
+    existing.delete()
+
+    items = dict(
+        OrderItem.objects.filter(order__in=orders)
+        .values('order__table_id')
+        .annotate(item_count=Sum('quantity'))
+        .order_by()
+        .values_list('order__table_id', 'item_count')
+    )
+    rows = (
+        orders.values('restaurant_id', 'table_id')
+        .annotate(subtotal=Sum('total_price'), order_count=Count('id'), opened_at=Min('created_at'))
+        .order_by()
+    )
+    sessions = [
+        TableSession(
+            restaurant_id=row['restaurant_id'], table_id=row['table_id'],
+            subtotal=row['subtotal'] or 0, order_count=row['order_count'],
+            item_count=items.get(row['table_id']) or 0, opened_at=row['opened_at'],
+        )
+        for row in rows
+    ]
+    TableSession.objects.bulk_create(sessions, batch_size=1000)
+    return len(sessions)
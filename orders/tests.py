@@ -1,3 +1,641 @@
-from django.test import TestCase
+import datetime
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from restaurants.benchmark import seed_restaurant, seed_orders
+from restaurants.menu_cache import aget_menu_snapshot
+from restaurants.tests import QueryBudgetTestCase
+from restaurants.models import Restaurant, Table, Category, MenuItem
+from users.models import User
+from .models import Order, OrderItem, OutboxEvent, DailySales, MenuItemDailySales, HourlySales, TableSession
+from . import idempotency, outbox, realtime, rollups, table_sessions
+
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class CreateOrderApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='owner', email='owner@example.com', password='x',
+            approval_status='APPROVED', is_shop_owner=True,
+        )
+        cls.restaurant = Restaurant.objects.create(owner=cls.owner, name='Test Shop')
+        cls.table = Table.objects.create(restaurant=cls.restaurant, name='T1')
+        category = Category.objects.create(restaurant=cls.restaurant, name='Main')
+        cls.menu_items = [
+            MenuItem.objects.create(category=category, name=f'Dish {i}', price=10 + i)
+            for i in range(30)
+        ]
+
+        # เมนูของร้านอื่น ห้ามสั่งข้ามร้านได้
+        other_owner = User.objects.create_user(username='other', email='other@example.com', password='x')
+        other_restaurant = Restaurant.objects.create(owner=other_owner, name='Other Shop')
+        other_category = Category.objects.create(restaurant=other_restaurant, name='Main')
+        cls.foreign_item = MenuItem.objects.create(category=other_category, name='Foreign', price=99)
+
+    def setUp(self):
+        cache.clear()
+
+    def post_cart(self, cart, **headers):
+        return self.client.post(
+            reverse('api_create_order'),
+            data=json.dumps({'table_uuid': str(self.table.uuid), 'cart': cart}),
+            content_type='application/json',
+            headers=headers,
+        )
+
+    def cart_of(self, size):
+        return [{'id': item.id, 'qty': 2} for item in self.menu_items[:size]]
+
+    def test_creates_order_with_items_and_total(self):
+        response = self.post_cart(self.cart_of(3))
+
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(pk=response.json()['order_id'])
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(order.total_price, (10 + 11 + 12) * 2)
+
+    def test_skips_unknown_and_foreign_menu_items(self):
+        cart = self.cart_of(1) + [{'id': 999999, 'qty': 1}, {'id': self.foreign_item.id, 'qty': 1}]
+        response = self.post_cart(cart)
+
+        order = Order.objects.get(pk=response.json()['order_id'])
+        self.assertEqual(list(order.items.values_list('menu_item_id', flat=True)), [self.menu_items[0].id])
+        self.assertEqual(order.total_price, 20)
+
+    def test_rejects_cart_without_valid_items(self):
+        response = self.post_cart([{'id': self.foreign_item.id, 'qty': 1}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_accepts_string_ids_and_quantities(self):
+        item = self.menu_items[0]
+        response = self.post_cart([{'id': str(item.id), 'qty': '3'}])
+
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(pk=response.json()['order_id'])
+        self.assertEqual(list(order.items.values_list('menu_item_id', 'quantity')), [(item.id, 3)])
+
+    def test_rejects_invalid_cart_entries(self):
+        for entry in ({'id': 'abc', 'qty': 1}, {'id': None, 'qty': 1}, {'qty': 1}, {'id': self.menu_items[0].id, 'qty': 'x'}):
+            with self.subTest(entry=entry):
+                self.assertEqual(self.post_cart([entry]).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        self.post_cart(self.cart_of(1))  # สร้าง Snapshot เมนูไว้ใน cache ก่อน
+
+        with CaptureQueriesContext(connection) as small:
+            self.post_cart(self.cart_of(1))
+        with CaptureQueriesContext(connection) as large:
+            self.post_cart(self.cart_of(30))
+
+        # savepoint, order insert, items bulk insert, session update, outbox insert, release
+        self.assertEqual(len(small), len(large))
+        self.assertLessEqual(len(large), 6)
+        self.assertEqual(OrderItem.objects.count(), 32)
+
+    def test_prices_follow_menu_changes(self):
+        self.post_cart(self.cart_of(1))
+
+        item = self.menu_items[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            item.price = 50
+            item.save()
+        response = self.post_cart(self.cart_of(1))
+
+        self.assertEqual(Order.objects.get(pk=response.json()['order_id']).total_price, 100)
+
+    def test_rejects_unavailable_menu_items(self):
+        item = self.menu_items[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            item.is_available = False
+            item.save()
+        response = self.post_cart(self.cart_of(1))
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_repeated_idempotency_key_returns_original_order(self):
+        first = self.post_cart(self.cart_of(2), **{'Idempotency-Key': 'abc'})
+        with CaptureQueriesContext(connection) as retry_queries:
+            retry = self.post_cart(self.cart_of(2), **{'Idempotency-Key': 'abc'})
+
+        self.assertEqual(retry.json()['order_id'], first.json()['order_id'])
+        self.assertTrue(retry.json()['duplicate'])
+        self.assertEqual(len(retry_queries), 0)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(idempotency.get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_rejects_non_string_idempotency_key(self):
+        response = self.client.post(
+            reverse('api_create_order'),
+            data=json.dumps({'table_uuid': str(self.table.uuid), 'cart': self.cart_of(1), 'idempotency_key': 123}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_failed_order_releases_idempotency_key(self):
+        self.post_cart([{'id': self.foreign_item.id, 'qty': 1}], **{'Idempotency-Key': 'abc'})
+        response = self.post_cart(self.cart_of(1), **{'Idempotency-Key': 'abc'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('duplicate', response.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_kitchen_notification_is_written_to_outbox(self):
+        response = self.post_cart(self.cart_of(2))
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.group, f'restaurant_{self.restaurant.id}')
+        self.assertEqual(event.payload['type'], 'order_delta')
+        self.assertEqual(event.payload['event'], 'order_created')
+        self.assertEqual(event.payload['order']['id'], response.json()['order_id'])
+        self.assertEqual(event.payload['order']['table_id'], self.table.id)
+        self.assertEqual(event.payload['order']['items'], [
+            {'name': 'Dish 0', 'quantity': 2, 'note': ''},
+            {'name': 'Dish 1', 'quantity': 2, 'note': ''},
+        ])
+        self.assertIsNone(event.dispatched_at)
+
+    def test_status_change_sends_delta_with_table_state(self):
+        order_id = self.post_cart(self.cart_of(1)).json()['order_id']
+        OutboxEvent.objects.all().delete()
+
+        self.client.force_login(self.owner)
+        self.client.post(
+            reverse('update_order_status'),
+            data=json.dumps({'order_id': order_id, 'status': 'CANCELLED'}),
+            content_type='application/json',
+        )
+
+        payload = OutboxEvent.objects.get().payload
+        self.assertEqual(payload['event'], 'order_status_changed')
+        self.assertEqual(payload['order']['status'], 'CANCELLED')
+        self.assertEqual(payload['table']['id'], self.table.id)
+        self.assertFalse(payload['table']['has_active_order'])
+
+
+class TableSessionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = seed_restaurant(tables=1, categories=1, items_per_category=3)
+        cls.table = cls.restaurant.tables.get()
+        cls.menu_items = list(MenuItem.objects.filter(category__restaurant=cls.restaurant).order_by('id'))
+
+    def setUp(self):
+        cache.clear()
+
+    def order(self, *quantities):
+        cart = [{'id': item.id, 'qty': qty} for item, qty in zip(self.menu_items, quantities)]
+        self.table.refresh_from_db()
+        response = self.client.post(
+            reverse('api_create_order'),
+            data=json.dumps({'table_uuid': str(self.table.uuid), 'cart': cart}),
+            content_type='application/json',
+        )
+        return Order.objects.get(pk=response.json()['order_id'])
+
+    def session_values(self):
+        return list(
+            TableSession.objects.filter(closed_at__isnull=True)
+            .values_list('table_id', 'subtotal', 'order_count', 'item_count')
+        )
+
+    def assertMatchesRebuild(self, expected):
+        self.assertEqual(self.session_values(), expected)
+        # ค่าที่สะสมทีละนิดต้องเท่ากับคำนวณใหม่จากออเดอร์ดิบ
+        table_sessions.rebuild([self.restaurant.id])
+        self.assertEqual(self.session_values(), expected)
+
+    def test_running_totals_follow_order_changes(self):
+        # ราคาเมนู 40 / 45 / 50
+        first = self.order(1, 2)
+        second = self.order(0, 0, 3)
+        self.assertMatchesRebuild([(self.table.id, Decimal('280'), 2, 6)])
+
+        self.client.force_login(self.restaurant.owner)
+        self.client.post(reverse('delete_order_item', args=[first.items.get(menu_item=self.menu_items[1]).id]))
+        self.assertMatchesRebuild([(self.table.id, Decimal('190'), 2, 4)])
+
+        self.client.post(
+            reverse('update_order_status'),
+            data=json.dumps({'order_id': second.id, 'status': 'CANCELLED'}),
+            content_type='application/json',
+        )
+        self.assertMatchesRebuild([(self.table.id, Decimal('40'), 1, 1)])
+
+    def test_close_bill_closes_session_and_next_order_opens_a_new_one(self):
+        self.order(1)
+        opened = TableSession.objects.get()
+
+        self.client.force_login(self.restaurant.owner)
+        self.client.post(reverse('close_bill', args=[self.table.id]), {'payment_method': 'CASH'})
+        opened.refresh_from_db()
+        self.assertIsNotNone(opened.closed_at)
+
+        self.order(2)
+        self.assertEqual(TableSession.objects.count(), 2)
+        self.assertEqual(self.session_values(), [(self.table.id, Decimal('80'), 1, 2)])
+
+    def test_cancelling_last_order_closes_session(self):
+        order = self.order(1)
+
+        self.client.force_login(self.restaurant.owner)
+        self.client.post(
+            reverse('update_order_status'),
+            data=json.dumps({'order_id': order.id, 'status': 'CANCELLED'}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(self.session_values(), [])
+        history = self.client.get(reverse('get_table_order_history'), {'table_uuid': str(self.table.uuid)}).json()
+        self.assertEqual((history['items'], history['grand_total']), ([], 0))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class OutboxDispatchTests(TestCase):
+
+    def test_dispatch_batch_sends_in_order_and_marks_events(self):
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('restaurant_1', channel_name)
+
+        outbox.enqueue_many('restaurant_1', [{'type': 'first'}, {'type': 'second'}])
+
+        self.assertEqual(outbox.outbox_stats()['backlog'], 2)
+        self.assertEqual(outbox.dispatch_batch(channel_layer), 2)
+        self.assertEqual(async_to_sync(channel_layer.receive)(channel_name)['type'], 'first')
+        self.assertEqual(async_to_sync(channel_layer.receive)(channel_name)['type'], 'second')
+        self.assertEqual(outbox.outbox_stats(), {'backlog': 0, 'lag_seconds': 0.0})
+        self.assertEqual(outbox.dispatch_batch(channel_layer), 0)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_transport_error_backs_off_without_dropping(self):
+        class DownLayer:
+            calls = 0
+
+            async def group_send(self, group, message):
+                self.calls += 1
+                raise ConnectionError('redis is down')
+
+        outbox.enqueue_many('restaurant_1', [{'type': 'first'}, {'type': 'second'}])
+        layer = DownLayer()
+
+        # ล่มนานกว่าจำนวนครั้งที่เคยทิ้งข้อความ (10) ข้อความต้องยังอยู่ครบ และรอนานขึ้นเรื่อยๆ
+        delays = []
+        with self.assertLogs('orders.outbox', 'WARNING'):
+            for _ in range(12):
+                OutboxEvent.objects.update(next_attempt_at=None)
+                self.assertEqual(outbox.dispatch_batch(layer), 0)
+                first = OutboxEvent.objects.order_by('id').first()
+                delays.append(round((first.next_attempt_at - timezone.now()).total_seconds()))
+
+        self.assertEqual(layer.calls, 12)  # หยุดที่ข้อความแรกทุกครั้ง ไม่ลองตัวที่สอง
+        self.assertEqual(outbox.outbox_stats()['backlog'], 2)
+        self.assertEqual(delays[:4], [0, 1, 2, 4])
+        self.assertEqual(delays[-1], outbox.MAX_BACKOFF_SECONDS)
+        self.assertFalse(OutboxEvent.objects.filter(claimed_until__isnull=False).exists())
+
+        # ยังไม่ถึงเวลาลองใหม่: ไม่ส่งอะไรเลย (รวมถึงข้อความถัดไป กันสลับลำดับ)
+        self.assertEqual(outbox.dispatch_batch(layer), 0)
+        self.assertEqual(layer.calls, 12)
+
+        # Redis กลับมา: ส่งครบตามลำดับเดิม
+        OutboxEvent.objects.update(next_attempt_at=None)
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('restaurant_1', channel_name)
+        self.assertEqual(outbox.dispatch_batch(channel_layer), 2)
+        self.assertEqual(async_to_sync(channel_layer.receive)(channel_name)['type'], 'first')
+        self.assertEqual(async_to_sync(channel_layer.receive)(channel_name)['type'], 'second')
+
+    def test_claimed_or_backed_off_group_does_not_block_other_groups(self):
+        outbox.enqueue_many('restaurant_1', [{'type': 'first'}, {'type': 'second'}])
+        outbox.enqueue('restaurant_2', {'type': 'other'})
+
+        # dispatcher ตัวแรกถือข้อความแรกของร้าน 1 อยู่: ตัวที่สองต้องไม่หยิบข้อความถัดไปของร้าน 1 ไปส่งก่อน
+        [held] = outbox._claim(1)
+        self.assertEqual(held.payload['type'], 'first')
+        self.assertEqual([event.payload['type'] for event in outbox._claim(100)], ['other'])
+
+        # ร้าน 1 รอ backoff: ร้าน 2 ยังส่งได้ตามปกติ
+        OutboxEvent.objects.update(claimed_until=None)
+        OutboxEvent.objects.filter(id=held.id).update(next_attempt_at=timezone.now() + datetime.timedelta(minutes=1))
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('restaurant_2', channel_name)
+
+        self.assertEqual(outbox.dispatch_batch(channel_layer), 1)
+        self.assertEqual(async_to_sync(channel_layer.receive)(channel_name)['type'], 'other')
+        self.assertEqual(list(OutboxEvent.objects.values_list('group', flat=True)), ['restaurant_1', 'restaurant_1'])
+
+    def test_transport_error_in_one_group_does_not_stop_the_batch(self):
+        class FullLayer:
+            sent = []
+
+            async def group_send(self, group, message):
+                if group == 'restaurant_1':
+                    raise ConnectionError('channel full')
+                self.sent.append(message['type'])
+
+        outbox.enqueue_many('restaurant_1', [{'type': 'first'}, {'type': 'second'}])
+        outbox.enqueue('restaurant_2', {'type': 'other'})
+
+        with self.assertLogs('orders.outbox', 'WARNING'):
+            self.assertEqual(outbox.dispatch_batch(FullLayer()), 1)
+        self.assertEqual(FullLayer.sent, ['other'])
+        first, second = OutboxEvent.objects.order_by('id')
+        self.assertEqual((first.attempts, second.attempts), (1, 0))
+        self.assertIsNone(second.claimed_until)
+
+    def test_unsendable_message_is_dropped_and_queue_continues(self):
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('restaurant_1', channel_name)
+
+        # ชื่อ group ผิดรูปแบบ: Channel Layer ปฏิเสธทุกครั้ง (TypeError)
+        outbox.enqueue('restaurant 1!', {'type': 'broken'})
+        outbox.enqueue('restaurant_1', {'type': 'after'})
+
+        with self.assertLogs('orders.outbox', 'ERROR'):
+            self.assertEqual(outbox.dispatch_batch(channel_layer), 1)
+        self.assertEqual(async_to_sync(channel_layer.receive)(channel_name)['type'], 'after')
+        dropped = OutboxEvent.objects.get()
+        self.assertIsNotNone(dropped.dispatched_at)
+        self.assertEqual(outbox.outbox_stats()['backlog'], 0)
+
+
+class SalesRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='owner', email='owner@example.com', password='x',
+            approval_status='APPROVED', is_shop_owner=True,
+        )
+        cls.restaurant = Restaurant.objects.create(owner=cls.owner, name='Test Shop')
+        cls.table = Table.objects.create(restaurant=cls.restaurant, name='T1')
+        category = Category.objects.create(restaurant=cls.restaurant, name='Main')
+        cls.rice = MenuItem.objects.create(category=category, name='Rice', price=40)
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def add_order(self, quantity=1):
+        order = Order.objects.create(restaurant=self.restaurant, table=self.table, total_price=40 * quantity)
+        OrderItem.objects.create(order=order, menu_item=self.rice, quantity=quantity, price=40)
+        return order
+
+    def close_bill(self, payment_method='cash'):
+        self.client.post(reverse('close_bill', args=[self.table.id]), {'payment_method': payment_method})
+
+    def test_close_bill_adds_to_daily_rollup(self):
+        self.add_order(quantity=2)
+        self.add_order(quantity=1)
+        self.close_bill('qr')
+        self.add_order(quantity=3)
+        self.close_bill('cash')
+
+        rows = {row.payment_method: row for row in DailySales.objects.filter(restaurant=self.restaurant)}
+        self.assertEqual(rows['QR'].revenue, 120)
+        self.assertEqual(rows['QR'].order_count, 2)
+        self.assertEqual(rows['QR'].item_count, 3)
+        self.assertEqual(rows['CASH'].revenue, 120)
+        self.assertEqual(rows['CASH'].date, timezone.localdate())
+
+    def test_closing_the_same_table_twice_applies_rollups_once(self):
+        self.add_order(quantity=2)
+        # เครื่องที่สองอ่านชุดออเดอร์ไว้ก่อนเครื่องแรก commit (ได้ id ชุดเดิม)
+        stale_ids = list(Order.objects.filter(table=self.table).values_list('id', flat=True))
+
+        self.close_bill()
+        with mock.patch('restaurants.views._open_order_ids', return_value=stale_ids):
+            self.close_bill()
+        self.close_bill()
+
+        row = DailySales.objects.get(restaurant=self.restaurant)
+        self.assertEqual((row.revenue, row.order_count, row.item_count), (80, 1, 2))
+        self.assertEqual(HourlySales.objects.get(restaurant=self.restaurant).revenue, 80)
+        self.assertEqual(MenuItemDailySales.objects.get(restaurant=self.restaurant).quantity, 2)
+
+    def test_cancelling_a_paid_order_is_subtracted(self):
+        order = self.add_order(quantity=2)
+        self.add_order(quantity=1)
+        self.close_bill()
+
+        self.client.post(
+            reverse('update_order_status'),
+            data=json.dumps({'order_id': order.id, 'status': 'CANCELLED'}),
+            content_type='application/json',
+        )
+
+        row = DailySales.objects.get(restaurant=self.restaurant)
+        self.assertEqual((row.revenue, row.order_count, row.item_count), (40, 1, 1))
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.add_order(quantity=2)
+        self.close_bill('qr')
+        self.add_order(quantity=1)
+        self.close_bill()
+        incremental = list(DailySales.objects.values('date', 'payment_method', 'revenue', 'order_count', 'item_count').order_by('payment_method'))
+
+        created = rollups.rebuild([self.restaurant.id])
+        self.assertEqual(created, DailySales.objects.count() + MenuItemDailySales.objects.count() + HourlySales.objects.count())
+
+        rebuilt = list(DailySales.objects.values('date', 'payment_method', 'revenue', 'order_count', 'item_count').order_by('payment_method'))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_reports_read_from_rollup(self):
+        self.add_order(quantity=2)
+        self.close_bill()
+        # ออเดอร์ดิบที่ไม่ผ่าน close_bill จะไม่ถูกนับจนกว่าจะ rebuild
+        Order.objects.create(restaurant=self.restaurant, table=self.table, total_price=999, status='COMPLETED', is_paid=True)
+
+        analytics = self.client.get(reverse('analytics_dashboard'))
+        report = self.client.get(reverse('report_sales'))
+        dashboard = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(analytics.context['total_revenue'], 80)
+        self.assertEqual(analytics.context['total_orders'], 1)
+        self.assertEqual(report.context['today_sales'], 80)
+        self.assertEqual(dashboard.context['today_sales'], 80)
+
+    def test_item_rollup_keeps_name_at_sale_time(self):
+        self.add_order(quantity=2)
+        self.close_bill()
+        self.rice.name = 'Fried Rice'
+        self.rice.save()
+        self.add_order(quantity=1)
+        self.close_bill()
+
+        rows = MenuItemDailySales.objects.filter(restaurant=self.restaurant).order_by('menu_item_name')
+        self.assertEqual(
+            [(row.menu_item_name, row.quantity, row.revenue) for row in rows],
+            [('Fried Rice', 1, 40), ('Rice', 2, 80)],
+        )
+
+        analytics = self.client.get(reverse('analytics_dashboard'))
+        self.assertEqual(json.loads(analytics.context['top_items_labels']), ['Rice', 'Fried Rice'])
+
+    def test_renamed_item_keeps_its_rollup_row_on_cancel_and_rebuild(self):
+        order = self.add_order(quantity=2)
+        self.add_order(quantity=1)
+        self.close_bill()
+        self.rice.name = 'Fried Rice'
+        self.rice.save()
+
+        self.client.post(
+            reverse('update_order_status'),
+            data=json.dumps({'order_id': order.id, 'status': 'CANCELLED'}),
+            content_type='application/json',
+        )
+        rows = MenuItemDailySales.objects.filter(restaurant=self.restaurant)
+        self.assertEqual([(row.menu_item_name, row.quantity, row.revenue) for row in rows], [('Rice', 1, 40)])
+
+        rollups.rebuild([self.restaurant.id])
+        rows = MenuItemDailySales.objects.filter(restaurant=self.restaurant)
+        self.assertEqual([(row.menu_item_name, row.quantity, row.revenue) for row in rows], [('Rice', 1, 40)])
+
+    def test_peak_hours_matrix_uses_local_time(self):
+        # 2026-10-12 (จันทร์) 12:30 UTC = 19:30 เวลาไทย
+        order = self.add_order(quantity=2)
+        created = datetime.datetime(2026, 10, 12, 12, 30, tzinfo=datetime.timezone.utc)
+        Order.objects.filter(pk=order.pk).update(created_at=created, business_date=datetime.date(2026, 10, 12))
+        self.close_bill()
+
+        row = HourlySales.objects.get(restaurant=self.restaurant)
+        self.assertEqual((row.date, row.weekday, row.hour, row.order_count, row.revenue), (datetime.date(2026, 10, 12), 0, 19, 1, 80))
+
+        analytics = self.client.get(reverse('analytics_dashboard'), {'start_date': '2026-10-01', 'end_date': '2026-10-31'})
+        matrix = json.loads(analytics.context['peak_matrix'])
+        self.assertEqual([len(row) for row in matrix['orders']], [24] * 7)
+        self.assertEqual(matrix['orders'][0][19], 1)
+        self.assertEqual(matrix['revenue'][0][19], 80.0)
+        self.assertEqual(sum(map(sum, matrix['orders'])), 1)
+
+    def test_business_date_follows_restaurant_day_cutoff(self):
+        self.restaurant.day_cutoff = datetime.time(4, 0)
+        # 02:30 เวลาไทยวันที่ 13 (ก่อนตัดรอบ 04:00) = วันขายที่ 12 / 05:00 = วันขายที่ 13
+        late_night = datetime.datetime(2026, 10, 12, 19, 30, tzinfo=datetime.timezone.utc)
+        morning = datetime.datetime(2026, 10, 12, 22, 0, tzinfo=datetime.timezone.utc)
+        self.assertEqual(self.restaurant.business_date(late_night), datetime.date(2026, 10, 12))
+        self.assertEqual(self.restaurant.business_date(morning), datetime.date(2026, 10, 13))
+
+        self.restaurant.save()
+        order = self.add_order()
+        self.assertEqual(order.business_date, self.restaurant.business_date())
+
+        order.business_date = datetime.date(2026, 10, 12)
+        order.save()
+        self.close_bill()
+        self.assertEqual(DailySales.objects.get(restaurant=self.restaurant).date, datetime.date(2026, 10, 12))
+
+        history = self.client.get(reverse('order_history'), {'date': '2026-10-12'})
+        self.assertEqual([o.id for o in history.context['page_obj']], [order.id])
+        self.assertEqual(len(self.client.get(reverse('order_history'), {'date': '2026-10-13'}).context['page_obj']), 0)
+
+
+class OrderIndexPlanTests(TestCase):
+    """Query หลักของออเดอร์ที่เปิดอยู่ / ประวัติการขาย ต้องใช้ Index ไม่ใช่ Sequential Scan (ดู Order.Meta.indexes)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = seed_restaurant(tables=10, categories=2, items_per_category=5)
+        for status, is_paid in [('PENDING', False), ('COOKING', False), ('SERVED', False), ('COMPLETED', True), ('CANCELLED', False)]:
+            seed_orders(cls.restaurant, 40, items_per_order=1, status=status, is_paid=is_paid)
+        cls.table = cls.restaurant.tables.first()
+
+    def assertUsesIndex(self, queryset, index_name):
+        """Plan ต้องใช้ Index ที่ตั้งชื่อไว้ (FK index ของ table / restaurant ไม่นับ) และไม่ต้อง sort เองถ้ามี order_by"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # ข้อมูลทดสอบน้อย Planner จะเลือก Seq Scan เสมอ ปิดไว้เพื่อดูว่า "มี Index ที่ใช้ได้" หรือไม่
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+
+        if connection.vendor == 'postgresql':
+            self.assertIn(index_name, plan, plan)
+            if queryset.ordered:
+                self.assertNotRegex(plan, r'\bSort\b', plan)
+        elif connection.vendor == 'sqlite':
+            self.assertIn(f'USING INDEX {index_name}', plan, plan)
+            if queryset.ordered:
+                self.assertNotIn('USE TEMP B-TREE', plan, plan)
+
+    def test_open_orders_of_table(self):
+        self.assertUsesIndex(self.table.orders.filter(is_paid=False).exclude(status='CANCELLED'), 'order_table_open_idx')
+
+    def test_kitchen_open_orders(self):
+        self.assertUsesIndex(
+            self.restaurant.orders.filter(is_paid=False, status__in=realtime.KITCHEN_STATUSES).order_by('created_at'),
+            'order_kitchen_idx',
+        )
+
+    def test_order_history(self):
+        self.assertUsesIndex(
+            self.restaurant.orders.filter(status='COMPLETED', is_paid=True).order_by('-created_at'),
+            'order_status_idx',
+        )
+
+
+class OrderApiQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_create_order_api(self):
+        menu_item = MenuItem.objects.filter(category__restaurant=self.restaurant).first()
+
+        def warm_menu():
+            # Snapshot เมนูถูกสร้างครั้งเดียวต่อเวอร์ชัน ไม่นับรวมในงบของการสั่งแต่ละครั้ง
+            async_to_sync(aget_menu_snapshot)(self.restaurant.id)
+            return ()
+
+        self.client.logout()
+        # ออเดอร์แรกของโต๊ะเปิด Session ใหม่ (+1 INSERT) ออเดอร์ถัดไปแค่ UPDATE ยอดสะสม
+        self.assertQueryBudget(
+            7, lambda: self.client.post(
+                reverse('api_create_order'),
+                data=json.dumps({'table_uuid': str(self.table.uuid), 'cart': [{'id': menu_item.id, 'qty': 2}]}),
+                content_type='application/json',
+            ),
+            prepare=warm_menu, warm=False,
+        )
+
+    def test_update_order_status(self):
+        self.assertQueryBudget(
+            8, lambda order: self.client.post(
+                reverse('update_order_status'),
+                data=json.dumps({'order_id': order.id, 'status': 'COOKING'}),
+                content_type='application/json',
+            ),
+            prepare=lambda: (self.restaurant.orders.filter(status='PENDING').last(),), warm=False,
+        )
+
+    def test_get_table_order_history(self):
+        self.client.logout()
+        self.assertQueryBudget(
+            4, lambda: self.client.get(reverse('get_table_order_history'), {'table_uuid': str(self.table.uuid)}),
+        )
+
+    def test_idempotency_stats_api(self):
+        self.client.force_login(self.superuser)
+        self.assertQueryBudget(2, lambda: self.client.get(reverse('idempotency_stats_api')))
@@ -6,4 +6,6 @@ urlpatterns = [
     path('api/update-status/', api.update_order_status, name='update_order_status'),
     # ดึงรายการทั้งหมดที่โต๊ะนั้นสั่ง
     path('api/history/', api.get_table_order_history, name='get_table_order_history'),
+    # สถิติการกันออเดอร์ซ้ำ (Superuser)
+    path('api/idempotency-stats/', api.idempotency_stats_api, name='idempotency_stats_api'),
 ]
\ No newline at end of file
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RestaurantsConfig(AppConfig):
     name = 'restaurants'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401 (ลงทะเบียน check ตอน deploy + signal ล้างแคชเมนู / โต๊ะ)
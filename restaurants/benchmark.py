@@ -0,0 +1,122 @@
+# restaurants/benchmark.py
+# เครื่องมือกลางสำหรับคำสั่ง bench_* (manage.py bench_...)
+# - สร้าง Database ชั่วคราวแยกจากของจริง แล้วลบทิ้งเมื่อวัดผลเสร็จ
+# - สร้างข้อมูลร้านจำลอง (โต๊ะ / เมนู / ออเดอร์ค้าง)
+# - สรุปผลเวลาเป็น mean / p50 / p95 / p99
+import math
+import os
+import statistics
+import tempfile
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from users.models import User
+from orders import table_sessions
+from orders.models import Order, OrderItem
+from .models import Restaurant, Table, Category, MenuItem
+
+
+@contextmanager
+def benchmark_database():
+    """สร้าง Test DB (migrate ครบ) ใช้ระหว่างวัดผล แล้วลบทิ้งตอนจบ"""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+
+    # SQLite แบบ in-memory จะ error ทันทีเมื่อเขียนพร้อมกันหลาย Thread (table is locked)
+    # ใช้ไฟล์ชั่วคราวแทน เพื่อให้รอ lock ตาม timeout ปกติเหมือนใช้งานจริง
+    if connection.vendor == 'sqlite' and not old_test_name:
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'rpos_bench_{os.getpid()}.sqlite3')
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        teardown_test_environment()
+
+
+def seed_restaurant(name='Bench Shop', tables=10, categories=5, items_per_category=10):
+    """สร้างร้านจำลองพร้อมโต๊ะและเมนู คืนค่า Restaurant"""
+    slug = f"bench-{Restaurant.objects.count() + 1}"
+    owner = User.objects.create_user(
+        username=slug,
+        email=f'{slug}@example.com',
+        password='bench',
+        approval_status='APPROVED',
+        is_shop_owner=True,
+    )
+    restaurant = Restaurant.objects.create(owner=owner, name=name, slug=slug)
+
+    Table.objects.bulk_create([
+        Table(restaurant=restaurant, name=f'T{i + 1}') for i in range(tables)
+    ])
+    for c in range(categories):
+        category = Category.objects.create(restaurant=restaurant, name=f'Category {c + 1}', order=c)
+        MenuItem.objects.bulk_create([
+            MenuItem(category=category, name=f'Dish {c + 1}-{i + 1}', price=Decimal(40 + i * 5))
+            for i in range(items_per_category)
+        ])
+    return restaurant
+
+
+def seed_orders(restaurant, count, items_per_order=3, status='PENDING', is_paid=False):
+    """สร้างออเดอร์จำลองกระจายไปทุกโต๊ะ (bulk ทั้งหมด เพื่อให้ seed หลักพันได้เร็ว)"""
+    tables = list(restaurant.tables.all())
+    menu_items = list(MenuItem.objects.filter(category__restaurant=restaurant))
+
+    business_date = restaurant.business_date()
+    orders = Order.objects.bulk_create([
+        Order(restaurant=restaurant, table=tables[i % len(tables)], status=status, is_paid=is_paid, business_date=business_date)
+        for i in range(count)
+    ])
+    # SQLite / Postgres คืน pk หลัง bulk_create ได้ แต่กันไว้สำหรับ DB ที่คืนไม่ได้
+    if orders and orders[0].pk is None:
+        orders = list(restaurant.orders.order_by('-id')[:count])
+
+    items = []
+    for i, order in enumerate(orders):
+        total = Decimal('0')
+        for j in range(items_per_order):
+            menu_item = menu_items[(i + j) % len(menu_items)]
+            items.append(OrderItem(order=order, menu_item=menu_item, name=menu_item.name, quantity=1 + j % 2, price=menu_item.price))
+            total += menu_item.price * (1 + j % 2)
+        order.total_price = total
+    OrderItem.objects.bulk_create(items)
+    Order.objects.bulk_update(orders, ['total_price'])
+    # bulk_create ไม่ผ่านทางที่อัปเดต Session ของโต๊ะ สร้าง Session ของร้านนี้ใหม่ทีเดียว
+    table_sessions.rebuild([restaurant.id])
+    return orders
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples_ms):
+    """สรุปผลเวลา (หน่วยมิลลิวินาที)"""
+    values = sorted(samples_ms)
+    return {
+        'count': len(values),
+        'mean': statistics.fmean(values) if values else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': values[-1] if values else 0.0,
+    }
+
+
+def format_summary(label, samples_ms):
+    s = summarize(samples_ms)
+    return (
+        f"{label:<28} n={s['count']:<5} mean={s['mean']:8.1f}ms  p50={s['p50']:8.1f}ms  "
+        f"p95={s['p95']:8.1f}ms  p99={s['p99']:8.1f}ms  max={s['max']:8.1f}ms"
+    )
@@ -0,0 +1,17 @@
+# restaurants/checks.py
+# ตรวจตอน deploy (python manage.py check --deploy)
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Snapshot เมนู / UUID โต๊ะ / ยอดบิล ล้างด้วยการเปลี่ยนคีย์ใน cache ต้องเป็น cache ที่ทุก worker เห็นร่วมกัน"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend.endswith('LocMemCache'):
+        return [Warning(
+            'The default cache is in-process (locmem): menu, table and bill invalidations only reach one worker.',
+            hint='Set CACHE_URL to a shared cache such as redis://127.0.0.1:6379/1, or run a single worker.',
+            id='restaurants.W001',
+        )]
+    return []
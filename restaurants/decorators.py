@@ -1,9 +1,10 @@
 # restaurants/decorators.py (สร้างไฟล์ใหม่)
 from django.shortcuts import redirect
-from django.core.exceptions import ObjectDoesNotExist
 from functools import wraps
 from django.http import JsonResponse
 
+from .tenant import get_restaurant
+
 
 
 def restaurant_active_required(view_func):
@@ -17,18 +18,14 @@ def restaurant_active_required(view_func):
         if request.user.is_superuser:
              return view_func(request, *args, **kwargs)
 
-        try:
-            # 3. เช็คว่ามีร้านไหม และร้าน Active ไหม
-            if hasattr(request.user, 'restaurant'):
-                if not request.user.restaurant.is_active:
-                    # ❌ ถ้าร้านถูกปิด -> ดีดไปหน้า Suspended
-                    return redirect('restaurant_suspended')
-            else:
-                # ถ้าไม่มีร้าน ให้ไปหน้าสร้างร้าน (ตาม Logic เดิม)
-                return redirect('create_restaurant')
-                
-        except ObjectDoesNotExist:
+        # 3. เช็คว่ามีร้านไหม และร้าน Active ไหม (ร้านโหลดมาพร้อม User แล้ว ไม่ยิง Query เพิ่ม)
+        restaurant = get_restaurant(request.user)
+        if restaurant is None:
+            # ถ้าไม่มีร้าน ให้ไปหน้าสร้างร้าน (ตาม Logic เดิม)
             return redirect('create_restaurant')
+        if not restaurant.is_active:
+            # ❌ ถ้าร้านถูกปิด -> ดีดไปหน้า Suspended
+            return redirect('restaurant_suspended')
 
         # ✅ ถ้าร้าน Active -> ให้ทำงานต่อได้
         return view_func(request, *args, **kwargs)
@@ -50,22 +47,18 @@ def api_restaurant_active_required(view_func):
         if request.user.is_superuser:
             return view_func(request, *args, **kwargs)
 
-        try:
-            # 3. เช็คสถานะร้าน
-            if hasattr(request.user, 'restaurant'):
-                if not request.user.restaurant.is_active:
-                    # ❌ ถ้าร้านถูกแบน Return JSON 403 Forbidden
-                    return JsonResponse({
-                        'error': 'Restaurant is suspended. Please contact support.',
-                        'success': False
-                    }, status=403)
-            else:
-                 return JsonResponse({'error': 'Restaurant not found', 'success': False}, status=404)
-                 
-        except Exception as e:
-            return JsonResponse({'error': str(e), 'success': False}, status=500)
+        # 3. เช็คสถานะร้าน
+        restaurant = get_restaurant(request.user)
+        if restaurant is None:
+            return JsonResponse({'error': 'Restaurant not found', 'success': False}, status=404)
+        if not restaurant.is_active:
+            # ❌ ถ้าร้านถูกแบน Return JSON 403 Forbidden
+            return JsonResponse({
+                'error': 'Restaurant is suspended. Please contact support.',
+                'success': False
+            }, status=403)
 
         # ✅ ผ่าน
         return view_func(request, *args, **kwargs)
 
-    return _wrapped_view
\ No newline at end of file
+    return _wrapped_view
@@ -0,0 +1,61 @@
+# restaurants/floor.py
+# สถานะโต๊ะทั้งร้าน (Floor State) สำหรับหน้า Cashier
+# อ่านยอดค้าง / จำนวนออเดอร์ / เวลาเปิดบิล จาก Session ที่เปิดอยู่ของแต่ละโต๊ะ (orders.TableSession)
+# ใน Query เดียว (LEFT JOIN 1 แถวต่อโต๊ะ) ไม่ต้อง GROUP BY ออเดอร์ทั้งหมดที่ยังไม่จ่าย
+from django.db.models import F, FilteredRelation, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Table
+
+
+def _with_open_orders(tables):
+    """ใส่สถานะบิลที่เปิดอยู่ให้โต๊ะทุกตัวใน QuerySet (JOIN Session ที่ยังไม่ปิด)"""
+    tables = tables.annotate(
+        open_session=FilteredRelation('sessions', condition=Q(sessions__closed_at__isnull=True)),
+        order_count=F('open_session__order_count'),
+        pending_amount=F('open_session__subtotal'),
+        oldest_order_at=F('open_session__opened_at'),
+    )
+
+    now = timezone.now()
+    tables = list(tables)
+    for table in tables:
+        table.order_count = table.order_count or 0
+        table.has_active_order = table.order_count > 0
+        table.pending_amount = table.pending_amount or 0
+        table.oldest_order_age = int((now - table.oldest_order_at).total_seconds()) if table.oldest_order_at else None
+    return tables
+
+
+def floor_tables(restaurant):
+    """โต๊ะทั้งหมดของร้าน พร้อมสถานะบิลที่เปิดอยู่ (1 Query)"""
+    return _with_open_orders(restaurant.tables.order_by('name', 'id'))
+
+
+def table_state(table_id):
+    """สถานะบิลของโต๊ะเดียว (ใช้ใส่ในข้อความ Delta) คืนค่า None ถ้าไม่มีโต๊ะนี้แล้ว"""
+    tables = _with_open_orders(Table.objects.filter(pk=table_id))
+    return serialize_table(tables[0]) if tables else None
+
+
+def serialize_table(table):
+    """แปลงโต๊ะ (จาก floor_tables) เป็น dict สำหรับ JSON"""
+    return {
+        'id': table.id,
+        'name': table.name,
+        'has_active_order': table.has_active_order,
+        'pending_amount': float(table.pending_amount),
+        'order_count': table.order_count,
+        'oldest_order_at': table.oldest_order_at.isoformat() if table.oldest_order_at else None,
+        'oldest_order_age_seconds': table.oldest_order_age,
+        'bill_url': reverse('table_bill_detail', args=[table.id]),
+    }
+
+
+def floor_state(restaurant):
+    return {
+        'tables': [serialize_table(table) for table in floor_tables(restaurant)],
+        'generated_at': timezone.now().isoformat(),
+    }
+
@@ -94,7 +94,7 @@ class RestaurantSettingsForm(forms.ModelForm):
     )
     class Meta:
         model = Restaurant
-        fields = ['image', 'payment_qr_image', 'name', 'address', 'phone', 'vat_percent', 'service_charge_percent']
+        fields = ['image', 'payment_qr_image', 'name', 'address', 'phone', 'vat_percent', 'service_charge_percent', 'day_cutoff']
         labels = {
             'image': 'โลโก้ร้านค้า',
             'payment_qr_image': 'QR Code รับเงิน',
@@ -102,11 +102,16 @@ class RestaurantSettingsForm(forms.ModelForm):
             'address': 'ที่อยู่',
             'phone': 'เบอร์โทรศัพท์ติดต่อ',
             'vat_percent': 'ภาษีมูลค่าเพิ่ม (VAT %)',
-            'service_charge_percent': 'ค่าบริการ (Service Charge %)'
+            'service_charge_percent': 'ค่าบริการ (Service Charge %)',
+            'day_cutoff': 'เวลาตัดรอบวันขาย',
+        }
+        help_texts = {
+            'day_cutoff': 'ออเดอร์ก่อนเวลานี้นับเป็นยอดของวันก่อนหน้า (มีผลกับออเดอร์ใหม่เท่านั้น)',
         }
         
         widgets = {
             'address': forms.Textarea(attrs={'rows': 3}),
+            'day_cutoff': forms.TimeInput(attrs={'type': 'time'}, format='%H:%M'),
             
             # Style ของ Logo
             'image': forms.ClearableFileInput(attrs={
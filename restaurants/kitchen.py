@@ -0,0 +1,71 @@
+# restaurants/kitchen.py
+# การ์ดออเดอร์บนจอครัว (ออเดอร์ที่ยังไม่เสิร์ฟ) ในรูปแบบเดียวกับข้อความ Delta (orders/realtime.py)
+# ใช้ทั้งตอน render หน้าครัว และเป็น Snapshot ให้จอที่เชื่อมต่อใหม่โหลดสถานะล่าสุด
+#
+# การ์ดแต่ละใบเก็บใน cache โดยคีย์ผูกกับ updated_at ของออเดอร์
+# ออเดอร์ที่ไม่เปลี่ยนไม่ต้องโหลดรายการอาหารซ้ำ (เปลี่ยนสถานะ / ลบรายการ / ปิดบิล = updated_at เปลี่ยน = คีย์ใหม่)
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from orders import realtime
+from orders.models import OrderItem
+from users.instrumentation import record_cache
+
+
+def _ttl():
+    return getattr(settings, 'KITCHEN_CARD_TTL', 60 * 60 * 6)
+
+
+def _card_key(order):
+    return f'kitchen_card:{order.id}:{order.updated_at.timestamp():.6f}'
+
+
+def _build_cards(orders):
+    """สร้างการ์ดจาก DB สำหรับออเดอร์ที่ยังไม่มีใน cache (1 Query สำหรับรายการอาหารทุกออเดอร์)"""
+    items = defaultdict(list)
+    rows = (
+        OrderItem.objects
+        .filter(order__in=[order.id for order in orders])
+        .order_by('id')
+        .values('order_id', 'menu_item__name', 'quantity', 'note')
+    )
+    for row in rows:
+        items[row['order_id']].append({'name': row['menu_item__name'], 'quantity': row['quantity'], 'note': row['note']})
+
+    return {
+        _card_key(order): realtime.order_card(order, order.table.name if order.table else '-', items[order.id])
+        for order in orders
+    }
+
+
+def open_order_cards(restaurant):
+    """การ์ดออเดอร์ทั้งหมดที่ครัวยังต้องทำ เรียงตามเวลาสั่ง
+
+    Query ไม่ขึ้นกับจำนวนออเดอร์: 1 Query (ออเดอร์ + โต๊ะ) ถ้าการ์ดอยู่ใน cache ครบ, +1 Query ถ้ามีการ์ดต้องสร้างใหม่
+    """
+    orders = list(
+        restaurant.orders
+        # is_paid=False: ออเดอร์ที่ครัวยังทำอยู่ยังไม่จ่ายเสมอ (ปิดบิลแล้วเป็น COMPLETED) ใส่ไว้ให้ใช้ order_kitchen_idx
+        .filter(is_paid=False, status__in=realtime.KITCHEN_STATUSES)
+        .select_related('table')
+        .order_by('created_at')
+    )
+    keys = [_card_key(order) for order in orders]
+    cards = cache.get_many(keys)
+
+    missing = [order for order, key in zip(orders, keys) if key not in cards]
+    record_cache(hits=len(cards), misses=len(missing))
+    if missing:
+        fresh = _build_cards(missing)
+        cache.set_many(fresh, _ttl())
+        cards.update(fresh)
+
+    result = []
+    for order, key in zip(orders, keys):
+        card = dict(cards[key])
+        # ชื่อโต๊ะแก้ได้โดยไม่กระทบออเดอร์ ใช้ค่าล่าสุดเสมอ
+        card['table'] = order.table.name if order.table else '-'
+        result.append(card)
+    return result
@@ -0,0 +1,83 @@
+# restaurants/menu_cache.py
+# Snapshot เมนูของแต่ละร้าน (หมวดหมู่ / เมนูที่เปิดขาย / ราคา / รูป) เก็บใน Django cache
+# - หน้าเมนูลูกค้า (dining_menu) และการคิดราคาออเดอร์ (create_order_api) อ่านจากที่เดียวกัน
+# - คีย์ผูกกับ "เวอร์ชันเมนู" ของร้าน ทุกครั้งที่แก้/ลบ Category หรือ MenuItem จะเปลี่ยนเวอร์ชัน (ดู signals.py)
+#   Snapshot เก่าจึงไม่ถูกอ่านอีก ไม่ต้องไล่ลบเอง
+# - เวอร์ชันอยู่ใน cache: ต้องเป็น cache ที่ทุก worker ใช้ร่วมกัน (Redis) ไม่งั้นแก้เมนูแล้ว worker อื่นยังขายเมนูที่ปิดไปแล้ว
+#   (settings บังคับ CACHE_URL เมื่อไม่ใช่ DEBUG และ check --deploy เตือนถ้ายังเป็น locmem ดู checks.py)
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from users.instrumentation import record_cache
+
+from .models import Category, MenuItem
+
+
+def _version_key(restaurant_id):
+    return f'menu_version:{restaurant_id}'
+
+
+def _snapshot_key(restaurant_id, version):
+    return f'menu_snapshot:{restaurant_id}:v{version}'
+
+
+def _ttl():
+    return getattr(settings, 'MENU_SNAPSHOT_TTL', 60 * 60 * 24)
+
+
+def _new_version():
+    # ใช้เวลาเป็นเลขเวอร์ชัน: ถ้าคีย์เวอร์ชันโดน evict จะไม่วนกลับไปใช้เลขเก่าที่อาจมี Snapshot ค้างอยู่
+    return time.time_ns()
+
+
+def bump_menu_version(restaurant_id):
+    """เปลี่ยนเวอร์ชันเมนูของร้าน (Snapshot เดิมจะหมดอายุไปเอง)"""
+    cache.set(_version_key(restaurant_id), _new_version(), None)
+
+
+def build_menu_snapshot(restaurant_id):
+    """สร้าง Snapshot จาก DB (2 Query: หมวดหมู่ + เมนูที่เปิดขาย)"""
+    items_prefetch = Prefetch('items', queryset=MenuItem.objects.filter(is_available=True).order_by('id'))
+    categories = Category.objects.filter(restaurant_id=restaurant_id).prefetch_related(items_prefetch)
+
+    snapshot = {'categories': [], 'items': {}}
+    for category in categories:
+        items = []
+        for item in category.items.all():
+            data = {
+                'id': item.id,
+                'name': item.name,
+                'description': item.description,
+                'price': item.price,
+                'image_url': item.image.url if item.image else '',
+                'category_id': category.id,
+            }
+            items.append(data)
+            snapshot['items'][item.id] = data
+
+        # แสดงเฉพาะหมวดที่มีเมนูเปิดขายอยู่
+        if items:
+            snapshot['categories'].append({'id': category.id, 'name': category.name, 'items': items})
+    return snapshot
+
+
+async def aget_menu_snapshot(restaurant_id):
+    """อ่าน Snapshot เวอร์ชันปัจจุบัน ถ้ายังไม่มีค่อยสร้างจาก DB แล้วเก็บลง cache"""
+    version = await cache.aget(_version_key(restaurant_id))
+    if version is None:
+        version = _new_version()
+        # add: ถ้ามี worker อื่นตั้งเวอร์ชันไปพร้อมกัน ให้ใช้ของเขา
+        if not await cache.aadd(_version_key(restaurant_id), version, None):
+            version = await cache.aget(_version_key(restaurant_id), version)
+
+    key = _snapshot_key(restaurant_id, version)
+    snapshot = await cache.aget(key)
+    record_cache(hits=snapshot is not None, misses=snapshot is None)
+    if snapshot is None:
+        snapshot = await sync_to_async(build_menu_snapshot)(restaurant_id)
+        await cache.aset(key, snapshot, _ttl())
+    return snapshot
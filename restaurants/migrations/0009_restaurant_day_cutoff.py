@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 12:10
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0008_alter_menuitem_image_alter_restaurant_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='day_cutoff',
+            field=models.TimeField(default=datetime.time(0, 0), verbose_name='เวลาตัดรอบวันขาย'),
+        ),
+    ]
@@ -1,10 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings # เพื่ออ้างอิง User model
 from django.utils.text import slugify
 from django.core.validators import FileExtensionValidator
+from django.urls import reverse
+from django.utils import timezone
+import datetime
 import uuid
-import segno
 from utils import compress_image
+from . import qr
 
 class Restaurant(models.Model):
     # เชื่อมกับ User: ถ้า User ถูกลบ ร้านหายไปด้วย (CASCADE)
@@ -29,6 +32,9 @@ class Restaurant(models.Model):
 
     vat_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0.00, verbose_name="VAT %")
     service_charge_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0.00, verbose_name="Service Charge %")
+
+    # เวลาตัดรอบ "วันขาย" เช่น ร้านที่เปิดถึงตี 4 ตั้งเป็น 04:00 ออเดอร์ก่อนตี 4 จะนับเป็นยอดของเมื่อวาน
+    day_cutoff = models.TimeField(default=datetime.time(0, 0), verbose_name="เวลาตัดรอบวันขาย")
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -69,6 +75,13 @@ class Restaurant(models.Model):
             
         super().save(*args, **kwargs)
 
+    def business_date(self, when=None):
+        """วันขาย (Business Date) ของเวลา when ตามเวลาท้องถิ่นและเวลาตัดรอบของร้าน (ไม่ใส่ = ตอนนี้)"""
+        local = timezone.localtime(when)
+        if local.time() < self.day_cutoff:
+            return local.date() - datetime.timedelta(days=1)
+        return local.date()
+
     def __str__(self):
         return self.name
     
@@ -79,8 +92,7 @@ class Table(models.Model):
     name = models.CharField(max_length=50, verbose_name="ชื่อโต๊ะ") # เช่น T1, A1, VIP
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True) # รหัสลับสำหรับ QR Code
     
-    # เก็บรูป QR Code (เผื่ออยาก cache ไว้ แต่จริงๆ Gen สดก็ได้)
-    # ในที่นี้เราจะ Gen สดตอนเรียกใช้เพื่อประหยัดพื้นที่ DB
+    # รูป QR Code ไม่เก็บใน DB: Gen ตอนถูกเรียกครั้งแรกแล้วเก็บใน cache (ดู restaurants/qr.py)
     
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -97,18 +109,22 @@ class Table(models.Model):
         domain = domain.rstrip('/')
         return f"{domain}/dining/{self.restaurant.slug}/{self.uuid}/"
 
-    def get_qr_image(self):
-        # สร้าง QR Code แบบ Base64 เพื่อเอาไปแสดงใน HTML ได้เลย โดยไม่ต้องบันทึกไฟล์
-        qr = segno.make_qr(self.get_order_url())
-        
-        # คืนค่าเป็น Data URI scheme (ใช้ใส่ใน tag <img src="..."> ได้เลย)
-        return qr.png_data_uri(scale=10)
+    def get_qr_url(self, fmt='png'):
+        # URL รูป QR (ต่อท้ายด้วย digest ของลิงก์ ถ้าลิงก์เปลี่ยน URL รูปก็เปลี่ยน browser จึง cache ได้ยาวๆ)
+        return f"{reverse('table_qr', args=[self.uuid, fmt])}?v={qr.qr_digest(self.get_order_url())[:12]}"
     
     # for kill link
     def refresh_uuid(self):
         """เปลี่ยนรหัส UUID ใหม่ เพื่อให้ Link เก่าใช้งานไม่ได้"""
+        from . import table_cache  # table_cache import models (กัน import วน)
+
+        old_order_url, old_uuid = self.get_order_url(), self.uuid
         self.uuid = uuid.uuid4()
         self.save()
+        # รูป QR ของลิงก์เก่าไม่ควรถูกเสิร์ฟอีก
+        qr.invalidate(old_order_url)
+        # ลูกค้าที่ยังถือลิงก์เก่าต้องสั่งไม่ได้ทันที (รอ commit ก่อน กัน request อื่นเก็บค่าเก่ากลับเข้า cache)
+        transaction.on_commit(lambda: table_cache.invalidate(old_uuid))
     
 
 
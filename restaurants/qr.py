@@ -0,0 +1,125 @@
+# restaurants/qr.py
+# สร้างรูป QR Code ของโต๊ะ (PNG / SVG) แบบ Lazy แล้วเก็บไว้ใน cache alias 'qr' (ค่าเริ่มต้นเป็นไฟล์บนดิสก์)
+# - คีย์ผูกกับ digest ของลิงก์สั่งอาหาร: ลิงก์เดิม = รูปเดิมเสมอ ใช้เป็น ETag ได้ตรงๆ
+# - refresh_uuid() เปลี่ยนลิงก์ -> ลบรูปของลิงก์เก่าทิ้ง (ดู invalidate)
+# - ใบพิมพ์ QR หลายโต๊ะ (astream_sheet) ใช้รูป SVG ชุดเดียวกันนี้ สตรีมออกไปทีละหน้า
+import hashlib
+import io
+
+import segno
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from users.instrumentation import record_cache
+
+# ขนาดเดียวกับที่หน้าจัดการโต๊ะเคยใช้ (png_data_uri(scale=10))
+PNG_SCALE = 10
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+# จำนวน QR ต่อหน้า A4 -> (คอลัมน์, แถว)
+SHEET_LAYOUTS = {
+    1: (1, 1),
+    2: (1, 2),
+    4: (2, 2),
+    6: (2, 3),
+    8: (2, 4),
+    12: (3, 4),
+}
+DEFAULT_PER_PAGE = 6
+
+
+def _cache():
+    return caches['qr'] if 'qr' in settings.CACHES else caches['default']
+
+
+def _ttl():
+    return getattr(settings, 'QR_CACHE_TTL', 60 * 60 * 24 * 30)
+
+
+def qr_digest(order_url):
+    """digest ของลิงก์ (ไม่ต้อง render รูป) ใช้ทั้งเป็นคีย์ cache และ ETag"""
+    return hashlib.sha256(order_url.encode()).hexdigest()[:32]
+
+
+def _cache_key(digest, fmt):
+    return f'qr:{fmt}:{digest}'
+
+
+def render_qr(order_url, fmt):
+    """Render รูป QR จริง (ช้า) - ปกติให้เรียกผ่าน get_qr_bytes"""
+    qr = segno.make_qr(order_url)
+    buffer = io.BytesIO()
+    if fmt == 'png':
+        qr.save(buffer, kind='png', scale=PNG_SCALE)
+    else:
+        # ไม่ใส่ XML declaration และใช้ viewBox แทน width/height
+        # เพื่อให้ฝังลงใน HTML แล้วย่อ/ขยายตามช่องได้ (ใบพิมพ์ QR ใช้แบบนี้) ยังเปิดเป็นไฟล์เดี่ยวได้ปกติ
+        qr.save(buffer, kind='svg', xmldecl=False, omitsize=True)
+    return buffer.getvalue()
+
+
+def get_qr_bytes(order_url, fmt):
+    """คืนค่า (bytes, digest) ดึงจาก cache ก่อน ถ้าไม่มีค่อย render แล้วเก็บไว้"""
+    digest = qr_digest(order_url)
+    key = _cache_key(digest, fmt)
+    cache = _cache()
+
+    data = cache.get(key)
+    record_cache(hits=data is not None, misses=data is None)
+    if data is None:
+        data = render_qr(order_url, fmt)
+        cache.set(key, data, _ttl())
+    return data, digest
+
+
+async def aget_qr_bytes(order_url, fmt):
+    """get_qr_bytes แบบ async (ใช้ตอนสตรีมใบพิมพ์ QR)"""
+    digest = qr_digest(order_url)
+    key = _cache_key(digest, fmt)
+    cache = _cache()
+
+    data = await cache.aget(key)
+    record_cache(hits=data is not None, misses=data is None)
+    if data is None:
+        # render เป็นงาน CPU ล้วน ให้ไปทำใน Thread แยก ไม่ขวาง event loop
+        data = await sync_to_async(render_qr, thread_sensitive=False)(order_url, fmt)
+        await cache.aset(key, data, _ttl())
+    return data, digest
+
+
+def invalidate(order_url):
+    """ลบรูปทุก format ของลิงก์นี้ (เรียกตอนลิงก์โต๊ะถูกเปลี่ยน)"""
+    digest = qr_digest(order_url)
+    _cache().delete_many([_cache_key(digest, fmt) for fmt in CONTENT_TYPES])
+
+
+async def astream_sheet(restaurant, tables, per_page=DEFAULT_PER_PAGE):
+    """สตรีมใบพิมพ์ QR (HTML) ทีละหน้า: ในหน่วยความจำมีแค่โต๊ะของหน้าปัจจุบัน ไม่ว่าร้านจะมีกี่โต๊ะ
+
+    tables ต้องเป็น QuerySet ของโต๊ะในร้านนี้ (อ่านด้วย aiterator ทีละชุด)
+    """
+    cols, rows = SHEET_LAYOUTS[per_page]
+    yield render_to_string('restaurants/partials/qr_sheet_start.html', {
+        'restaurant': restaurant, 'cols': cols, 'rows': rows,
+    })
+
+    cells = []
+    count = 0
+    async for table in tables.aiterator(chunk_size=200):
+        svg, _ = await aget_qr_bytes(table.get_order_url(), 'svg')
+        cells.append({'name': table.name, 'svg': mark_safe(svg.decode())})
+        count += 1
+        if len(cells) == per_page:
+            yield render_to_string('restaurants/partials/qr_sheet_page.html', {'restaurant': restaurant, 'cells': cells})
+            cells = []
+
+    if cells:
+        yield render_to_string('restaurants/partials/qr_sheet_page.html', {'restaurant': restaurant, 'cells': cells})
+    yield render_to_string('restaurants/partials/qr_sheet_end.html', {'empty': count == 0})
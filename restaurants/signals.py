@@ -0,0 +1,40 @@
+# restaurants/signals.py
+# ล้างแคชที่เกี่ยวกับเมนู / โต๊ะ เมื่อเจ้าของร้านแก้ไขข้อมูล (ผูกไว้ใน RestaurantsConfig.ready)
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import table_cache
+from .models import Category, MenuItem, Restaurant, Table
+from .menu_cache import bump_menu_version
+
+
+def _bump_after_commit(restaurant_id):
+    # รอให้ commit ก่อนค่อยเปลี่ยนเวอร์ชัน ไม่งั้นอาจมี request อื่นสร้าง Snapshot ใหม่จากข้อมูลเก่า
+    transaction.on_commit(lambda: bump_menu_version(restaurant_id))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    _bump_after_commit(instance.restaurant_id)
+
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def menu_item_changed(sender, instance, **kwargs):
+    restaurant_id = Category.objects.filter(pk=instance.category_id).values_list('restaurant_id', flat=True).first()
+    # ถ้าหมวดหมู่ถูกลบไปพร้อมกัน (Cascade) signal ของ Category จะเปลี่ยนเวอร์ชันให้เอง
+    if restaurant_id is not None:
+        _bump_after_commit(restaurant_id)
+
+
+# Cache UUID โต๊ะ (table_cache.py): ชื่อโต๊ะเปลี่ยน / ลบโต๊ะ
+@receiver([post_save, post_delete], sender=Table)
+def table_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: table_cache.invalidate(instance.uuid))
+
+
+# ข้อมูลร้านที่อยู่ใน cache โต๊ะ (ชื่อ / slug / is_active / เวลาตัดรอบ) เช่นตอน toggle_restaurant_active
+@receiver(post_save, sender=Restaurant)
+def restaurant_changed(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: table_cache.invalidate_restaurant(instance.id))
@@ -0,0 +1,114 @@
+# restaurants/table_cache.py
+# แปลง UUID โต๊ะ (จาก QR) -> ข้อมูลโต๊ะ + ร้าน ที่ API ฝั่งลูกค้าต้องใช้ เก็บใน Django cache
+# ลูกค้าทุกโต๊ะยิง create / history / หน้าเมนู ด้วย UUID ตลอดเวลา จึงไม่ต้อง Query โต๊ะ + ร้าน ทุกครั้ง
+# - UUID ที่ไม่มีในระบบ (ลิงก์เก่า / สุ่มยิง) ถูกจำไว้ด้วย (Negative cache) แต่อายุสั้นกว่า
+# - ล้างเมื่อ: refresh_uuid() (UUID เก่า), แก้/ลบโต๊ะ, แก้ร้าน (รวม toggle_restaurant_active) ดู signals.py
+# - คีย์ผูกกับเวอร์ชันของ UUID แบบเดียวกับ menu_cache: ล้าง = เปลี่ยนเวอร์ชัน ไม่ใช่ลบคีย์
+#   Request ที่อ่าน DB ไปก่อนถูกล้างแล้วค่อย set จะเขียนลงเวอร์ชันเก่าที่ไม่มีใครอ่านแล้ว (ไม่ค้างค่าเก่า)
+# - ต้องเป็น cache ที่ทุก worker ใช้ร่วมกัน (settings บังคับ CACHE_URL เมื่อไม่ใช่ DEBUG)
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from users.instrumentation import record_cache
+
+from .models import Restaurant, Table
+
+MISSING = 'missing'
+
+
+def _ttl():
+    return getattr(settings, 'TABLE_CACHE_TTL', 60 * 60 * 6)
+
+
+def _missing_ttl():
+    return getattr(settings, 'TABLE_CACHE_MISSING_TTL', 60)
+
+
+def _version_key(table_uuid):
+    return f'table_uuid_version:{table_uuid}'
+
+
+def _key(table_uuid, version):
+    return f'table_uuid:{table_uuid}:v{version}'
+
+
+def _new_version():
+    # เวลาเป็นเลขเวอร์ชัน: คีย์เวอร์ชันหมดอายุแล้วจะไม่วนกลับไปเจอค่าเก่า (ดู menu_cache)
+    return time.time_ns()
+
+
+def _parse(table_uuid):
+    try:
+        return uuid.UUID(str(table_uuid))
+    except ValueError:
+        return None
+
+
+def _entry(table):
+    restaurant = table.restaurant
+    return {
+        'table_id': table.id,
+        'table_name': table.name,
+        'restaurant_id': restaurant.id,
+        'restaurant_name': restaurant.name,
+        'slug': restaurant.slug,
+        'is_active': restaurant.is_active,
+        'day_cutoff': restaurant.day_cutoff,
+        'service_charge_percent': restaurant.service_charge_percent,
+        'vat_percent': restaurant.vat_percent,
+    }
+
+
+async def aresolve(table_uuid):
+    """ข้อมูลโต๊ะของ UUID นี้ (dict ตาม _entry) คืน None ถ้าไม่มีโต๊ะนี้ (หรือ UUID ผิดรูปแบบ)"""
+    parsed = _parse(table_uuid)
+    if parsed is None:
+        return None
+
+    # อ่านเวอร์ชันก่อน Query: ถ้าระหว่างนั้นโต๊ะถูกล้าง ค่าที่ set จะอยู่ใต้เวอร์ชันเก่า
+    version = await cache.aget(_version_key(parsed))
+    if version is None:
+        version = _new_version()
+        if not await cache.aadd(_version_key(parsed), version, _ttl()):
+            version = await cache.aget(_version_key(parsed), version)
+
+    key = _key(parsed, version)
+    entry = await cache.aget(key)
+    record_cache(hits=entry is not None, misses=entry is None)
+    if entry is None:
+        try:
+            table = await Table.objects.select_related('restaurant').aget(uuid=parsed)
+        except Table.DoesNotExist:
+            await cache.aset(key, MISSING, _missing_ttl())
+            return None
+        entry = _entry(table)
+        await cache.aset(key, entry, _ttl())
+    return None if entry == MISSING else entry
+
+
+def build(entry, table_uuid):
+    """สร้าง (table, restaurant) จากข้อมูลใน cache (มีเฉพาะ field ใน _entry ห้ามใช้ field อื่น / save())"""
+    restaurant = Restaurant(
+        id=entry['restaurant_id'],
+        name=entry['restaurant_name'],
+        slug=entry['slug'],
+        is_active=entry['is_active'],
+        day_cutoff=entry['day_cutoff'],
+        service_charge_percent=entry['service_charge_percent'],
+        vat_percent=entry['vat_percent'],
+    )
+    table = Table(id=entry['table_id'], name=entry['table_name'], uuid=_parse(table_uuid), restaurant=restaurant)
+    return table, restaurant
+
+
+def invalidate(*table_uuids):
+    version = _new_version()
+    cache.set_many({_version_key(table_uuid): version for table_uuid in table_uuids}, _ttl())
+
+
+def invalidate_restaurant(restaurant_id):
+    """ล้างทุกโต๊ะของร้าน (ข้อมูลร้านใน cache เช่น is_active / ชื่อ / slug เปลี่ยน)"""
+    invalidate(*Table.objects.filter(restaurant_id=restaurant_id).values_list('uuid', flat=True))
@@ -0,0 +1,15 @@
+# restaurants/tenant.py
+# ร้านของผู้ใช้ที่ Login อยู่ (Tenant)
+# ร้านถูกโหลดมาพร้อม User ตั้งแต่ตอนดึง User จาก session (users/backends.py) แล้วเก็บติดอยู่กับ request.user
+# decorator / view อ่านจากตรงนี้ได้กี่ครั้งก็ไม่ยิง Query เพิ่ม รวมถึงสถานะ is_active (มาจากแถวเดียวกัน ค่าล่าสุดเสมอ)
+from django.core.exceptions import ObjectDoesNotExist
+
+
+def get_restaurant(user):
+    """ร้านของ user คืน None ถ้ายังไม่ Login หรือยังไม่มีร้าน"""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.restaurant
+    except ObjectDoesNotExist:
+        return None
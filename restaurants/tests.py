@@ -1,3 +1,736 @@
+import random
+import uuid
+from decimal import ROUND_HALF_UP, Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.core.cache import cache, caches
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders import billing, rollups, table_sessions
+from orders.models import Order, OrderItem
+from users.models import User
+from . import checks, floor, kitchen, qr, table_cache
+from .benchmark import seed_restaurant, seed_orders
+from .menu_cache import aget_menu_snapshot
+from .models import Restaurant, Table, Category, MenuItem
+
+
+class MenuSnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(username='owner', email='owner@example.com', password='x')
+        cls.restaurant = Restaurant.objects.create(owner=owner, name='Test Shop', slug='test-shop')
+        cls.table = Table.objects.create(restaurant=cls.restaurant, name='T1')
+        cls.category = Category.objects.create(restaurant=cls.restaurant, name='Main')
+        cls.empty_category = Category.objects.create(restaurant=cls.restaurant, name='Empty')
+        cls.item = MenuItem.objects.create(category=cls.category, name='Rice', price=40)
+        cls.hidden = MenuItem.objects.create(category=cls.category, name='Soup', price=60, is_available=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_snapshot(self):
+        return async_to_sync(aget_menu_snapshot)(self.restaurant.id)
+
+    def test_snapshot_contains_only_available_items(self):
+        snapshot = self.get_snapshot()
+
+        self.assertEqual([c['name'] for c in snapshot['categories']], ['Main'])
+        self.assertEqual(list(snapshot['items']), [self.item.id])
+        self.assertEqual(snapshot['items'][self.item.id]['price'], 40)
+
+    def test_snapshot_is_built_once_per_version(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.get_snapshot()
+        with CaptureQueriesContext(connection) as warm:
+            self.get_snapshot()
+
+        self.assertEqual(len(cold), 2)
+        self.assertEqual(len(warm), 0)
+
+    def test_menu_changes_bump_version(self):
+        self.get_snapshot()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.name = 'Fried Rice'
+            self.item.save()
+        self.assertEqual(self.get_snapshot()['items'][self.item.id]['name'], 'Fried Rice')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hidden.delete()
+            self.category.delete()
+        self.assertEqual(self.get_snapshot(), {'categories': [], 'items': {}})
+
+    def test_menu_page_renders_from_snapshot(self):
+        url = reverse('dining_menu', args=[self.restaurant.slug, self.table.uuid])
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+
+        self.assertContains(response, 'Rice')
+        self.assertNotContains(response, 'Soup')
+        self.assertFalse(any('restaurants_menuitem' in q['sql'] for q in ctx.captured_queries))
+
+    def test_deploy_check_warns_about_per_process_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}
+
+        with self.settings(CACHES=locmem):
+            self.assertEqual([w.id for w in checks.check_shared_cache(None)], ['restaurants.W001'])
+        with self.settings(CACHES=redis):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class TableQrTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='owner', email='owner@example.com', password='x',
+            approval_status='APPROVED', is_shop_owner=True,
+        )
+        cls.restaurant = Restaurant.objects.create(owner=cls.owner, name='Test Shop', slug='test-shop')
+        cls.table = Table.objects.create(restaurant=cls.restaurant, name='T1')
+
+        other_owner = User.objects.create_user(username='other', email='other@example.com', password='x')
+        other_restaurant = Restaurant.objects.create(owner=other_owner, name='Other Shop')
+        cls.foreign_table = Table.objects.create(restaurant=other_restaurant, name='T1')
+
+    def setUp(self):
+        caches['qr'].clear()
+        self.client.force_login(self.owner)
+
+    def test_serves_png_and_svg_with_long_lived_cache_headers(self):
+        png = self.client.get(reverse('table_qr', args=[self.table.uuid, 'png']))
+        svg = self.client.get(reverse('table_qr', args=[self.table.uuid, 'svg']))
+
+        self.assertEqual(png['Content-Type'], 'image/png')
+        self.assertTrue(png.content.startswith(b'\x89PNG'))
+        self.assertEqual(svg['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', svg.content)
+        self.assertIn('immutable', png['Cache-Control'])
+        self.assertNotEqual(png['ETag'], svg['ETag'])
+
+    def test_matching_etag_returns_not_modified(self):
+        url = reverse('table_qr', args=[self.table.uuid, 'png'])
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_renders_once_and_invalidates_on_refresh_uuid(self):
+        url = reverse('table_qr', args=[self.table.uuid, 'png'])
+        with mock.patch('restaurants.qr.render_qr', wraps=qr.render_qr) as render:
+            self.client.get(url)
+            self.client.get(url)
+            self.assertEqual(render.call_count, 1)
+
+        old_key = qr._cache_key(qr.qr_digest(self.table.get_order_url()), 'png')
+        self.assertIsNotNone(caches['qr'].get(old_key))
+
+        self.table.refresh_uuid()
+
+        self.assertIsNone(caches['qr'].get(old_key))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_other_restaurants_tables_are_not_served(self):
+        response = self.client.get(reverse('table_qr', args=[self.foreign_table.uuid, 'png']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_format_is_not_found(self):
+        response = self.client.get(reverse('table_qr', args=[self.table.uuid, 'gif']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_table_list_links_images_instead_of_inlining(self):
+        response = self.client.get(reverse('table_list'))
+
+        self.assertContains(response, self.table.get_qr_url(), count=2)
+        self.assertNotContains(response, 'data:image/png;base64')
+
+    async def test_qr_sheet_streams_pages_of_cached_svgs(self):
+        await self.async_client.aforce_login(self.owner)
+        await Table.objects.abulk_create([Table(restaurant=self.restaurant, name=f'T{i}') for i in range(2, 9)])
+
+        with mock.patch('restaurants.qr.render_qr', wraps=qr.render_qr) as render:
+            response = await self.async_client.get(reverse('table_qr_sheet'), {'per_page': 4})
+            chunks = [chunk async for chunk in response.streaming_content]
+        html = b''.join(chunks).decode()
+
+        # 8 โต๊ะ หน้าละ 4 = 2 หน้า, ส่วนหัว/ท้ายแยกเป็นอีก 2 chunk
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(html.count('class="sheet"'), 2)
+        self.assertEqual(html.count('<svg'), 8)
+        self.assertEqual(render.call_count, 8)
+        self.assertNotIn('Other Shop', html)
+
+        # โต๊ะที่ render แล้วใช้รูปจาก cache (endpoint รูปเดี่ยวก็ใช้ชุดเดียวกัน)
+        with mock.patch('restaurants.qr.render_qr', wraps=qr.render_qr) as render:
+            response = await self.async_client.get(
+                reverse('table_qr_sheet'), {'tables': [self.table.id, self.foreign_table.id]}
+            )
+            html = b''.join([chunk async for chunk in response.streaming_content]).decode()
+            svg = await self.async_client.get(reverse('table_qr', args=[self.table.uuid, 'svg']))
+        self.assertEqual(render.call_count, 0)
+        self.assertEqual(html.count('<svg'), 1)
+        self.assertIn(svg.content.decode(), html)
+
+
+class TableUuidCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = seed_restaurant(tables=1, categories=1, items_per_category=1)
+        cls.table = cls.restaurant.tables.first()
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+
+    def setUp(self):
+        cache.clear()
+
+    def resolve(self, table_uuid):
+        return async_to_sync(table_cache.aresolve)(table_uuid)
+
+    def history(self, table_uuid):
+        return self.client.get(reverse('get_table_order_history'), {'table_uuid': str(table_uuid)})
+
+    def test_resolves_without_db_once_cached(self):
+        self.resolve(self.table.uuid)
+        with CaptureQueriesContext(connection) as ctx:
+            entry = self.resolve(self.table.uuid)
+
+        self.assertEqual(len(ctx), 0)
+        self.assertEqual((entry['table_id'], entry['slug']), (self.table.id, self.restaurant.slug))
+
+    def test_unknown_uuid_is_negatively_cached(self):
+        unknown = uuid.uuid4()
+        self.assertIsNone(self.resolve(unknown))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertIsNone(self.resolve(unknown))
+            self.assertIsNone(self.resolve('not-a-uuid'))
+        self.assertEqual(len(ctx), 0)
+
+    def test_refresh_uuid_invalidates_old_link(self):
+        old_uuid = self.table.uuid
+        self.assertEqual(self.history(old_uuid).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table.refresh_uuid()
+
+        self.assertEqual(self.history(old_uuid).status_code, 404)
+        self.assertEqual(self.history(self.table.uuid).status_code, 200)
+
+    def test_toggle_restaurant_active_invalidates_tables(self):
+        url = reverse('dining_menu', args=[self.restaurant.slug, self.table.uuid])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('toggle_restaurant_active', args=[self.restaurant.id]))
+        self.client.logout()
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_deleted_table_is_not_resolved(self):
+        self.resolve(self.table.uuid)
+        with self.captureOnCommitCallbacks(execute=True):
+            Table.objects.get(pk=self.table.pk).delete()
+        self.assertIsNone(self.resolve(self.table.uuid))
+
+    def test_invalidation_during_db_read_does_not_leave_stale_entry(self):
+        entry = table_cache._entry
+
+        def stale_entry(table):
+            # Request นี้อ่าน DB ไปแล้ว แต่โต๊ะถูกล้าง (เช่นปิดร้าน) ก่อนที่จะได้ set
+            table_cache.invalidate(self.table.uuid)
+            return entry(table)
+
+        with mock.patch('restaurants.table_cache._entry', side_effect=stale_entry):
+            self.assertTrue(self.resolve(self.table.uuid)['is_active'])
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(is_active=False)
+
+        self.assertFalse(self.resolve(self.table.uuid)['is_active'])
+
+
+class CashierFloorStateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='owner', email='owner@example.com', password='x',
+            approval_status='APPROVED', is_shop_owner=True,
+        )
+        cls.restaurant = Restaurant.objects.create(owner=cls.owner, name='Test Shop', slug='test-shop')
+        cls.table = Table.objects.create(restaurant=cls.restaurant, name='A1')
+        cls.idle_table = Table.objects.create(restaurant=cls.restaurant, name='A2')
+        Order.objects.create(restaurant=cls.restaurant, table=cls.table, total_price=100)
+        Order.objects.create(restaurant=cls.restaurant, table=cls.table, total_price=50, status='SERVED')
+        Order.objects.create(restaurant=cls.restaurant, table=cls.table, total_price=70, status='CANCELLED')
+        Order.objects.create(restaurant=cls.restaurant, table=cls.idle_table, total_price=80, is_paid=True)
+        table_sessions.rebuild([cls.restaurant.id])
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def test_floor_state_summarises_open_orders_per_table(self):
+        response = self.client.get(reverse('cashier_floor_state_api'))
+        tables = {t['name']: t for t in response.json()['tables']}
+
+        self.assertEqual(tables['A1']['order_count'], 2)
+        self.assertEqual(tables['A1']['pending_amount'], 150)
+        self.assertTrue(tables['A1']['has_active_order'])
+        self.assertIsNotNone(tables['A1']['oldest_order_age_seconds'])
+        self.assertFalse(tables['A2']['has_active_order'])
+        self.assertEqual(tables['A2']['pending_amount'], 0)
+        self.assertIsNone(tables['A2']['oldest_order_at'])
+
+    def test_query_count_does_not_grow_with_tables(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('cashier_dashboard'))
+
+        tables = Table.objects.bulk_create([Table(restaurant=self.restaurant, name=f'B{i}') for i in range(20)])
+        Order.objects.bulk_create([Order(restaurant=self.restaurant, table=t, total_price=10, business_date=self.restaurant.business_date()) for t in tables])
+        table_sessions.rebuild([self.restaurant.id])
+
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('cashier_dashboard'))
+        with CaptureQueriesContext(connection) as api:
+            self.client.get(reverse('cashier_floor_state_api'))
+
+        self.assertContains(response, ' data-table-id="', count=22)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(api), len(many))
+
+
+def _reference_bill_items(table):
+    """การรวมบรรทัดแบบเดิม (วนทุกออเดอร์ / ทุกรายการใน Python) ไว้เทียบกับ billing.bill_lines"""
+    aggregated_items = {}
+    orders = table.orders.filter(is_paid=False).exclude(status='CANCELLED').order_by('created_at')
+    for order in orders:
+        for item in order.items.select_related('menu_item').all():
+            item_total = item.price * item.quantity
+            key = (item.menu_item.id, item.price)
+            if key in aggregated_items:
+                aggregated_items[key]['quantity'] += item.quantity
+                aggregated_items[key]['total'] += item_total
+                aggregated_items[key]['id'] = item.id
+                aggregated_items[key]['status'] = order.status
+                aggregated_items[key]['order_time'] = order.created_at
+            else:
+                aggregated_items[key] = {
+                    'id': item.id,
+                    'menu_name': item.menu_item.name,
+                    'quantity': item.quantity,
+                    'price': item.price,
+                    'total': item_total,
+                    'order_time': order.created_at,
+                    'status': order.status,
+                }
+    return list(aggregated_items.values())
+
+
+class BillLinesTests(TestCase):
+    STATUSES = ['PENDING', 'COOKING', 'SERVED', 'COMPLETED', 'CANCELLED']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = seed_restaurant(tables=0, categories=1, items_per_category=4)
+        Restaurant.objects.filter(pk=cls.restaurant.pk).update(
+            service_charge_percent=Decimal('10'), vat_percent=Decimal('7'),
+        )
+        cls.menu_items = list(MenuItem.objects.filter(category__restaurant=cls.restaurant))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.restaurant.owner)
+
+    def random_bill(self, rng, name):
+        """โต๊ะใหม่พร้อมออเดอร์สุ่ม (สถานะ / จ่ายแล้ว / ราคาเปลี่ยนกลางมื้อ / เมนูซ้ำในออเดอร์เดียว)"""
+        table = Table.objects.create(restaurant=self.restaurant, name=name)
+        for _ in range(rng.randint(1, 6)):
+            order = Order.objects.create(
+                restaurant=self.restaurant, table=table,
+                status=rng.choice(self.STATUSES), is_paid=rng.random() < 0.2, total_price=0,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    menu_item=menu_item,
+                    name=menu_item.name,
+                    quantity=rng.randint(1, 5),
+                    price=menu_item.price + rng.choice([Decimal('0'), Decimal('0'), Decimal('12.50'), Decimal('0.25')]),
+                )
+                for menu_item in rng.choices(self.menu_items, k=rng.randint(0, 5))
+            ])
+        return table
+
+    def test_matches_python_aggregation_on_random_bills(self):
+        rng = random.Random(20261018)
+        for case in range(40):
+            table = self.random_bill(rng, f'R{case}')
+            expected = _reference_bill_items(table)
+
+            self.assertEqual(billing.bill_lines(table.id), expected, f'case {case}')
+
+            response = self.client.get(reverse('table_bill_detail', args=[table.id]))
+            if not table.orders.filter(is_paid=False).exclude(status='CANCELLED').exists():
+                self.assertRedirects(response, reverse('cashier_dashboard'))
+                continue
+
+            # ปัดแต่ละส่วนเป็นสตางค์ (ROUND_HALF_UP) ยอดสุทธิ = ผลรวมของส่วนที่ปัดแล้ว
+            subtotal = sum((item['total'] for item in expected), Decimal('0.00'))
+            service = (subtotal * Decimal('0.10')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            vat = ((subtotal + service) * Decimal('0.07')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            self.assertEqual(response.context['order_items'], expected, f'case {case}')
+            self.assertEqual(
+                (
+                    response.context['subtotal'], response.context['service_charge_amount'],
+                    response.context['vat_amount'], response.context['grand_total'],
+                ),
+                (subtotal, service, vat, subtotal + service + vat),
+                f'case {case}',
+            )
+
+    def test_diner_history_total_matches_cashier_bill(self):
+        # ออเดอร์ที่สร้างตรงๆ ไม่ผ่าน TableSession: ยอดของลูกค้าต้องยังตรงกับหน้าแคชเชียร์
+        rng = random.Random(7)
+        for case in range(10):
+            table = self.random_bill(rng, f'D{case}')
+            history = self.client.get(reverse('get_table_order_history'), {'table_uuid': str(table.uuid)}).json()
+            bill = self.client.get(reverse('table_bill_detail', args=[table.id])).context
+
+            cashier = (0, 0) if bill is None else (bill['subtotal'], bill['grand_total'])
+            self.assertEqual((history['subtotal'], history['grand_total']), tuple(float(v) for v in cashier), f'case {case}')
+
+    def test_order_without_items_still_opens_bill(self):
+        table = Table.objects.create(restaurant=self.restaurant, name='Empty')
+        Order.objects.create(restaurant=self.restaurant, table=table, status='SERVED', total_price=0)
+
+        response = self.client.get(reverse('table_bill_detail', args=[table.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['order_items'], [])
+
+    def test_compute_totals_rounds_each_component(self):
+        totals = billing.compute_totals([Decimal('33.33'), Decimal('0.02')], Decimal('10'), Decimal('7'))
+
+        # 33.35 -> SVC 3.335 -> 3.34, VAT (36.69 * 7%) 2.5683 -> 2.57
+        self.assertEqual(totals, {
+            'subtotal': Decimal('33.35'),
+            'service_charge': Decimal('3.34'),
+            'vat': Decimal('2.57'),
+            'grand_total': Decimal('39.26'),
+        })
+
+    def test_cached_bill_refreshes_when_orders_change(self):
+        table = Table.objects.create(restaurant=self.restaurant, name='Cache')
+        order = Order.objects.create(restaurant=self.restaurant, table=table, status='SERVED', total_price=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            item = OrderItem.objects.create(order=order, menu_item=self.menu_items[0], quantity=1, price=Decimal('100'))
+        url = reverse('table_bill_detail', args=[table.id])
+        self.assertEqual(self.client.get(url).context['subtotal'], Decimal('100'))
+
+        # เปิดซ้ำโดยไม่มีอะไรเปลี่ยน: ไม่ต้องคำนวณใหม่
+        with mock.patch.object(billing, 'build_bill', wraps=billing.build_bill) as build:
+            self.client.get(url)
+        build.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.quantity = 3
+            item.save()
+        self.assertEqual(self.client.get(url).context['subtotal'], Decimal('300'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('close_bill', args=[table.id]), {'payment_method': 'CASH'})
+        self.assertRedirects(self.client.get(url), reverse('cashier_dashboard'))
+
+
+class KitchenSnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='owner', email='owner@example.com', password='x',
+            approval_status='APPROVED', is_shop_owner=True,
+        )
+        cls.restaurant = Restaurant.objects.create(owner=cls.owner, name='Test Shop', slug='test-shop')
+        cls.table = Table.objects.create(restaurant=cls.restaurant, name='A1')
+        category = Category.objects.create(restaurant=cls.restaurant, name='Main')
+        cls.item = MenuItem.objects.create(category=category, name='Rice', price=40)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def add_order(self, status='PENDING', items=2):
+        order = Order.objects.create(restaurant=self.restaurant, table=self.table, status=status, total_price=40 * items)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menu_item=self.item, name=self.item.name, quantity=1, price=40, note='no chili' if i == 0 else '')
+            for i in range(items)
+        ])
+        return order
+
+    def test_snapshot_lists_open_orders_as_cards(self):
+        first = self.add_order()
+        second = self.add_order(status='COOKING', items=1)
+        self.add_order(status='SERVED')
+
+        cards = self.client.get(reverse('kitchen_snapshot_api')).json()['orders']
+
+        self.assertEqual([c['id'] for c in cards], [first.id, second.id])
+        self.assertEqual(cards[0]['table'], 'A1')
+        self.assertEqual(cards[0]['items'][0], {'name': 'Rice', 'quantity': 1, 'note': 'no chili'})
+
+    def test_snapshot_query_count_does_not_grow_with_orders(self):
+        self.add_order()
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('kitchen_snapshot_api'))
+
+        for _ in range(10):
+            self.add_order(items=3)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(reverse('kitchen_snapshot_api'))
+
+        self.assertEqual(len(few), len(many))
+
+    def test_kitchen_page_embeds_the_same_cards(self):
+        order = self.add_order()
+
+        response = self.client.get(reverse('kitchen_dashboard'))
+
+        self.assertEqual(response.context['cards'], kitchen.open_order_cards(self.restaurant))
+        self.assertContains(response, 'id="kitchen-cards"')
+        self.assertContains(response, f'"id": {order.id}')
+
+    def test_cards_are_cached_until_the_order_changes(self):
+        order = self.add_order()
+        kitchen.open_order_cards(self.restaurant)
+
+        with CaptureQueriesContext(connection) as warm:
+            cards = kitchen.open_order_cards(self.restaurant)
+        self.assertEqual(len(warm), 1)
+        self.assertEqual(cards[0]['status'], 'PENDING')
+
+        order.status = 'COOKING'
+        order.save()
+        self.table.name = 'B7'
+        self.table.save()
+
+        cards = kitchen.open_order_cards(self.restaurant)
+        self.assertEqual(cards[0]['status'], 'COOKING')
+        self.assertEqual(cards[0]['table'], 'B7')
+
+
+def _consume(response):
+    """อ่าน StreamingHttpResponse ให้จบ (Query ที่เกิดระหว่างสตรีมต้องถูกนับด้วย)"""
+    if not response.is_async:
+        return b''.join(response.streaming_content)
+
+    async def read():
+        return b''.join([chunk async for chunk in response.streaming_content])
+    return async_to_sync(read)()
+
+
+class QueryBudgetTestCase(TestCase):
+    """งบจำนวน Query ต่อ Endpoint: วัดที่ร้านมีออเดอร์ 10 แถว แล้วเพิ่มเป็น 1,000 แถว ต้องไม่เกินงบทั้งสองครั้ง
+
+    ถ้า test ไหนพังหลังแก้ View / Template ให้หา N+1 (เช่น order.table.name ในลูป) ก่อนจะขยับงบ
+    """
+    SIZES = (10, 1000)
+    # สัดส่วนออเดอร์ในร้านจำลอง (สถานะ, จ่ายแล้ว, สัดส่วน)
+    ORDER_MIX = [('PENDING', False, 1), ('COOKING', False, 1), ('SERVED', False, 1), ('COMPLETED', True, 6), ('CANCELLED', False, 1)]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = seed_restaurant(tables=10, categories=3, items_per_category=5)
+        cls.owner = cls.restaurant.owner
+        cls.table = cls.restaurant.tables.order_by('id').first()
+        cls.superuser = User.objects.create_superuser(username='root', email='root@example.com', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def grow(self, size):
+        """เพิ่มออเดอร์ (พร้อมรายการอาหาร) ให้ร้านมีครบ size แถว และโต๊ะ size / 10 ตัว แล้วคำนวณ Rollup ใหม่"""
+        tables = self.restaurant.tables.count()
+        Table.objects.bulk_create([
+            Table(restaurant=self.restaurant, name=f'G{i}') for i in range(tables, max(size // 10, tables))
+        ])
+
+        missing = size - self.restaurant.orders.count()
+        total = sum(share for _, _, share in self.ORDER_MIX)
+        for status, is_paid, share in self.ORDER_MIX:
+            count = missing * share // total
+            if count:
+                seed_orders(self.restaurant, count, items_per_order=2, status=status, is_paid=is_paid)
+        rollups.rebuild([self.restaurant.id])
+
+    def assertQueryBudget(self, budget, send, prepare=None, warm=True):
+        """send(*prepare()) ต้องใช้ไม่เกิน budget Query ทั้งตอนข้อมูลน้อยและข้อมูลเยอะ
+
+        warm=True เรียกหนึ่งรอบก่อนวัด (cache / session) ใช้กับ Endpoint ที่เรียกซ้ำได้ (GET)
+        prepare เตรียมข้อมูลเฉพาะรอบ (เช่น รายการที่จะลบ) นอกช่วงที่นับ Query
+        """
+        counts = []
+        for size in self.SIZES:
+            self.grow(size)
+            args = prepare() if prepare else ()
+            if warm:
+                send(*args)
+            with CaptureQueriesContext(connection) as ctx:
+                response = send(*args)
+                if getattr(response, 'streaming', False):
+                    _consume(response)
+            self.assertLess(response.status_code, 400, f'HTTP {response.status_code} at {size} rows')
+            counts.append(len(ctx))
+
+        self.assertLessEqual(
+            max(counts), budget,
+            f'queries at {dict(zip(self.SIZES, counts))} rows exceed budget {budget}:\n'
+            + '\n'.join(q['sql'] for q in ctx.captured_queries),
+        )
+
+
+class RestaurantQueryBudgetTests(QueryBudgetTestCase):
+
+    def get(self, name, *args, **params):
+        return lambda: self.client.get(reverse(name, args=args), params)
+
+    def test_dashboard(self):
+        self.assertQueryBudget(7, self.get('dashboard'))
+
+    def test_create_restaurant_redirects_existing_owner(self):
+        self.assertQueryBudget(2, self.get('create_restaurant'))
+
+    def test_table_list(self):
+        self.assertQueryBudget(3, self.get('table_list'))
+
+    def test_add_table(self):
+        self.assertQueryBudget(3, lambda: self.client.post(reverse('table_list'), {'name': 'New'}), warm=False)
+
+    def test_delete_table(self):
+        self.assertQueryBudget(
+            6, lambda table: self.client.post(reverse('delete_table', args=[table.id])),
+            prepare=lambda: (Table.objects.create(restaurant=self.restaurant, name='Temp'),), warm=False,
+        )
+
+    def test_table_qr(self):
+        self.assertQueryBudget(4, self.get('table_qr', self.table.uuid, 'png'))
+
+    def test_table_qr_sheet(self):
+        self.assertQueryBudget(3, self.get('table_qr_sheet'))
+
+    def test_menu_manage(self):
+        self.assertQueryBudget(4, self.get('menu_manage'))
+
+    def test_add_category_form(self):
+        self.assertQueryBudget(2, self.get('add_category'))
+
+    def test_add_category(self):
+        self.assertQueryBudget(2, lambda: self.client.post(reverse('add_category'), {'name': 'New'}), warm=False)
+
+    def test_add_menu_item_form(self):
+        self.assertQueryBudget(6, self.get('add_menu_item'))
+
+    def test_edit_menu_item_form(self):
+        item = MenuItem.objects.filter(category__restaurant=self.restaurant).first()
+        self.assertQueryBudget(7, self.get('edit_menu_item', item.id))
+
+    def test_delete_menu_item(self):
+        category = self.restaurant.categories.first()
+        self.assertQueryBudget(
+            7, lambda item: self.client.post(reverse('delete_menu_item', args=[item.id])),
+            prepare=lambda: (MenuItem.objects.create(category=category, name='Temp', price=10),), warm=False,
+        )
+
+    def test_edit_category_form(self):
+        self.assertQueryBudget(3, self.get('edit_category', self.restaurant.categories.first().id))
+
+    def test_delete_category(self):
+        self.assertQueryBudget(
+            5, lambda category: self.client.post(reverse('delete_category', args=[category.id])),
+            prepare=lambda: (Category.objects.create(restaurant=self.restaurant, name='Temp'),), warm=False,
+        )
+
+    def test_kitchen_dashboard(self):
+        self.assertQueryBudget(3, self.get('kitchen_dashboard'))
+
+    def test_kitchen_snapshot_api(self):
+        self.assertQueryBudget(3, self.get('kitchen_snapshot_api'))
+
+    def test_cashier_dashboard(self):
+        self.assertQueryBudget(3, self.get('cashier_dashboard'))
+
+    def test_cashier_floor_state_api(self):
+        self.assertQueryBudget(3, self.get('cashier_floor_state_api'))
+
+    def test_table_bill_detail(self):
+        self.assertQueryBudget(3, self.get('table_bill_detail', self.table.id))
+
+    def test_close_bill(self):
+        # บิลรอบที่สองมีเมนูต่างกัน 30 รายการ (รอบแรก 1): Rollup ต้องใช้ Query เท่าเดิม ไม่ว่าบิลจะมีกี่เมนู
+        menu_sizes = iter([1, 30])
+
+        def add_order():
+            category = self.restaurant.categories.first()
+            items = MenuItem.objects.bulk_create([
+                MenuItem(category=category, name=f'Extra {i}', price=10) for i in range(next(menu_sizes))
+            ])
+            order = Order.objects.create(restaurant=self.restaurant, table=self.table, total_price=10 * len(items))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menu_item=item, name=item.name, quantity=1, price=item.price) for item in items
+            ])
+            return ()
+
+        self.assertQueryBudget(
+            25, lambda: self.client.post(reverse('close_bill', args=[self.table.id])), prepare=add_order, warm=False,
+        )
+
+    def test_report_sales(self):
+        self.assertQueryBudget(4, self.get('report_sales'))
+
+    def test_restaurant_settings(self):
+        self.assertQueryBudget(3, self.get('restaurant_settings'))
+
+    def test_customer_display(self):
+        self.assertQueryBudget(4, self.get('customer_display', self.restaurant.slug))
+
+    def test_delete_order_item(self):
+        def open_item():
+            return (OrderItem.objects.filter(order__table=self.table, order__is_paid=False).exclude(order__status='CANCELLED').first(),)
+
+        self.assertQueryBudget(
+            8, lambda item: self.client.post(reverse('delete_order_item', args=[item.id])),
+            prepare=open_item, warm=False,
+        )
+
+    def test_superuser_dashboard(self):
+        self.client.force_login(self.superuser)
+        self.assertQueryBudget(5, self.get('superuser_dashboard'))
+
+    def test_toggle_restaurant_active(self):
+        self.client.force_login(self.superuser)
+        self.assertQueryBudget(4, lambda: self.client.post(reverse('toggle_restaurant_active', args=[self.restaurant.id])), warm=False)
+
+    def test_restaurant_suspended(self):
+        self.assertQueryBudget(2, self.get('restaurant_suspended'))
+
+    def test_analytics_dashboard(self):
+        self.assertQueryBudget(8, self.get('analytics_dashboard'))
+
+    def test_order_history(self):
+        self.assertQueryBudget(4, self.get('order_history'))
 
-# Create your tests here.
+    def test_get_order_details_api(self):
+        self.assertQueryBudget(
+            4, lambda order: self.client.get(reverse('get_order_details_api', args=[order.id])),
+            prepare=lambda: (self.restaurant.orders.last(),),
+        )
@@ -10,6 +10,8 @@ urlpatterns = [
     # จัดการโต๊ะ
     path('tables/', views.table_list, name='table_list'),
     path('tables/delete/<int:table_id>/', views.delete_table, name='delete_table'),
+    path('tables/<uuid:table_uuid>/qr.<str:fmt>', views.table_qr, name='table_qr'),
+    path('tables/qr-sheet/', views.table_qr_sheet, name='table_qr_sheet'),
     # Menu Management
     path('menu/', views.menu_manage, name='menu_manage'),
     path('menu/category/add/', views.add_category, name='add_category'),
@@ -24,8 +26,10 @@ urlpatterns = [
 
     # kitchen
     path('kitchen/', views.kitchen_dashboard, name='kitchen_dashboard'),
+    path('kitchen/snapshot/', views.kitchen_snapshot_api, name='kitchen_snapshot_api'),
     # for cashier
     path('cashier/', views.cashier_dashboard, name='cashier_dashboard'),
+    path('cashier/floor-state/', views.cashier_floor_state_api, name='cashier_floor_state_api'),
     
     path('cashier/<int:table_id>/bill/', views.table_bill_detail, name='table_bill_detail'),
     path('cashier/<int:table_id>/pay/', views.close_bill, name='close_bill'),
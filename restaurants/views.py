@@ -5,25 +5,26 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Table, Category, MenuItem, Restaurant
 from .forms import RestaurantForm, CategoryForm, MenuItemForm, RestaurantSettingsForm, PromoImageFormSet
-from django.db.models import Sum, Count, F
-from django.db.models.functions import TruncDate, TruncHour
-from decimal import Decimal
+from django.db.models import Sum
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from orders.models import OrderItem
+from django.db import transaction
+from orders.models import Order, OrderItem
+from orders import billing, outbox, realtime, rollups, table_sessions
 from django.contrib.auth.decorators import user_passes_test
 from django.views.decorators.http import require_POST
-from .decorators import restaurant_active_required
+from .decorators import restaurant_active_required, api_restaurant_active_required
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from . import floor, kitchen, qr
 
 
 
 @user_passes_test(lambda u: u.is_superuser) # เฉพาะ Superuser เท่านั้น
 def superuser_dashboard(request):
-    restaurants = Restaurant.objects.all().order_by('-created_at')
+    # เจ้าของร้านแสดงทุกแถวในตาราง ดึงมาพร้อมกันใน Query เดียว
+    restaurants = Restaurant.objects.select_related('owner').order_by('-created_at')
     
     context = {
         'restaurants': restaurants,
@@ -62,16 +63,14 @@ def dashboard(request):
         return redirect('create_restaurant')
     
 
-    today = timezone.now().date()
+    # "วันนี้" = วันขายปัจจุบันตามเวลาตัดรอบของร้าน
+    today = restaurant.business_date()
 
-    # 1. ยอดขายวันนี้ (เฉพาะที่จ่ายเงินแล้ว)
-    today_sales = restaurant.orders.filter(
-        created_at__date=today, 
-        is_paid=True
-    ).aggregate(Sum('total_price'))['total_price__sum'] or 0
+    # 1. ยอดขายวันนี้ (เฉพาะที่จ่ายเงินแล้ว) อ่านจาก Rollup รายวัน
+    today_sales = restaurant.daily_sales.filter(date=today).aggregate(Sum('revenue'))['revenue__sum'] or 0
 
     # 2. จำนวนออเดอร์วันนี้
-    today_orders_count = restaurant.orders.filter(created_at__date=today).count()
+    today_orders_count = restaurant.orders.filter(business_date=today).count()
 
     # 3. ออเดอร์ที่รอครัวทำ (Pending/Cooking)
     pending_orders_count = restaurant.orders.filter(
@@ -85,7 +84,7 @@ def dashboard(request):
     ).exclude(orders__status='CANCELLED').distinct().count()
 
     # 5. รายการล่าสุด 5 รายการ (Recent Activity)
-    recent_orders = restaurant.orders.order_by('-created_at')[:5]
+    recent_orders = restaurant.orders.select_related('table').order_by('-created_at')[:5]
 
     context = {
         'restaurant': restaurant,
@@ -151,6 +150,52 @@ def delete_table(request, table_id):
         
     return redirect('table_list')
 
+
+# รูป QR ของโต๊ะ (แทนการฝัง Base64 ลงในหน้า) URL ผูกกับ UUID โต๊ะ
+# รูป Gen ครั้งเดียวแล้วเก็บใน cache ส่วน browser ได้ ETag + Cache-Control ยาว (URL มี ?v=digest อยู่แล้ว)
+@login_required
+@restaurant_active_required
+def table_qr(request, table_uuid, fmt):
+    if fmt not in qr.CONTENT_TYPES:
+        raise Http404
+    restaurant = request.user.restaurant
+    table = get_object_or_404(Table, uuid=table_uuid, restaurant=restaurant)
+    order_url = table.get_order_url()
+
+    # ETag คำนวณจากลิงก์ได้เลย ถ้า browser มีรูปนี้แล้วตอบ 304 โดยไม่ต้องแตะ cache รูป
+    etag = f'"{qr.qr_digest(order_url)}-{fmt}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        data, _ = qr.get_qr_bytes(order_url, fmt)
+        response = HttpResponse(data, content_type=qr.CONTENT_TYPES[fmt])
+
+    response.headers['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
+
+
+# ใบพิมพ์ QR หลายโต๊ะในครั้งเดียว (A4 หน้าละหลายโต๊ะ พร้อมชื่อโต๊ะ)
+# ?per_page=6 จำนวนต่อหน้า, ?tables=1&tables=2 เลือกเฉพาะบางโต๊ะ (ไม่ส่งมา = ทุกโต๊ะ)
+# สตรีมออกไปทีละหน้า ร้านที่มีโต๊ะหลายร้อยตัวก็ไม่ต้องสร้างทั้งเอกสารไว้ในหน่วยความจำ
+@login_required
+@restaurant_active_required
+def table_qr_sheet(request):
+    restaurant = request.user.restaurant
+    tables = restaurant.tables.order_by('name', 'id')
+
+    table_ids = [table_id for table_id in request.GET.getlist('tables') if table_id.isdigit()]
+    if table_ids:
+        tables = tables.filter(id__in=table_ids)
+
+    try:
+        per_page = int(request.GET.get('per_page', qr.DEFAULT_PER_PAGE))
+    except ValueError:
+        per_page = qr.DEFAULT_PER_PAGE
+    if per_page not in qr.SHEET_LAYOUTS:
+        per_page = qr.DEFAULT_PER_PAGE
+
+    return StreamingHttpResponse(qr.astream_sheet(restaurant, tables, per_page), content_type='text/html; charset=utf-8')
+
 # ----------------
 
 
@@ -277,12 +322,22 @@ def delete_category(request, category_id):
 @restaurant_active_required
 def kitchen_dashboard(request):
     restaurant = request.user.restaurant
-    # ดึงออเดอร์ที่ยังทำไม่เสร็จ (Pending/Cooking)
-    orders = restaurant.orders.filter(status__in=['PENDING', 'COOKING']).order_by('created_at')
+    # การ์ดออเดอร์ที่ยังทำไม่เสร็จ (Pending/Cooking) หน้าจอ render จาก JSON ชุดเดียวกับ Delta / Snapshot
+    cards = kitchen.open_order_cards(restaurant)
 
     return render(request, 'restaurants/kitchen_dashboard.html', {
         'restaurant': restaurant,
-        'orders': orders
+        'cards': cards
+    })
+
+
+# Snapshot การ์ดออเดอร์ของจอครัว (จอที่เพิ่งต่อ WebSocket ใหม่ใช้โหลดสถานะล่าสุด แล้วค่อยรับ Delta ต่อ)
+@login_required
+@api_restaurant_active_required
+def kitchen_snapshot_api(request):
+    return JsonResponse({
+        'orders': kitchen.open_order_cards(request.user.restaurant),
+        'generated_at': timezone.now().isoformat(),
     })
 
 
@@ -295,175 +350,125 @@ def kitchen_dashboard(request):
 @restaurant_active_required
 def cashier_dashboard(request):
     restaurant = request.user.restaurant
-    tables = restaurant.tables.all()
-    
-    # ดึงข้อมูลมาแปะใส่ table object ว่าโต๊ะนี้มียอดค้างเท่าไหร่
-    for table in tables:
-        # หาออเดอร์ที่ยังไม่จ่ายเงิน (is_paid=False) และยังไม่ยกเลิก
-        active_orders = table.orders.filter(is_paid=False).exclude(status='CANCELLED')
-        
-        if active_orders.exists():
-            table.has_active_order = True
-            table.pending_amount = active_orders.aggregate(Sum('total_price'))['total_price__sum'] or 0
-            table.order_count = active_orders.count()
-        else:
-            table.has_active_order = False
+    # สถานะบิลของทุกโต๊ะ (มีออเดอร์ค้างไหม / ยอดค้าง / จำนวนออเดอร์ / ออเดอร์เก่าสุด) ใน Query เดียว
+    tables = floor.floor_tables(restaurant)
             
     return render(request, 'restaurants/cashier_dashboard.html', {
         'restaurant': restaurant,
-        'tables': tables
+        'tables': tables,
+        # ข้อมูลชุดเดียวกับ floor-state API ให้ JS ใช้เป็นสถานะตั้งต้นก่อนรับ Delta
+        'floor_tables': [floor.serialize_table(table) for table in tables],
     })
 
 
+# JSON สถานะโต๊ะทั้งร้าน ให้หน้า Cashier อัปเดตเฉพาะการ์ดโต๊ะ ไม่ต้องโหลดทั้งหน้าใหม่
+@login_required
+@api_restaurant_active_required
+def cashier_floor_state_api(request):
+    return JsonResponse(floor.floor_state(request.user.restaurant))
+
+
 @login_required
 @restaurant_active_required
 def table_bill_detail(request, table_id):
     restaurant = request.user.restaurant
     table = get_object_or_404(Table, id=table_id, restaurant=restaurant)
     
-    # 1. ดึงออเดอร์ที่ยังไม่จ่าย (Active Orders)
-    # เราไม่เอาที่ CANCELLED
-    active_orders = table.orders.filter(is_paid=False).exclude(status='CANCELLED').order_by('created_at')
-    
-    if not active_orders.exists():
+    # 1. บิลของโต๊ะ (รวมบรรทัด + SVC + VAT ปัดเศษตามกฎเดียวกันทั้งระบบ ดู orders/billing.py)
+    # อ่านจาก cache ถ้าออเดอร์ของโต๊ะยังไม่เปลี่ยนตั้งแต่ครั้งก่อน
+    bill = billing.table_bill(table.id, restaurant)
+
+    if bill is None:
         messages.warning(request, 'โต๊ะนี้ไม่มีรายการค้างชำระ')
         return redirect('cashier_dashboard')
 
-    # =========================================================
-    # ⭐ 2. รวบรวมและรวมรายการอาหาร (Aggregation Logic) ⭐
-    # =========================================================
-    aggregated_items = {}
-    subtotal = Decimal('0.00')
-    
-    for order in active_orders:
-        for item in order.items.select_related('menu_item').all():
-            # คำนวณยอดเงินของ item นี้
-            item_total = item.price * item.quantity
-            
-            # บวกยอดรวมทันที
-            subtotal += item_total
-            
-            # สร้าง Key สำหรับการรวม (ใช้ ID เมนู และ ราคา)
-            # ถ้าราคาเปลี่ยน ต้องแยกบรรทัด เพื่อความถูกต้องทางบัญชี
-            key = (item.menu_item.id, item.price)
-
-            if key in aggregated_items:
-                # ถ้ามีรายการนี้อยู่แล้ว ให้บวกจำนวนเพิ่ม
-                aggregated_items[key]['quantity'] += item.quantity
-                aggregated_items[key]['total'] += item_total
-                
-                # อัปเดตข้อมูลล่าสุด (เพื่อให้เวลาลบ จะลบตัวล่าสุดก่อน LIFO)
-                aggregated_items[key]['id'] = item.id 
-                aggregated_items[key]['status'] = order.status
-                aggregated_items[key]['order_time'] = order.created_at
-            else:
-                # ถ้ายังไม่มี ให้สร้างใหม่
-                aggregated_items[key] = {
-                    'id': item.id, # ID สำหรับใช้ลบ (Delete Item)
-                    'menu_name': item.menu_item.name,
-                    'quantity': item.quantity,
-                    'price': item.price,
-                    'total': item_total,
-                    'order_time': order.created_at,
-                    'status': order.status
-                }
-
-    # แปลง Dictionary กลับเป็น List เพื่อส่งให้ Template วนลูป
-    order_items = list(aggregated_items.values())
-
-    # 3. คำนวณภาษีและ Service Charge
-    # แปลงค่า Default 0 ให้เป็น Decimal('0') เพื่อไม่ให้กลายเป็น Float
-    service_charge_percent = restaurant.service_charge_percent or Decimal('0')
-    vat_percent = restaurant.vat_percent or Decimal('0')
-    
-    # ใช้ Decimal('100') ในการหาร เพื่อบังคับให้ผลลัพธ์เป็น Decimal เสมอ
-    service_charge_amount = subtotal * (service_charge_percent / Decimal('100'))
-    
-    # รวมยอดก่อน VAT
-    after_service = subtotal + service_charge_amount
-    
-    # คำนวณ VAT
-    vat_amount = after_service * (vat_percent / Decimal('100'))
-    
-    # ยอดสุทธิ
-    grand_total = after_service + vat_amount
-
-    # ⭐ 4. สร้างเลขที่บิล (Bill Number) ⭐
+    # ⭐ 2. สร้างเลขที่บิล (Bill Number) ⭐
     # ใช้ ID ของออเดอร์แรกสุดเป็นเลขที่บิลหลัก
-    # หรือถ้าไม่มีออเดอร์เลย ให้เป็น "-"
-    first_order = active_orders.first() # query set นี้ order_by created_at มาแล้ว
-    
-    if first_order:
-        # แปลงเป็นเวลาท้องถิ่นก่อน (เพื่อให้ได้วันที่ที่ถูกต้องของไทย)
-        local_created_at = timezone.localtime(first_order.created_at)
-        
-        # จัดรูปแบบ: YYYYMMDD-ID (เช่น 20260123-89)
-        date_str = local_created_at.strftime('%Y%m%d')
-        bill_number = f"{date_str}-{first_order.id}"
-    else:
-        bill_number = "-"
+    # แปลงเป็นเวลาท้องถิ่นก่อน (เพื่อให้ได้วันที่ที่ถูกต้องของไทย)
+    local_created_at = timezone.localtime(bill['opened_at'])
+
+    # จัดรูปแบบ: YYYYMMDD-ID (เช่น 20260123-89)
+    date_str = local_created_at.strftime('%Y%m%d')
+    bill_number = f"{date_str}-{bill['first_order_id']}"
 
     context = {
         'restaurant': restaurant,
         'table': table,
-        'order_items': order_items,
-        'subtotal': subtotal,
-        'service_charge_amount': service_charge_amount,
-        'vat_amount': vat_amount,
-        'grand_total': grand_total,
-        'active_orders': active_orders,
+        'order_items': bill['lines'],
+        'subtotal': bill['subtotal'],
+        'service_charge_amount': bill['service_charge'],
+        'vat_amount': bill['vat'],
+        'grand_total': bill['grand_total'],
         'bill_number': bill_number,
     }
     
     return render(request, 'restaurants/bill_detail.html', context)
 
 
+def _open_order_ids(table):
+    """id ของออเดอร์ในบิลที่เปิดอยู่ของโต๊ะ (ล็อกแถวไว้จนจบ Transaction)"""
+    return list(
+        table.orders.filter(is_paid=False).exclude(status='CANCELLED')
+        .select_for_update().values_list('id', flat=True)
+    )
+
+
 @login_required
 @restaurant_active_required
 def close_bill(request, table_id):
     if request.method == 'POST':
         restaurant = request.user.restaurant
-        table = get_object_or_404(Table, id=table_id, restaurant=restaurant)
         
         # 1. ✅ รับค่าวิธีชำระเงินจาก Form (ถ้าไม่ส่งมา ให้ Default เป็น CASH)
         payment_method = request.POST.get('payment_method', 'CASH')
         
-        # ดึงออเดอร์ที่ยังไม่จ่ายทั้งหมดมาปิด
-        active_orders = table.orders.filter(is_paid=False).exclude(status='CANCELLED')
-        
-        if active_orders.exists():
+        # ปิดบิล + รีเซ็ตโต๊ะ + Rollup ยอดขาย + ข้อความ WebSocket ใน Transaction เดียว
+        # (ข้อความลง Outbox ก่อน แล้ว dispatcher ส่งให้หลัง commit ไม่ต้องรอ Redis ระหว่าง request)
+        with transaction.atomic():
+            # ล็อกแถวโต๊ะก่อน: กดปิดบิลโต๊ะเดียวกันพร้อมกัน 2 เครื่อง เครื่องที่สองต้องรอเครื่องแรก commit
+            # แล้วจะเห็นว่าไม่มีออเดอร์ค้าง (Rollup ไม่ถูกบวกซ้ำ)
+            table = get_object_or_404(Table.objects.select_for_update(), id=table_id, restaurant=restaurant)
+            order_ids = _open_order_ids(table)
+
             # 2. ✅ Update ข้อมูลรวมถึง payment_method ทีเดียวทุก Rows (Bulk Update)
-            active_orders.update(
+            # กรอง is_paid=False ซ้ำ: ออเดอร์ที่มีคนปิดไปแล้วจะไม่ถูกนับว่าปิดในรอบนี้
+            closed = Order.objects.filter(id__in=order_ids, is_paid=False).update(
                 is_paid=True, 
                 status='COMPLETED',
                 payment_method=payment_method, # บันทึกว่าจ่ายด้วยอะไร (CASH/QR)
                 updated_at=timezone.now()
-            )
-            
-            # รีเซ็ต UUID โต๊ะ เพื่อให้ Link เก่าใช้ไม่ได้ (ลูกค้าใหม่ต้องสแกนใหม่)
-            table.refresh_uuid()
-            
-            # 3. ส่งสัญญาณ WebSocket
-            channel_layer = get_channel_layer()
-            
-            # 3.1 สั่งให้หน้าจอ Cashier รีเฟรช (เพื่อเอาโต๊ะออกจาก Dashboard)
-            async_to_sync(channel_layer.group_send)(
-                f'restaurant_{table.restaurant.id}',
-                {
-                    'type': 'table_update_notification',
-                    'message': 'Refresh Tables'
-                }
-            )
-            
-            # 3.2 (Optional) สั่งให้หน้าจอลูกค้าปิดหน้าต่างจ่ายเงิน (ถ้าเปิดค้างไว้)
-            async_to_sync(channel_layer.group_send)(
-                f'restaurant_{table.restaurant.id}', 
-                {
-                    'type': 'hide_customer_payment', # ต้องไปดักใน consumers.py ถ้าต้องการ
-                    'command': 'hide_customer_payment'
-                }
-            )
-            
+            ) if order_ids else 0
+
+            if closed and closed != len(order_ids):
+                # ชุดออเดอร์ที่อ่านมาไม่ตรงกับที่ปิดได้จริง (มีอีกเครื่องปิดไปบางส่วน) ยกเลิกทั้งหมด ไม่บวก Rollup
+                transaction.set_rollback(True)
+                closed = 0
+
+            if closed:
+                # บวกยอดบิลนี้เข้า Rollup รายงาน (เฉพาะออเดอร์ที่รอบนี้เปลี่ยนเป็นจ่ายแล้วจริง)
+                rollups.apply_orders(order_ids)
+
+                # ปิด Session ของโต๊ะ (ออเดอร์ถัดไปจะเปิดบิลใหม่)
+                table_sessions.close(table.id)
+
+                # update() ไม่ส่ง signal: เปลี่ยนเวอร์ชันบิลเอง (บิลที่ปิดแล้วต้องไม่ถูกอ่านจาก cache อีก)
+                transaction.on_commit(lambda: billing.bump_bill_version(table.id))
+                
+                # รีเซ็ต UUID โต๊ะ เพื่อให้ Link เก่าใช้ไม่ได้ (ลูกค้าใหม่ต้องสแกนใหม่)
+                table.refresh_uuid()
+                
+                # 3. ส่งสัญญาณ WebSocket
+                outbox.enqueue_many(outbox.restaurant_group(restaurant.id), [
+                    # 3.1 บอกหน้าจอ Cashier / ครัว ว่าโต๊ะนี้ปิดบิลแล้ว (แก้เฉพาะการ์ดโต๊ะนี้)
+                    realtime.table_closed(floor.table_state(table.id)),
+                    # 3.2 (Optional) สั่งให้หน้าจอลูกค้าปิดหน้าต่างจ่ายเงิน (ถ้าเปิดค้างไว้)
+                    {
+                        'type': 'hide_customer_payment', # ต้องไปดักใน consumers.py ถ้าต้องการ
+                        'command': 'hide_customer_payment'
+                    },
+                ])
+        
+        if closed:
             messages.success(request, f'รับชำระเงินโต๊ะ {table.name} เรียบร้อย ({payment_method})')
         
     return redirect('cashier_dashboard')
@@ -476,18 +481,17 @@ def close_bill(request, table_id):
 def report_sales(request):
     restaurant = request.user.restaurant
     
-    # ดึงออเดอร์ที่จ่ายเงินแล้ว (COMPLETED)
-    completed_orders = restaurant.orders.filter(status='COMPLETED', is_paid=True)
-    
-    # 1. ยอดขายวันนี้
-    today = timezone.now().date()
-    today_sales = completed_orders.filter(created_at__date=today).aggregate(Sum('total_price'))['total_price__sum'] or 0
+    # ยอดขายอ่านจาก Rollup รายวัน (ออเดอร์ COMPLETED ที่จ่ายแล้ว) ไม่ต้อง SUM ออเดอร์ดิบ
+    # 1 วันมีหลายแถวตามวิธีชำระเงิน จึงต้องรวมตามวันอีกชั้น
+    sales_by_day = restaurant.daily_sales.values('date') \
+        .annotate(total=Sum('revenue'), count=Sum('order_count'))
+
+    # 1. ยอดขายวันนี้ (วันขายปัจจุบันตามเวลาตัดรอบของร้าน)
+    today = restaurant.business_date()
+    today_sales = next((day['total'] for day in sales_by_day.filter(date=today)), 0)
     
     # 2. ยอดขายย้อนหลัง 7 วัน (Group by Date)
-    daily_sales = completed_orders.annotate(date=TruncDate('created_at')) \
-        .values('date') \
-        .annotate(total=Sum('total_price'), count=Count('id')) \
-        .order_by('-date')[:7] # เอาแค่ 7 วันล่าสุด
+    daily_sales = sales_by_day.order_by('-date')[:7] # เอาแค่ 7 วันล่าสุด
 
     return render(request, 'restaurants/report_sales.html', {
         'restaurant': restaurant,
@@ -556,7 +560,7 @@ def customer_facing_display(request, restaurant_slug):
 @restaurant_active_required
 def delete_order_item(request, item_id):
     item = get_object_or_404(
-        OrderItem,
+        OrderItem.objects.select_related('order', 'menu_item'),
         pk=item_id,
         order__restaurant__owner=request.user
     )
@@ -567,18 +571,27 @@ def delete_order_item(request, item_id):
         item_total = item.price * item.quantity
         menu_name = item.menu_item.name
 
-        # 1. ลบรายการ
-        item.delete()
+        with transaction.atomic():
+            # 1. ลบรายการ
+            item.delete()
 
-        # 2. อัปเดตยอดรวมของ Order
-        order.total_price -= item_total
-        if order.total_price < 0:
-            order.total_price = 0
-        order.save()
+            # 2. อัปเดตยอดรวมของ Order
+            previous_total = order.total_price
+            order.total_price -= item_total
+            if order.total_price < 0:
+                order.total_price = 0
+            order.save()
+
+            # 3. หักออกจากบิลที่เปิดอยู่ของโต๊ะ (ใช้ยอดที่ Order ลดลงจริง ยอด Session จะเท่ากับผลรวมของ Order เสมอ)
+            if table_sessions.is_open(order):
+                table_sessions.apply(
+                    order.restaurant_id, order.table_id,
+                    subtotal=order.total_price - previous_total, item_count=-item.quantity,
+                )
 
         messages.success(request, f"ลบรายการ {menu_name} เรียบร้อยแล้ว")
 
-    return redirect('table_bill_detail', table_id=order.table.id)
+    return redirect('table_bill_detail', table_id=order.table_id)
 
 
 
@@ -598,7 +611,7 @@ def analytics_dashboard(request):
     start_date_str = request.GET.get('start_date')
     end_date_str = request.GET.get('end_date')
     
-    today = timezone.now().date()
+    today = restaurant.business_date()
     
     if start_date_str and end_date_str:
         start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d').date()
@@ -611,19 +624,27 @@ def analytics_dashboard(request):
     orders = restaurant.orders.filter(
         status='COMPLETED',
         is_paid=True,
-        created_at__date__range=[start_date, end_date]
+        business_date__range=[start_date, end_date]
     )
 
+    # ยอดรวม / กราฟรายวัน / แยกวิธีชำระเงิน อ่านจาก Rollup รายวัน (ช่วงวันที่เป็น index scan เล็กๆ)
+    sales = restaurant.daily_sales.filter(date__range=[start_date, end_date])
+
     # 2. Summary Cards (KPIs)
-    total_revenue = orders.aggregate(Sum('total_price'))['total_price__sum'] or 0
-    total_orders = orders.count()
+    totals = sales.aggregate(revenue=Sum('revenue'), orders=Sum('order_count'))
+    total_revenue = totals['revenue'] or 0
+    total_orders = totals['orders'] or 0
     # AOV = Average Order Value (ยอดขายเฉลี่ยต่อบิล) สำคัญมากสำหรับเจ้าของ
     avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
+
+    # สัดส่วนวิธีชำระเงิน (เงินสด / QR)
+    payment_split = sales.values('payment_method') \
+        .annotate(total=Sum('revenue'), count=Sum('order_count')) \
+        .order_by('-total')
     
     # 3. Sales Trend Graph (กราฟเส้นยอดขายรายวัน)
-    daily_sales = orders.annotate(date=TruncDate('created_at')) \
-        .values('date') \
-        .annotate(total=Sum('total_price'), count=Count('id')) \
+    daily_sales = sales.values('date') \
+        .annotate(total=Sum('revenue'), count=Sum('order_count')) \
         .order_by('date')
         
     # เตรียมข้อมูล JSON สำหรับ Chart.js
@@ -631,24 +652,26 @@ def analytics_dashboard(request):
     chart_revenues = [float(x['total']) for x in daily_sales]
     chart_orders = [x['count'] for x in daily_sales]
 
-    # 4. Top Selling Items (รายการขายดี) - Join กับ OrderItem
-    # ต้องดึง OrderItem ที่อยู่ใน Order เหล่านั้น
-    top_items = OrderItem.objects.filter(order__in=orders) \
-        .values('menu_item__name') \
-        .annotate(total_qty=Sum('quantity'), total_sales=Sum(F('price') * F('quantity'))) \
+    # 4. Top Selling Items (รายการขายดี) - อ่านจาก Rollup รายเมนู/วัน (ไม่ต้อง Join OrderItem ทั้งช่วง)
+    # รวมตามชื่อเมนู ณ ตอนขาย เมนูที่ถูกเปลี่ยนชื่อ/ลบไปแล้วก็ยังแสดงถูกต้อง
+    top_items = restaurant.menu_item_daily_sales.filter(date__range=[start_date, end_date]) \
+        .values('menu_item_name') \
+        .annotate(total_qty=Sum('quantity'), total_sales=Sum('revenue')) \
         .order_by('-total_qty')[:10] # เอา 10 อันดับแรก
 
-    top_items_labels = [x['menu_item__name'] for x in top_items]
+    top_items_labels = [x['menu_item_name'] for x in top_items]
     top_items_data = [x['total_qty'] for x in top_items]
 
-    # 5. Peak Hours (ช่วงเวลาขายดี)
-    peak_hours = orders.annotate(hour=TruncHour('created_at')) \
-        .values('hour') \
-        .annotate(count=Count('id')) \
-        .order_by('hour')
-        
-    # แปลงข้อมูล Peak Hours ให้เป็น Format ง่ายๆ (00-23 นาฬิกา)
-    # (ส่วนนี้อาจต้องทำ Logic เพิ่มใน Template หรือ JS เพื่อ map ชั่วโมงให้ครบ 24 ชม.)
+    # 5. Peak Hours (ช่วงเวลาขายดี) - Heatmap วันในสัปดาห์ x ชั่วโมง จาก Rollup รายชั่วโมง
+    # ได้ไม่เกิน 7x24 แถวไม่ว่าช่วงวันที่จะยาวแค่ไหน เติมช่องที่ไม่มียอดเป็น 0 ให้ครบทุกช่อง
+    peak_orders = [[0] * 24 for _ in range(7)]
+    peak_revenue = [[0.0] * 24 for _ in range(7)]
+    peak_hours = restaurant.hourly_sales.filter(date__range=[start_date, end_date]) \
+        .values('weekday', 'hour') \
+        .annotate(count=Sum('order_count'), total=Sum('revenue'))
+    for slot in peak_hours:
+        peak_orders[slot['weekday']][slot['hour']] = slot['count']
+        peak_revenue[slot['weekday']][slot['hour']] = float(slot['total'])
 
     context = {
         'restaurant': restaurant,
@@ -657,14 +680,16 @@ def analytics_dashboard(request):
         'total_revenue': total_revenue,
         'total_orders': total_orders,
         'avg_order_value': avg_order_value,
+        'payment_split': payment_split,
         # Chart Data
         'chart_dates': json.dumps(chart_dates),
         'chart_revenues': json.dumps(chart_revenues),
         'top_items_labels': json.dumps(top_items_labels),
         'top_items_data': json.dumps(top_items_data),
+        'peak_matrix': json.dumps({'orders': peak_orders, 'revenue': peak_revenue}),
         # Tables
         'top_items_list': top_items,
-        'recent_orders': orders.order_by('-created_at')[:20] # 20 รายการล่าสุดในตาราง
+        'recent_orders': orders.select_related('table').order_by('-created_at')[:20] # 20 รายการล่าสุดในตาราง
     }
 
     return render(request, 'restaurants/analytics.html', context)
@@ -684,7 +709,17 @@ def order_history(request):
     orders_list = restaurant.orders.filter(
         status='COMPLETED', 
         is_paid=True
-    ).order_by('-created_at')
+    ).select_related('table').order_by('-created_at')
+
+    # กรองตามวันขาย (?date=YYYY-MM-DD) ใช้ index (restaurant, business_date)
+    selected_date = None
+    if request.GET.get('date'):
+        try:
+            selected_date = datetime.datetime.strptime(request.GET['date'], '%Y-%m-%d').date()
+        except ValueError:
+            selected_date = None
+    if selected_date:
+        orders_list = orders_list.filter(business_date=selected_date)
     
     # แบ่งหน้า หน้าละ 50 รายการ
     paginator = Paginator(orders_list, 50) 
@@ -693,7 +728,8 @@ def order_history(request):
     
     return render(request, 'restaurants/order_history.html', {
         'restaurant': restaurant,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'selected_date': selected_date.strftime('%Y-%m-%d') if selected_date else '',
     })
 
 # 2. API สำหรับดึงรายละเอียดบิล (เพื่อแสดงใน Modal)
@@ -701,10 +737,10 @@ def order_history(request):
 def get_order_details_api(request, order_id):
     try:
         # เช็คว่าเป็นออเดอร์ของร้านนี้จริงๆ (Security)
-        order = request.user.restaurant.orders.get(id=order_id)
+        order = request.user.restaurant.orders.select_related('table').get(id=order_id)
         
         items = []
-        for item in order.items.all():
+        for item in order.items.select_related('menu_item'):
             items.append({
                 'name': item.menu_item.name,
                 'quantity': item.quantity,
@@ -17,6 +17,7 @@ document.addEventListener("DOMContentLoaded", function () {
     const chartRevenues = getChartData("data-chart-revenues");
     const topItemLabels = getChartData("data-top-items-labels");
     const topItemData = getChartData("data-top-items-data");
+    const peakMatrix = getChartData("data-peak-matrix");
 
     Chart.defaults.font.family = "'Prompt', sans-serif";
     Chart.defaults.color = '#64748b';
@@ -98,4 +99,50 @@ document.addEventListener("DOMContentLoaded", function () {
             }
         });
     }
-});
\ No newline at end of file
+
+    // -------------------------------------------------
+    // C. Peak Hours Heatmap (7 วัน x 24 ชั่วโมง)
+    // Server ส่งมาครบทุกช่องแล้ว (ช่องที่ไม่มียอด = 0) ไม่ต้องเติมเอง
+    // -------------------------------------------------
+    const heatmap = document.getElementById("peakHeatmap");
+    const dayNames = ["จ.", "อ.", "พ.", "พฤ.", "ศ.", "ส.", "อา."];
+
+    const renderHeatmap = (mode) => {
+        const values = peakMatrix[mode] || [];
+        const max = Math.max(0, ...values.flat());
+        const format = (val) => mode === "revenue" ? '฿' + val.toLocaleString() : val.toLocaleString() + ' บิล';
+
+        let html = '<thead><tr><th></th>';
+        for (let hour = 0; hour < 24; hour++) {
+            html += `<th class="font-normal w-7 text-center">${String(hour).padStart(2, "0")}</th>`;
+        }
+        html += '</tr></thead><tbody>';
+        values.forEach((row, day) => {
+            html += `<tr><th class="font-medium text-right pr-2">${dayNames[day]}</th>`;
+            row.forEach((val, hour) => {
+                const alpha = max > 0 ? (val / max) : 0;
+                html += `<td class="h-7 rounded" style="background-color: rgba(37, 99, 235, ${Math.max(alpha, 0.04).toFixed(2)});"`
+                    + ` title="${dayNames[day]} ${String(hour).padStart(2, "0")}:00 - ${format(val)}"></td>`;
+            });
+            html += '</tr>';
+        });
+        heatmap.innerHTML = html + '</tbody>';
+    };
+
+    if (heatmap && peakMatrix.orders) {
+        renderHeatmap("orders");
+        document.querySelectorAll("#peakModeSwitch button").forEach((btn) => {
+            btn.addEventListener("click", () => {
+                document.querySelectorAll("#peakModeSwitch button").forEach((other) => {
+                    const active = other === btn;
+                    other.classList.toggle("bg-white", active);
+                    other.classList.toggle("text-gray-800", active);
+                    other.classList.toggle("font-bold", active);
+                    other.classList.toggle("shadow-sm", active);
+                    other.classList.toggle("text-gray-500", !active);
+                });
+                renderHeatmap(btn.dataset.mode);
+            });
+        });
+    }
+});
@@ -0,0 +1,33 @@
+# users/backends.py
+# Authentication Backend ที่โหลดร้านของเจ้าของมาพร้อม User ใน Query เดียว (LEFT JOIN)
+# view / decorator ที่อ่าน request.user.restaurant จะไม่ต้อง Query ร้านซ้ำอีก
+#
+# ต้องครอบทั้ง 2 ตัว เพราะ session จะจำ backend ที่ใช้ตอน Login ไว้ (Login ผ่าน allauth = AuthenticationBackend)
+from allauth.account import auth_backends
+from django.contrib.auth import backends, get_user_model
+
+UserModel = get_user_model()
+
+
+class SelectRestaurantMixin:
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('restaurant').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await UserModel._default_manager.select_related('restaurant').aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class ModelBackend(SelectRestaurantMixin, backends.ModelBackend):
+    pass
+
+
+class AuthenticationBackend(SelectRestaurantMixin, auth_backends.AuthenticationBackend):
+    pass
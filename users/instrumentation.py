@@ -0,0 +1,135 @@
+# users/instrumentation.py
+# ตัวเก็บตัวเลขต่อ Request สำหรับ PerformanceMiddleware (users/middleware.py)
+# - DB    : นับ Query + เวลา ผ่าน execute_wrapper ที่ติดไว้กับทุก connection
+# - cache : โค้ดที่อ่าน cache แจ้งเองผ่าน record_cache(hits, misses) (Django ไม่มี hook ให้ดักทุก backend)
+# - group_send : ส่งผ่าน group_send() ในไฟล์นี้เพื่อจับเวลา
+#
+# ค่าของ Request ปัจจุบันเก็บใน ContextVar ตามไปถึง Thread ของ sync_to_async ได้
+# นอก Request (dispatcher / consumer / management command) ไม่มีตัวเก็บ จะไม่บันทึกอะไร
+# (ยกเว้น group_send ที่นับเข้า users/prometheus.py เสมอ)
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import prometheus
+
+_current = ContextVar('request_metrics', default=None)
+
+# เก็บ SQL ไว้แสดงตอน Request ช้า ตัดให้สั้นลงกัน log บวม
+MAX_SQL_LENGTH = 500
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # [(sql, ms)]
+        self.db_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.group_send_count = 0
+        self.group_send_ms = 0.0
+        # ถ้าตั้งไว้ จะถูกเรียกทุก Query: on_query(sql, params, many, alias, ms) (ใช้โดย users/querycheck.py)
+        self.on_query = None
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self, total_ms):
+        """ค่าสำหรับ header Server-Timing (ดูได้ในแท็บ Network ของ DevTools)"""
+        return ', '.join([
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={self.db_ms:.1f};desc="{len(self.queries)} queries"',
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} misses"',
+            f'channels;dur={self.group_send_ms:.1f};desc="{self.group_send_count} group_send"',
+        ])
+
+    def as_dict(self, total_ms):
+        return {
+            'total_ms': round(total_ms, 1),
+            'db_queries': len(self.queries),
+            'db_ms': round(self.db_ms, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'group_send': self.group_send_count,
+            'group_send_ms': round(self.group_send_ms, 1),
+        }
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        metrics.db_ms += elapsed
+        metrics.queries.append((sql[:MAX_SQL_LENGTH], elapsed))
+        if metrics.on_query is not None:
+            metrics.on_query(sql, params, many, context['connection'].alias, elapsed)
+
+
+def _install(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+# connection ที่เปิดใหม่ (ทุก Thread) ติด wrapper อัตโนมัติ
+connection_created.connect(_install, dispatch_uid='rpos_request_metrics')
+
+
+def start():
+    """เริ่มเก็บตัวเลขของ Request นี้ คืนค่า (metrics, token) ให้ส่ง token กลับมาที่ stop()"""
+    # connection ที่เปิดไว้ก่อน import ไฟล์นี้ (ใน Thread ปัจจุบัน) จะไม่ได้รับ signal
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def suspended():
+    """หยุดเก็บชั่วคราว (Query ที่ตัวตรวจยิงเองไม่ควรนับเป็นของ Request)"""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def record_cache(hits=0, misses=0):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+async def group_send(channel_layer, group, message):
+    """channel_layer.group_send พร้อมจับเวลา (ใช้แทนการเรียกตรง) นับเข้า Prometheus เสมอ แม้อยู่นอก Request"""
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        return await channel_layer.group_send(group, message)
+    except Exception:
+        prometheus.inc('rpos_group_send_failures_total')
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        prometheus.observe('rpos_group_send_duration_seconds', elapsed)
+        if metrics is not None:
+            metrics.group_send_count += 1
+            metrics.group_send_ms += elapsed * 1000
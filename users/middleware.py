@@ -5,19 +5,74 @@ from django.urls import reverse
 from django.http import HttpResponseForbidden
 from django.shortcuts import render
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 import environ
+import json
+import logging
+from abc import ABC, abstractmethod
+from functools import cached_property
+
+from . import instrumentation, prometheus, querycheck
 
 
 # อ่านค่า env (เผื่อกรณีไม่ได้อ่านผ่าน settings)
 env = environ.Env()
 
+performance_logger = logging.getLogger('rpos.performance')
+querycheck_logger = logging.getLogger('rpos.querycheck')
+
+
+# --- Base: ให้ Middleware ของเราทำงานได้ทั้งโหมด sync และ async ---
+# ถ้ามี Middleware แบบ sync อย่างเดียวอยู่ใน stack, Django จะต้องโยน async view (หน้าลูกค้า)
+# ไปวิ่งใน Thread เสมอ เลยต้องรองรับ async ด้วย
+class SyncAndAsyncMiddleware:
+    sync_capable = True
+    async_capable = True
 
-# --- 1. Middleware สำหรับจำกัด IP เข้าหน้า Admin ---
-class AdminIPRestrictMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
 
+# --- Base ของ Middleware ที่แค่ตรวจแล้วตัดสินว่าจะหยุด request หรือปล่อยผ่าน ---
+# ลูกต้อง implement check() (ไม่ครบ = สร้าง instance ไม่ได้ตั้งแต่ตอนโหลด Middleware)
+class CheckMiddleware(SyncAndAsyncMiddleware, ABC):
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.check(request, request.user) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # โหมด async ต้องโหลด user ผ่าน auser() (ห้ามแตะ DB แบบ sync)
+        user = await request.auser() if self.needs_user(request) else None
+        if self.check_in_thread(request):
+            response = await sync_to_async(self.check)(request, user)
+        else:
+            response = self.check(request, user)
+        return response or await self.get_response(request)
+
+    def needs_user(self, request):
+        return True
+
+    def check_in_thread(self, request):
+        # check() ที่ render template ต้องรันใน Thread (โหมด async):
+        # context processor อ่าน request.user / session แบบ sync ซึ่งอาจ Query DB
+        return False
+
+    @abstractmethod
+    def check(self, request, user):
+        """คืน Response ถ้าต้องการหยุด request ไว้ตรงนี้ / คืน None เพื่อปล่อยผ่าน"""
+
+
+# --- 1. Middleware สำหรับจำกัด IP เข้าหน้า Admin ---
+class AdminIPRestrictMiddleware(CheckMiddleware):
+    def needs_user(self, request):
+        return False
+
+    def check(self, request, user):
         # เช็คว่ากำลังเข้าหน้า Admin หรือไม่
         if request.path.startswith('/super-admin/'):
             
@@ -38,52 +93,58 @@ class AdminIPRestrictMiddleware:
                 if ip not in allowed_ips:
                     return HttpResponseForbidden(f"⛔ Access Denied: Your IP ({ip}) is not allowed.")
 
-        return self.get_response(request)
+        return None
     
 
 
 
 # --- 2. Middleware เดิมของคุณ (ตรวจสอบสถานะอนุมัติ) ---
-class ApprovalMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
+class ApprovalMiddleware(CheckMiddleware):
+    def check(self, request, user):
         # 1. ถ้าไม่ได้ Login ก็ปล่อยผ่าน (ให้ไปหน้า Login/Register ได้)
-        if not request.user.is_authenticated:
-            return self.get_response(request)
+        if not user.is_authenticated:
+            return None
 
         # 2. ถ้าเป็น Superuser ให้ผ่านตลอด
-        if request.user.is_superuser:
-            return self.get_response(request)
+        if user.is_superuser:
+            return None
         
         # เพิ่มเงื่อนไข: ถ้าเป็น URL ของ django_browser_reload ให้ปล่อยผ่านเลย
         if request.path.startswith('/__reload__/'):
-             return self.get_response(request)
+             return None
 
         # 3. เช็คสถานะอนุมัติ
-        if request.user.approval_status != 'APPROVED':
-            # รายชื่อ URL ที่ยอมให้เข้าได้แม้ยังไม่อนุมัติ (เช่น หน้า Logout, หน้า Pending เอง)
-            allowed_paths = [
-                reverse('approval_pending'),
-                reverse('account_logout'),
-                '/admin/', # (เผื่อไว้)
-            ]
-            
+        if user.approval_status != 'APPROVED':
             # ถ้า path ที่เข้า ไม่ใช่อันที่ยกเว้น -> บังคับ redirect ไปหน้า pending
-            if request.path not in allowed_paths:
+            if request.path not in self.allowed_paths:
                 return redirect('approval_pending')
 
-        return self.get_response(request)
+        return None
+
+    @cached_property
+    def allowed_paths(self):
+        # รายชื่อ URL ที่ยอมให้เข้าได้แม้ยังไม่อนุมัติ (เช่น หน้า Logout, หน้า Pending เอง)
+        # reverse ครั้งเดียวต่อ process (Middleware ถูกสร้างครั้งเดียว) ผลของ reverse รวม SCRIPT_NAME (ติดตั้งใต้ sub-path)
+        # จึงต้องเทียบกับ request.path ไม่ใช่ path_info
+        return frozenset([
+            reverse('approval_pending'),
+            reverse('account_logout'),
+            '/admin/', # (เผื่อไว้)
+        ])
     
 
 
 # use when web maintenance
-class MaintenanceModeMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+class MaintenanceModeMiddleware(CheckMiddleware):
+    def needs_user(self, request):
+        # โหลด user เฉพาะตอนเปิดโหมดซ่อมบำรุง (ปกติไม่ต้องแตะ DB)
+        return getattr(settings, 'MAINTENANCE_MODE', False)
 
-    def __call__(self, request):
+    def check_in_thread(self, request):
+        # เปิดโหมดซ่อมบำรุง = อาจ render 503.html
+        return getattr(settings, 'MAINTENANCE_MODE', False)
+
+    def check(self, request, user):
         # 1. ตรวจสอบว่าเปิดโหมดซ่อมบำรุงหรือไม่? (ค่า Default คือ False)
         maintenance_mode = getattr(settings, 'MAINTENANCE_MODE', False)
 
@@ -97,12 +158,117 @@ class MaintenanceModeMiddleware:
             is_static_url = request.path.startswith(settings.STATIC_URL)
             is_media_url = request.path.startswith(settings.MEDIA_URL)
             
-            # ต้องตรวจสอบ request.user ก่อนเรียกใช้ .is_superuser 
+            # ต้องตรวจสอบ user ก่อนเรียกใช้ .is_superuser 
             # (ป้องกัน Error กรณี Middleware รันก่อน Authentication)
-            is_superuser = request.user.is_authenticated and request.user.is_superuser
+            is_superuser = user.is_authenticated and user.is_superuser
 
             if not (is_admin_url or is_static_url or is_media_url or is_superuser):
                 # ถ้าไม่ใช่ข้อยกเว้น -> ส่งหน้า 503 กลับไปทันที
                 return render(request, '503.html', status=503)
 
-        return self.get_response(request)
\ No newline at end of file
+        return None
+
+
+# --- วัดผลทุก Request: เวลารวม / DB / cache / group_send ---
+# ส่งออกเป็น header Server-Timing และ log 1 บรรทัด (JSON) ต่อ Request ที่ logger 'rpos.performance' (level INFO
+# ปิดไว้โดยค่าเริ่มต้น เปิดด้วย PERF_LOG_LEVEL=INFO)
+# Request ที่ช้ากว่า PERF_SLOW_REQUEST_MS จะ log รายการ Query ทั้งหมดเพิ่ม (level WARNING)
+# หมายเหตุ: StreamingHttpResponse นับเฉพาะงานก่อนเริ่มสตรีม (header ถูกส่งไปก่อนแล้ว)
+class PerformanceMiddleware(SyncAndAsyncMiddleware):
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, token = instrumentation.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = instrumentation.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        total_ms = metrics.total_ms
+
+        if getattr(settings, 'PERF_SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing(total_ms)
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **metrics.as_dict(total_ms),
+        }
+        performance_logger.info(json.dumps(record))
+
+        # latency ต่อชื่อ view (URL ที่ไม่ตรงกับ view ไหนรวมเป็น 'unmatched' กันชื่อ label งอกไม่จำกัด)
+        match = getattr(request, 'resolver_match', None)
+        prometheus.observe(
+            'rpos_http_request_duration_seconds', total_ms / 1000,
+            view=match.view_name if match else 'unmatched',
+        )
+
+        if total_ms >= getattr(settings, 'PERF_SLOW_REQUEST_MS', 500):
+            record['queries'] = [
+                {'sql': sql, 'ms': round(ms, 2)} for sql, ms in metrics.queries
+            ]
+            performance_logger.warning('slow request %s', json.dumps(record, ensure_ascii=False))
+        return response
+
+
+# --- (เฉพาะตอนพัฒนา) ตรวจ N+1 / Query ช้า ของแต่ละ Request ---
+# ต้องอยู่ถัดจาก PerformanceMiddleware (ใช้ตัวเก็บ Query ตัวเดียวกัน) settings จะใส่ให้เองเมื่อ QUERY_INSPECTOR=True
+# ผลเขียนลง QUERY_INSPECTOR_REPORT (ดู users/querycheck.py) + log WARNING ที่ logger 'rpos.querycheck'
+class QueryInspectorMiddleware(SyncAndAsyncMiddleware):
+    def __init__(self, get_response):
+        # เก็บ stack ทุก Query ช้ามาก ห้ามหลุดไปเปิดบน Production
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed('QueryInspectorMiddleware runs only with DEBUG=True')
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        collector = self.start()
+        response = self.get_response(request)
+        if collector is not None:
+            self.finish(request, collector)
+        return response
+
+    async def __acall__(self, request):
+        collector = self.start()
+        response = await self.get_response(request)
+        if collector is not None:
+            # EXPLAIN ต้องแตะ DB แบบ sync
+            await sync_to_async(self.finish)(request, collector)
+        return response
+
+    def start(self):
+        metrics = instrumentation.current()
+        if metrics is None:
+            return None
+        metrics.on_query = collector = querycheck.QueryCollector()
+        return collector
+
+    def finish(self, request, collector):
+        result = querycheck.inspect(
+            collector,
+            repeat_limit=getattr(settings, 'QUERY_INSPECTOR_REPEAT', 5),
+            explain_ms=getattr(settings, 'QUERY_INSPECTOR_EXPLAIN_MS', 50),
+        )
+        match = getattr(request, 'resolver_match', None)
+        name = f"{request.method} {match.view_name if match else request.path}"
+
+        for repeated in result['repeated']:
+            querycheck_logger.warning(
+                'N+1? %s: %sx %s (template=%s code=%s)',
+                name, repeated['count'], repeated['shape'], repeated['template'], repeated['code'],
+            )
+
+        querycheck.write_report(settings.QUERY_INSPECTOR_REPORT, name, result)
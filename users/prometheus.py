@@ -0,0 +1,175 @@
+# users/prometheus.py
+# ตัวเลขสำหรับ Prometheus (ดึงที่ /users/metrics/)
+# - ตอนเก็บ: บวกเลขใน dict ของ process นี้อย่างเดียว (ไม่แตะ cache / DB ระหว่าง request)
+# - Thread เบื้องหลังเขียน Snapshot ของ process นี้ลง cache ทุก METRICS_FLUSH_SECONDS
+# - ตอนดึง: รวม Snapshot ของทุก worker (daphne หลายตัว + dispatch_outbox) จาก cache
+#   ต้องใช้ cache ที่แชร์กัน (Redis) ถ้าเป็น locmem จะเห็นแค่ worker ที่ตอบ request นั้น
+#
+# Counter / Histogram นับสะสมตั้งแต่ process เริ่ม worker ที่ตายไปแล้วจะหายไปหลัง METRICS_WORKER_TTL
+# (Prometheus มองเป็น counter reset ตามปกติ ใช้ rate() ได้เหมือนเดิม)
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# ชื่อ -> (ชนิด, คำอธิบาย) มีเฉพาะตัวที่ประกาศไว้ตรงนี้เท่านั้นที่เก็บได้
+METRICS = {
+    'rpos_http_request_duration_seconds': ('histogram', 'HTTP request latency by view name'),
+    'rpos_orders_created_total': ('counter', 'Orders created by diners, by restaurant id'),
+    'rpos_websocket_connections': ('gauge', 'Open OrderConsumer connections by group'),
+    'rpos_group_send_duration_seconds': ('histogram', 'Channel layer group_send latency'),
+    'rpos_group_send_failures_total': ('counter', 'Channel layer group_send calls that raised'),
+}
+
+# ขอบบนของแต่ละช่อง (วินาที) ช่องสุดท้าย +Inf เพิ่มให้ตอน render
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+WORKERS_KEY = 'metrics:workers'
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+_lock = threading.Lock()
+_values = {}  # (name, labels) -> float (counter / gauge) หรือ [ช่อง..., +Inf, sum, count] (histogram)
+_flusher = None
+
+
+def _flush_seconds():
+    return getattr(settings, 'METRICS_FLUSH_SECONDS', 10)
+
+
+def _worker_ttl():
+    return getattr(settings, 'METRICS_WORKER_TTL', 300)
+
+
+def _snapshot_key(worker_id):
+    return f'metrics:worker:{worker_id}'
+
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f'Unknown metric: {name}')
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _add(name, labels, value):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+    _ensure_flusher()
+
+
+def inc(name, value=1, **labels):
+    _add(name, labels, value)
+
+
+def gauge_add(name, delta, **labels):
+    _add(name, labels, delta)
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    # ช่องแรกที่ขอบบน >= ค่า (ไม่เจอ = ช่อง +Inf)
+    index = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+    with _lock:
+        row = _values.get(key)
+        if row is None:
+            row = _values[key] = [0] * (len(BUCKETS) + 3)
+        row[index] += 1
+        row[-2] += seconds
+        row[-1] += 1
+    _ensure_flusher()
+
+
+def snapshot():
+    with _lock:
+        return {key: list(value) if isinstance(value, list) else value for key, value in _values.items()}
+
+
+def flush(worker_id=WORKER_ID, values=None):
+    """เขียน Snapshot ของ worker นี้ลง cache และลงชื่อไว้ในรายชื่อ worker"""
+    ttl = _worker_ttl()
+    cache.set(_snapshot_key(worker_id), snapshot() if values is None else values, ttl)
+
+    # อ่าน-แก้-เขียน ไม่ atomic: ถ้า 2 worker เขียนพร้อมกันชื่อหนึ่งอาจหลุด แต่จะกลับมาในรอบ flush ถัดไป
+    now = time.time()
+    workers = {
+        other: seen for other, seen in (cache.get(WORKERS_KEY) or {}).items()
+        if now - seen < ttl
+    }
+    workers[worker_id] = now
+    cache.set(WORKERS_KEY, workers, None)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(_flush_seconds())
+        try:
+            flush()
+        except Exception:
+            # cache ล่มชั่วคราว: รอบหน้าค่อยเขียนใหม่ (ค่าสะสมยังอยู่ในหน่วยความจำ)
+            pass
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True)
+            _flusher.start()
+
+
+def collect():
+    """รวม Snapshot ของทุก worker ที่ยังไม่หมดอายุ"""
+    workers = cache.get(WORKERS_KEY) or {}
+    snapshots = cache.get_many([_snapshot_key(worker_id) for worker_id in workers])
+
+    merged = {}
+    for values in snapshots.values():
+        for key, value in values.items():
+            if isinstance(value, list):
+                row = merged.setdefault(key, [0] * len(value))
+                for i, part in enumerate(value):
+                    row[i] += part
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(values):
+    """แปลงเป็น Prometheus text format (version 0.0.4)"""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        rows = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in rows:
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), value[:-2]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", str(bound))])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
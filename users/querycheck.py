@@ -0,0 +1,134 @@
+# users/querycheck.py
+# ตัวตรวจ Query สำหรับตอนพัฒนา (ใช้กับ QueryInspectorMiddleware เปิดได้เฉพาะ DEBUG)
+# - จัดกลุ่ม SQL ของแต่ละ Request ตาม "รูปแบบ" (ตัดค่าคงที่ / IN (...) ออก)
+#   รูปแบบเดียวกันซ้ำเกิน QUERY_INSPECTOR_REPEAT ครั้ง = น่าจะเป็น N+1 บอกตำแหน่ง template / บรรทัดโค้ดที่ทำให้เกิด
+# - Query ที่ช้ากว่า QUERY_INSPECTOR_EXPLAIN_MS เก็บแผน EXPLAIN ไว้ด้วย
+# - ผลรวมเขียนลงไฟล์ JSON (QUERY_INSPECTOR_REPORT) แยกตาม view เอาไป diff ระหว่าง branch ได้
+#   (ไม่เก็บเวลาเป็น ms ในไฟล์ ไม่งั้น diff จะเปลี่ยนทุกครั้งที่รัน)
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+from . import instrumentation
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'IN \((?:(?:%s|\?), )*(?:%s|\?)\)')
+_SPACES = re.compile(r'\s+')
+
+# ไฟล์ที่ไม่นับเป็น "ต้นทาง" ของ Query (ตัวตรวจเอง + Middleware)
+# หมายเหตุ: Query จาก Async ORM วิ่งใน Thread แยก stack จะไม่มี view ให้เห็น (code = None)
+_SKIP_FILES = ('users/querycheck.py', 'users/instrumentation.py', 'users/middleware.py')
+
+_report_lock = threading.Lock()
+
+
+def shape(sql):
+    """รูปแบบของ SQL: Query ที่ต่างกันแค่ค่าคงที่ / จำนวนค่าใน IN จะได้รูปแบบเดียวกัน"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def find_origin():
+    """ตำแหน่งที่ทำให้เกิด Query: (template:บรรทัด ที่กำลัง render, ไฟล์:บรรทัด ในโค้ดของโปรเจกต์)"""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and not (template and code):
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            # Node ของ template ที่อยู่ในสุด (เช่น {{ order.table.name }})
+            node = frame.f_locals.get('self')
+            origin, token = getattr(node, 'origin', None), getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template = f'{origin.template_name}:{token.lineno}'
+
+        filename = frame.f_code.co_filename
+        if code is None and filename.startswith(base_dir) and 'site-packages' not in filename:
+            relative = os.path.relpath(filename, base_dir).replace(os.sep, '/')
+            if relative not in _SKIP_FILES:
+                code = f'{relative}:{frame.f_lineno}'
+        frame = frame.f_back
+    return template, code
+
+
+class QueryCollector:
+    """เก็บ Query ของ Request เดียว (ผูกกับ RequestMetrics.on_query)"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, sql, params, many, alias, elapsed_ms):
+        template, code = find_origin()
+        self.queries.append({
+            'sql': sql,
+            'params': None if many else params,
+            'alias': alias,
+            'ms': elapsed_ms,
+            'template': template,
+            'code': code,
+        })
+
+    def repeated(self, limit):
+        """รูปแบบที่ซ้ำเกิน limit ครั้ง พร้อมตำแหน่งแรกที่เจอ"""
+        counts = Counter(shape(query['sql']) for query in self.queries)
+        found = []
+        for sql_shape, count in counts.most_common():
+            if count <= limit:
+                break
+            first = next(query for query in self.queries if shape(query['sql']) == sql_shape)
+            found.append({'shape': sql_shape, 'count': count, 'template': first['template'], 'code': first['code']})
+        return found
+
+    def slow(self, threshold_ms):
+        return [query for query in self.queries if query['ms'] >= threshold_ms]
+
+
+def explain(query):
+    """แผน EXPLAIN ของ Query (เฉพาะ SELECT) ไม่นับเข้าตัวเลขของ Request"""
+    if query['params'] is None or not query['sql'].lstrip().upper().startswith('SELECT'):
+        return None
+    connection = connections[query['alias']]
+    with instrumentation.suspended(), connection.cursor() as cursor:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {query['sql']}", query['params'])
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+
+def inspect(collector, repeat_limit, explain_ms):
+    """สรุปผลของ 1 Request: {'queries', 'repeated', 'slow'}"""
+    slow = []
+    for query in collector.slow(explain_ms):
+        slow.append({
+            'shape': shape(query['sql']),
+            'template': query['template'],
+            'code': query['code'],
+            'plan': explain(query),
+        })
+    return {
+        'queries': len(collector.queries),
+        'repeated': collector.repeated(repeat_limit),
+        'slow': slow,
+    }
+
+
+def write_report(path, name, result):
+    """อัปเดตผลของ view นี้ในไฟล์รายงาน (เก็บผลล่าสุดของแต่ละ view เรียงตามชื่อ)"""
+    with _report_lock:
+        try:
+            with open(path, encoding='utf-8') as report_file:
+                report = json.load(report_file)
+        except (FileNotFoundError, ValueError):
+            report = {}
+
+        report[name] = result
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2, sort_keys=True)
+            report_file.write('\n')
@@ -1,3 +1,249 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Origin, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_script_prefix, reverse, set_script_prefix
+
+from restaurants.benchmark import seed_restaurant
+from restaurants.models import Restaurant, Table, Category, MenuItem
+from . import middleware, prometheus, querycheck
+from .middleware import CheckMiddleware, PerformanceMiddleware, QueryInspectorMiddleware
+from .models import User
+
+
+class RequestInstrumentationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='owner', email='owner@example.com', password='x',
+            approval_status='APPROVED', is_shop_owner=True,
+        )
+        cls.restaurant = Restaurant.objects.create(owner=cls.owner, name='Test Shop', slug='test-shop')
+        cls.table = Table.objects.create(restaurant=cls.restaurant, name='T1')
+        category = Category.objects.create(restaurant=cls.restaurant, name='Main')
+        MenuItem.objects.create(category=category, name='Rice', price=40)
+
+    def setUp(self):
+        cache.clear()
+        caches['qr'].clear()
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(';')[0], part) for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_counts_queries_and_cache(self):
+        # หน้าเมนูลูกค้าเป็น async view (Middleware ทำงานโหมด async)
+        url = reverse('dining_menu', args=[self.restaurant.slug, self.table.uuid])
+
+        cold = self.server_timing(self.client.get(url))
+        with CaptureQueriesContext(connection) as ctx:
+            warm = self.server_timing(self.client.get(url))
+
+        self.assertEqual(set(warm), {'total', 'db', 'cache', 'channels'})
+        self.assertIn('desc="0 hits 2 misses"', cold['cache'])  # โต๊ะ + เมนู
+        self.assertIn('desc="2 hits 0 misses"', warm['cache'])
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', warm['db'])
+
+    def test_logs_every_request_and_query_list_when_slow(self):
+        self.client.force_login(self.owner)
+        url = reverse('table_qr', args=[self.table.uuid, 'png'])
+
+        with self.settings(PERF_SLOW_REQUEST_MS=10_000), self.assertLogs('rpos.performance', 'INFO') as logs:
+            self.client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('"cache_misses": 1', logs.output[0])
+
+        with self.settings(PERF_SLOW_REQUEST_MS=0), self.assertLogs('rpos.performance', 'WARNING') as logs:
+            self.client.get(url)
+        self.assertIn('slow request', logs.output[0])
+        self.assertIn('restaurants_table', logs.output[0])
+
+    def test_server_timing_header_can_be_disabled(self):
+        url = reverse('dining_menu', args=[self.restaurant.slug, self.table.uuid])
+        with self.settings(PERF_SERVER_TIMING=False):
+            response = self.client.get(url)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class PrometheusMetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        cls.restaurant = seed_restaurant(tables=1, categories=1, items_per_category=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshots_from_all_workers_are_summed(self):
+        row = [0] * (len(prometheus.BUCKETS) + 3)
+        fast, slow = list(row), list(row)
+        fast[0], fast[-2], fast[-1] = 1, 0.001, 1
+        slow[-3], slow[-2], slow[-1] = 1, 30.0, 1
+        key = ('rpos_http_request_duration_seconds', (('view', 'test_view'),))
+        orders = ('rpos_orders_created_total', (('restaurant', 'r1'),))
+
+        prometheus.flush('web-1', {key: fast, orders: 2})
+        prometheus.flush('web-2', {key: slow, orders: 3})
+        text = prometheus.render(prometheus.collect())
+
+        self.assertIn('rpos_orders_created_total{restaurant="r1"} 5', text)
+        self.assertIn('rpos_http_request_duration_seconds_bucket{view="test_view",le="0.005"} 1', text)
+        self.assertIn('rpos_http_request_duration_seconds_bucket{view="test_view",le="+Inf"} 2', text)
+        self.assertIn('rpos_http_request_duration_seconds_count{view="test_view"} 2', text)
+
+    def test_endpoint_requires_token_or_superuser(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+            response = self.client.get(url, headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE rpos_websocket_connections gauge', response.content.decode())
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_counts_orders_and_view_latency(self):
+        table = self.restaurant.tables.first()
+        item = MenuItem.objects.filter(category__restaurant=self.restaurant).first()
+        self.client.post(
+            reverse('api_create_order'),
+            data={'table_uuid': str(table.uuid), 'cart': [{'id': item.id, 'qty': 1}]},
+            content_type='application/json',
+        )
+
+        values = prometheus.snapshot()
+        self.assertGreaterEqual(values[('rpos_orders_created_total', (('restaurant', str(self.restaurant.id)),))], 1)
+        self.assertIn(('rpos_http_request_duration_seconds', (('view', 'api_create_order'),)), values)
+
+
+class QueryInspectorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = seed_restaurant(tables=1, categories=2, items_per_category=4)
+
+    def setUp(self):
+        self.report = os.path.join(tempfile.mkdtemp(), 'query-report.json')
+
+    def n_plus_one_view(self, request):
+        # แตะ item.category ทีละแถว (ไม่มี select_related) = 1 + 8 Query
+        template = Template(
+            '{% for item in items %}{{ item.category.name }}{% endfor %}',
+            origin=Origin(name='n_plus_one.html', template_name='n_plus_one.html'),
+        )
+        items = MenuItem.objects.filter(category__restaurant=self.restaurant).order_by('id')
+        return HttpResponse(template.render(Context({'items': items})))
+
+    def inspect(self, **overrides):
+        options = {'DEBUG': True, 'QUERY_INSPECTOR_REPORT': self.report, 'QUERY_INSPECTOR_REPEAT': 5, **overrides}
+        with self.settings(**options):
+            handler = PerformanceMiddleware(QueryInspectorMiddleware(self.n_plus_one_view))
+            handler(RequestFactory().get('/n-plus-one/'))
+        with open(self.report, encoding='utf-8') as report_file:
+            return json.load(report_file)['GET /n-plus-one/']
+
+    def test_shape_ignores_literals_and_in_lists(self):
+        self.assertEqual(
+            querycheck.shape('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'a\'  LIMIT 21'),
+            querycheck.shape('SELECT * FROM t WHERE id IN (%s) AND name = \'b\' LIMIT 21'),
+        )
+
+    def test_flags_repeated_query_with_template_line(self):
+        with self.assertLogs('rpos.querycheck', 'WARNING') as logs:
+            result = self.inspect(QUERY_INSPECTOR_EXPLAIN_MS=10_000)
+
+        self.assertEqual(result['queries'], 9)
+        [repeated] = result['repeated']
+        self.assertEqual(repeated['count'], 8)
+        self.assertIn('restaurants_category', repeated['shape'])
+        self.assertEqual(repeated['template'], 'n_plus_one.html:1')
+        self.assertTrue(repeated['code'].startswith('users/tests.py:'))
+        self.assertEqual(result['slow'], [])
+        self.assertIn('N+1?', logs.output[0])
+
+    def test_captures_explain_plan_for_slow_queries(self):
+        result = self.inspect(QUERY_INSPECTOR_EXPLAIN_MS=0, QUERY_INSPECTOR_REPEAT=100)
+
+        self.assertEqual(result['repeated'], [])
+        self.assertEqual(len(result['slow']), 9)
+        self.assertTrue(all(query['plan'] for query in result['slow']))
+
+    def test_disabled_without_debug(self):
+        with self.settings(DEBUG=False), self.assertRaises(MiddlewareNotUsed):
+            QueryInspectorMiddleware(self.n_plus_one_view)
+
+
+class TenantContextTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = seed_restaurant(tables=1, categories=1, items_per_category=1)
+        cls.owner = cls.restaurant.owner
+        cls.pending = User.objects.create_user(username='pending', email='pending@example.com', password='x')
+
+    def test_user_and_restaurant_load_in_one_query(self):
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('kitchen_dashboard'))
+
+        [user_query] = [q['sql'] for q in ctx.captured_queries if 'FROM "users_user"' in q['sql']]
+        self.assertIn('restaurants_restaurant', user_query)
+        self.assertFalse(any(q['sql'].startswith('SELECT') and 'FROM "restaurants_restaurant"' in q['sql']
+                             for q in ctx.captured_queries))
+
+    def test_suspended_restaurant_is_redirected(self):
+        self.client.force_login(self.owner)
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(is_active=False)
+
+        self.assertRedirects(self.client.get(reverse('kitchen_dashboard')), reverse('restaurant_suspended'))
+        self.assertEqual(self.client.get(reverse('kitchen_snapshot_api')).status_code, 403)
+
+    def test_unapproved_user_reaches_only_allowed_paths(self):
+        self.client.force_login(self.pending)
+
+        self.assertRedirects(self.client.get(reverse('dashboard')), reverse('approval_pending'))
+        self.assertEqual(self.client.get(reverse('approval_pending')).status_code, 200)
+
+    def test_unapproved_user_reaches_allowed_paths_under_sub_path(self):
+        # ติดตั้งใต้ /rpos: reverse() ได้ /rpos/... ส่วน path_info ไม่มี prefix
+        # (WSGIHandler ตั้ง script prefix จาก SCRIPT_NAME ให้เอง แต่ test client ไม่ตั้ง)
+        self.client.force_login(self.pending)
+
+        set_script_prefix('/rpos/')
+        self.addCleanup(clear_script_prefix)
+        response = self.client.get('/users/pending-approval/', SCRIPT_NAME='/rpos')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_check_middleware_requires_check(self):
+        class Incomplete(CheckMiddleware):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete(lambda request: HttpResponse())
+
+    async def test_maintenance_page_renders_on_async_stack(self):
+        # render() อ่าน request.user แบบ sync (เหมือน context processor auth) ต้องไม่โดน SynchronousOnlyOperation
+        def render(request, *args, **kwargs):
+            request.user.is_authenticated
+            return real_render(request, *args, **kwargs)
+
+        real_render = middleware.render
+        await self.async_client.aforce_login(self.owner)
+        with override_settings(MAINTENANCE_MODE=True), mock.patch('users.middleware.render', side_effect=render):
+            response = await self.async_client.get(reverse('dashboard'))
+
+        self.assertEqual(response.status_code, 503)
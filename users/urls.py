@@ -4,4 +4,6 @@ from . import views
 
 urlpatterns = [
     path('pending-approval/', views.approval_pending, name='approval_pending'),
+    # Prometheus scrape (ดู users/prometheus.py)
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,5 +1,28 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import prometheus
 
 
 def approval_pending(request):
     return render(request, 'users/approval_pending.html')
+
+
+# ตัวเลขสำหรับ Prometheus (รวมทุก worker) ให้ Prometheus ส่ง header Authorization: Bearer <METRICS_TOKEN>
+# หรือ Superuser เปิดดูผ่าน Browser ได้
+def metrics(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    has_token = bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+
+    if not (has_token or request.user.is_superuser):
+        return HttpResponseForbidden('⛔ Metrics token required')
+
+    # เขียนค่าของ worker นี้ก่อน ให้ตัวเลขล่าสุดเสมอ
+    prometheus.flush()
+    return HttpResponse(
+        prometheus.render(prometheus.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )